@@ -11,7 +11,7 @@ import datetime
 import matplotlib.pyplot as plt
 from mpl_toolkits.basemap import Basemap
 from scipy.interpolate import griddata # here should remove nans or empty profiles
-import netCDF4
+import bathy_tools as bathy
 
 # For plots
 font = {'family' : 'normal',
@@ -60,26 +60,13 @@ dataFile = '/home/cyrf0006/Data/GEBCO/GRIDONE_1D.nc'
 decim_scale = 4
 v = np.linspace(0, 4000, 9)
 
-# Load data
-dataset = netCDF4.Dataset(dataFile)
-
-# Extract variables
-x = dataset.variables['x_range']
-y = dataset.variables['y_range']
-spacing = dataset.variables['spacing']
-
-# Compute Lat/Lon
-nx = int((x[-1]-x[0])/spacing[0]) + 1  # num pts in x-dir
-ny = int((y[-1]-y[0])/spacing[1]) + 1  # num pts in y-dir
-
-lonz = np.linspace(x[0],x[-1],nx)
-latz = np.linspace(y[0],y[-1],ny)
+lonLims = [-70, -40]
+latLims = [40, 65]
 
-# Reshape data
-zz = dataset.variables['z']
-Z = zz[:].reshape(ny, nx)
+# Load data (window of the region only)
+lonz, latz, Z = bathy.get_bathymetry(dataFile, lonLims, latLims)
 
-# Reduce data according to Region params
+# Reduce data according to decim scale
 lonz = lonz[::decim_scale]
 latz = latz[::decim_scale]
 Z = Z[::decim_scale, ::decim_scale]
@@ -91,8 +78,6 @@ lat_0 = lats.mean()
 lon_0 = -50
 lat_0 = 50
 
-lonLims = [-70, -40]
-latLims = [40, 65]
 proj = 'merc'
 
 
@@ -102,8 +87,8 @@ fig = plt.figure()
 m = Basemap(projection='merc',lon_0=lon_0,lat_0=lat_0, llcrnrlon=lonLims[0],llcrnrlat=latLims[0],urcrnrlon=lonLims[1],urcrnrlat=latLims[1], resolution='l')
 
 x,y = m(*np.meshgrid(lonz,latz))
-c = m.contour(x, y, np.flipud(-Z), v, colors='darkgrey');
-#c = m.contourf(x, y, np.flipud(Z), v, cmap=plt.cm.PuRd_r, extend="min");
+c = m.contour(x, y, -Z, v, colors='darkgrey');
+#c = m.contourf(x, y, Z, v, cmap=plt.cm.PuRd_r, extend="min");
 m.fillcontinents(color='grey');
 
 #v = np.arange(np.floor(np.min(tmax)), np.ceil(np.max(tmax))+1)
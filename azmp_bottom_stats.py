@@ -30,8 +30,6 @@ from scipy.interpolate import griddata
 from scipy.interpolate import interp1d  # to remove NaNs in profiles
 from scipy.interpolate import RegularGridInterpolator as rgi
 import azmp_utils as azu
-from shapely.geometry.polygon import Polygon
-from shapely.ops import cascaded_union
 
 
 ## ---- preamble ---- ##
@@ -60,41 +58,20 @@ lat_0 = np.round(np.mean(lat_reg))
 lonLims = [lon_reg[0], lon_reg[-1]]
 latLims = [lat_reg[0], lat_reg[-1]]
 
-# NAFO divisions
+# NAFO divisions (masks on the climato grid are computed once, see azu.get_nafo_mask)
 nafo_div = azu.get_nafo_divisions()
-polygon3L = Polygon(zip(nafo_div['3L']['lon'], nafo_div['3L']['lat']))
-polygon3N = Polygon(zip(nafo_div['3N']['lon'], nafo_div['3N']['lat']))
-polygon3O = Polygon(zip(nafo_div['3O']['lon'], nafo_div['3O']['lat']))
-shape = [polygon3L, polygon3N, polygon3O]
-shape_3LNO = cascaded_union(shape)
-shape_3Ps = Polygon(zip(nafo_div['3Ps']['lon'], nafo_div['3Ps']['lat']))
-shape_2J = Polygon(zip(nafo_div['2J']['lon'], nafo_div['2J']['lat']))
-shape_3K = Polygon(zip(nafo_div['3K']['lon'], nafo_div['3K']['lat']))
-
-
-dict_stats_3LNO = {}
-dict_stats_3Ps = {}
-dict_stats_3K = {}
-dict_stats_2J = {}
 
+# Bottom temperature of all years (climato, NAFO masks loaded once, years in parallel)
+ds_years = azu.get_bottomT_years(years, season, climato_file, workers=4)
 
 # Loop on years
 for year in years:
     print ' ---- ' + np.str(year) + ' ---- '
-    year_file = '/home/cyrf0006/data/dev_database/' + np.str(year) + '.nc'
-    Tdict = azu.get_bottomT(year_file, season, climato_file)    
-    Tbot = Tdict['Tbot']
-    lons = Tdict['lons']
-    lats = Tdict['lats']
+    Tbot = ds_years['Tbot'].sel(year=year).values
+    lons = ds_years['lon_casts'].values[ds_years['year_casts'].values==year]
+    lats = ds_years['lat_casts'].values[ds_years['year_casts'].values==year]
     anom = Tbot-Tbot_climato
 
-    
-    # NAFO division stats    
-    dict_stats_3LNO[np.str(year)] = azu.polygon_temperature_stats(Tdict, shape_3LNO)
-    dict_stats_3Ps[np.str(year)] = azu.polygon_temperature_stats(Tdict, shape_3Ps)
-    dict_stats_2J[np.str(year)] = azu.polygon_temperature_stats(Tdict, shape_2J)
-    dict_stats_3K[np.str(year)] = azu.polygon_temperature_stats(Tdict, shape_3K)
-
     if plot:
         # 1.1 - Plot Anomaly
         fig, ax = plt.subplots(nrows=1, ncols=1)
@@ -162,10 +139,13 @@ for year in years:
 
 
     
-df_3Ps = pd.DataFrame.from_dict(dict_stats_3Ps, orient='index')
-df_3LNO = pd.DataFrame.from_dict(dict_stats_3LNO, orient='index')
-df_3K = pd.DataFrame.from_dict(dict_stats_3K, orient='index')
-df_2J = pd.DataFrame.from_dict(dict_stats_2J, orient='index')
+# NAFO division stats
+df_stats = ds_years[azu.temperature_stats].to_dataframe().loc[:, azu.temperature_stats]
+df_stats.index = df_stats.index.set_levels([df_stats.index.levels[0], df_stats.index.levels[1].astype(np.str)])
+df_3Ps = df_stats.loc['3Ps']
+df_3LNO = df_stats.loc['3LNO']
+df_3K = df_stats.loc['3K']
+df_2J = df_stats.loc['2J']
 
 keyboard
 
@@ -0,0 +1,144 @@
+"""Tools to query the yearly netCDF archive (e.g. /home/cyrf0006/data/dev_database/*.nc, see pfile_tools.pfiles_to_netcdf)
+
+Contains following functions:
+- season_to_months(season)
+- archive_files(infiles)
+- query_archive(infiles, lonLims=None, latLims=None, timeLims=None, months=None, levelLims=None, variables=['temperature', 'salinity'])
+
+Instead of opening the whole archive (xr.open_mfdataset) and masking it (ds.where(..., drop=True)),
+the 1D coordinates of each file (longitude, latitude, time) are read first and only the selected
+casts (and levels) of the 2D variables are read. Files without selected casts are not read at all.
+
+----------
+
+Atlantic Zone Monitoring Program @NAFC:
+https://azmp-nl.github.io/
+
+"""
+
+__author__ = 'Frederic.Cyr@dfo-mpo.gc.ca'
+__version__ = '0.1'
+
+import glob
+import netCDF4
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+# Months of each season (as used in azmp_utils)
+season_months = {'spring' : [4, 5, 6], 'summer' : [7, 8, 9], 'fall' : [10, 11, 12]}
+
+
+def season_to_months(season):
+    """ Returns the months of a season ('spring', 'summer' or 'fall'), None (all months) otherwise
+
+    """
+    if isinstance(season, basestring) and (season in season_months.keys()):
+        return season_months[season]
+    else:
+        print('!! no season specified, used them all! !!')
+        return None
+
+
+def archive_files(infiles):
+    """ Returns the sorted list of files from a pattern (e.g. '/home/cyrf0006/data/dev_database/*.nc'),
+    a file name or a list of files
+
+    """
+    if isinstance(infiles, basestring):
+        return sorted(glob.glob(infiles))
+    else:
+        return sorted(infiles)
+
+
+def query_archive(infiles, lonLims=None, latLims=None, timeLims=None, months=None, levelLims=None, variables=['temperature', 'salinity']):
+    """ Returns the casts of the archive selected by position, time and depth in a xarray Dataset
+    (same structure as xr.open_mfdataset(infiles): dims time and level, longitude(time), latitude(time), ...)
+
+    Input params:
+    - infiles: files pattern (e.g. '/home/cyrf0006/data/dev_database/*.nc'), file name or list of files
+    - lonLims, latLims: ]min, max[ (limits excluded, as ds.where((ds.longitude>min) & (ds.longitude<max)))
+    - timeLims: [start, end[ (anything understood by pd.Timestamp)
+    - months: list of months (e.g. [4, 5, 6], or season_months['spring'])
+    - levelLims: ]min, max[ (one of them can be None, e.g. [None, 1000])
+    - variables: variables to read (2D, e.g. 'temperature', or 1D, e.g. 'trip_ID');
+      longitude and latitude are always read
+
+    Returns None if no cast is selected.
+    usage ex:
+    import archive_tools as archive
+    ds = archive.query_archive('/home/cyrf0006/data/dev_database/*.nc', lonLims=[-55, -50], latLims=[45, 50], months=archive.season_months['summer'], levelLims=[10, 500], variables=['temperature'])
+
+    """
+    variables = [var for var in variables if var not in ['longitude', 'latitude']]
+    datasets = []
+    n_casts = 0
+    n_selected = 0
+
+    for fname in archive_files(infiles):
+        nc_in = netCDF4.Dataset(fname)
+        v = nc_in.variables
+
+        ## ---- Select casts from 1D coordinates ---- ##
+        lon = np.ma.filled(v['longitude'][:].astype(float), np.nan)
+        lat = np.ma.filled(v['latitude'][:].astype(float), np.nan)
+        times = netCDF4.num2date(v['time'][:], v['time'].units, getattr(v['time'], 'calendar', 'standard'))
+        times = pd.DatetimeIndex(np.atleast_1d(times))
+        keep = np.ones(lon.size, dtype=bool)
+        with np.errstate(invalid='ignore'):
+            if lonLims is not None:
+                keep &= (lon>lonLims[0]) & (lon<lonLims[1])
+            if latLims is not None:
+                keep &= (lat>latLims[0]) & (lat<latLims[1])
+        if timeLims is not None:
+            keep &= (times>=pd.Timestamp(timeLims[0])) & (times<pd.Timestamp(timeLims[1]))
+        if months is not None:
+            keep &= np.in1d(times.month, months)
+        n_casts += keep.size
+        idx = np.where(keep)[0]
+        if idx.size == 0:
+            nc_in.close()
+            continue
+        n_selected += idx.size
+
+        ## ---- Select levels ---- ##
+        levels = v['level'][:]
+        keep_level = np.ones(levels.size, dtype=bool)
+        if levelLims is not None:
+            if levelLims[0] is not None:
+                keep_level &= levels>levelLims[0]
+            if levelLims[1] is not None:
+                keep_level &= levels<levelLims[1]
+        idx_level = np.where(keep_level)[0]
+        if idx_level.size:
+            level_slice = slice(idx_level[0], idx_level[-1]+1)
+        else:
+            level_slice = slice(0, 0)
+
+        ## ---- Read selected casts only (by blocks of consecutive casts) ---- ##
+        runs = np.split(idx, np.where(np.diff(idx)>1)[0]+1)
+        data_vars = {'longitude' : (['time'], lon[idx]), 'latitude' : (['time'], lat[idx])}
+        for var in variables:
+            if var not in v.keys():
+                print('!! ' + var + ' not in ' + fname + ' !!')
+                continue
+            if v[var].dimensions == ('time', 'level'):
+                blocks = [v[var][run[0]:run[-1]+1, level_slice] for run in runs]
+                data = np.ma.concatenate(blocks, axis=0)
+                data = data[:, keep_level[level_slice]]
+                data_vars[var] = (['time', 'level'], np.ma.filled(data.astype(float), np.nan))
+            else:
+                data = v[var][:]
+                if isinstance(data, np.ma.MaskedArray):
+                    data = np.ma.filled(data.astype(float), np.nan)
+                data_vars[var] = (['time'], np.asarray(data)[idx])
+        nc_in.close()
+
+        datasets.append(xr.Dataset(data_vars, coords={'time' : times[idx], 'level' : levels[keep_level]}))
+
+    print(' -> ' + str(n_selected) + ' casts selected out of ' + str(n_casts))
+    if len(datasets) == 0:
+        print('!! no cast selected !!')
+        return None
+
+    return xr.concat(datasets, dim='time')
@@ -29,6 +29,7 @@ import xarray as xr
 from mpl_toolkits.basemap import Basemap
 from scipy.interpolate import griddata
 from scipy.interpolate import interp1d  # to remove NaNs in profiles
+import bathy_tools as bathy
 
 
     
@@ -130,36 +131,8 @@ def get_bottomT_climato(INFILES, LON_REG,  LAT_REG, year_lims=[1981, 2010], seas
 
         ## ---- Bathymetry ---- ####
         print('Load and grid bathymetry')
-        # Load data
-        dataset = netCDF4.Dataset(dataFile)
-        # Extract variables
-        #x = dataset.variables['x_range'] 
-        #y = dataset.variables['y_range']
-        x = [-179-59.75/60, 179+59.75/60] # to correct bug in 30'' dataset?
-        y = [-89-59.75/60, 89+59.75/60]
-        spacing = dataset.variables['spacing']
-        # Compute Lat/Lon
-        nx = int((x[-1]-x[0])/spacing[0]) + 1  # num pts in x-dir
-        ny = int((y[-1]-y[0])/spacing[1]) + 1  # num pts in y-dir
-        lon = np.linspace(x[0],x[-1],nx)
-        lat = np.linspace(y[0],y[-1],ny)
-        # interpolate data on regular grid (temperature grid)
-        # Reshape data
-        zz = dataset.variables['z']
-        Z = zz[:].reshape(ny, nx)
-        Z = np.flipud(Z) # <------------ important!!!
-        # Reduce data according to Region params
-        idx_lon = np.where((lon>=lonLims[0]) & (lon<=lonLims[1]))
-        idx_lat = np.where((lat>=latLims[0]) & (lat<=latLims[1]))
-        Z = Z[idx_lat[0][0]:idx_lat[0][-1]+1, idx_lon[0][0]:idx_lon[0][-1]+1]
-        lon = lon[idx_lon[0]]
-        lat = lat[idx_lat[0]]
-        # interpolate data on regular grid (temperature grid)
-        lon_grid_bathy, lat_grid_bathy = np.meshgrid(lon,lat)
-        lon_vec_bathy = np.reshape(lon_grid_bathy, lon_grid_bathy.size)
-        lat_vec_bathy = np.reshape(lat_grid_bathy, lat_grid_bathy.size)
-        z_vec = np.reshape(Z, Z.size)
-        Zitp = griddata((lon_vec_bathy, lat_vec_bathy), z_vec, (lon_grid, lat_grid), method='linear')
+        # Load data (window of the region only, cached on disk)
+        Zitp = bathy.get_bathymetry_on_grid(lon_reg, lat_reg, dataFile)
         print(' -> Done!')
 
         ## ---- Get CTD data --- ##
@@ -325,36 +298,8 @@ def get_bottomS_climato(INFILES, LON_REG,  LAT_REG, year_lims=[1981, 2010], seas
 
         ## ---- Bathymetry ---- ####
         print('Load and grid bathymetry')
-        # Load data
-        dataset = netCDF4.Dataset(dataFile)
-        # Extract variables
-        #x = dataset.variables['x_range'] 
-        #y = dataset.variables['y_range']
-        x = [-179-59.75/60, 179+59.75/60] # to correct bug in 30'' dataset?
-        y = [-89-59.75/60, 89+59.75/60]
-        spacing = dataset.variables['spacing']
-        # Compute Lat/Lon
-        nx = int((x[-1]-x[0])/spacing[0]) + 1  # num pts in x-dir
-        ny = int((y[-1]-y[0])/spacing[1]) + 1  # num pts in y-dir
-        lon = np.linspace(x[0],x[-1],nx)
-        lat = np.linspace(y[0],y[-1],ny)
-        # interpolate data on regular grid (temperature grid)
-        # Reshape data
-        zz = dataset.variables['z']
-        Z = zz[:].reshape(ny, nx)
-        Z = np.flipud(Z) # <------------ important!!!
-        # Reduce data according to Region params
-        idx_lon = np.where((lon>=lonLims[0]) & (lon<=lonLims[1]))
-        idx_lat = np.where((lat>=latLims[0]) & (lat<=latLims[1]))
-        Z = Z[idx_lat[0][0]:idx_lat[0][-1]+1, idx_lon[0][0]:idx_lon[0][-1]+1]
-        lon = lon[idx_lon[0]]
-        lat = lat[idx_lat[0]]
-        # interpolate data on regular grid (temperature grid)
-        lon_grid_bathy, lat_grid_bathy = np.meshgrid(lon,lat)
-        lon_vec_bathy = np.reshape(lon_grid_bathy, lon_grid_bathy.size)
-        lat_vec_bathy = np.reshape(lat_grid_bathy, lat_grid_bathy.size)
-        z_vec = np.reshape(Z, Z.size)
-        Zitp = griddata((lon_vec_bathy, lat_vec_bathy), z_vec, (lon_grid, lat_grid), method='linear')
+        # Load data (window of the region only, cached on disk)
+        Zitp = bathy.get_bathymetry_on_grid(lon_reg, lat_reg, dataFile)
         print(' -> Done!')
 
         ## ---- Get CTD data --- ##
@@ -23,26 +23,11 @@ import matplotlib.pyplot as plt
 import numpy as np
 #import time as tt
 import xarray as xr
-#import netCDF4 as nc
+import netCDF4
 #import os
 #from sys import version_info
-from math import radians, cos, sin, asin, sqrt
-from math import radians, cos, sin, asin, sqrt
-
-
-def haversine(lon1, lat1, lon2, lat2):
-    """
-    Calculate the great circle distance between two points 
-    on the earth (specified in decimal degrees)
-    """
-    # convert decimal degrees to radians 
-    lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
-    dlon = lon2 - lon1 
-    dlat = lat2 - lat1 
-    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-    c = 2 * asin(sqrt(a)) 
-    km = 6367 * c
-    return km
+import geodesy_tools as geo
+import station_tools as stn
 
 
 def section_bathymetry(section_name):
@@ -75,6 +60,71 @@ def section_bathymetry(section_name):
     return bathymetry
 
 
+def get_section(nc_file, survey_name, section_name, var_name, max_distance=None):
+    """
+    Extract one section of a survey from a yearly netCDF file (see pfile_tools.pfiles_to_netcdf).
+
+    Casts are selected on the 1D variables trip_ID (containing survey_name) and comments
+    (containing section_name + '-') and only the rows of var_name of these casts are read.
+    If max_distance (km) is given, casts are rather selected by position: casts of the survey
+    whose nearest standard station (among all stations, within max_distance) is in the section
+    (see station_tools for the rule).
+    Returns a DataArray (station x level) sorted by time, with coordinates time, longitude,
+    latitude, comments and distance (km, from the St.27 end of the section), or None if
+    the section is not in the file.
+    usage ex:
+    da = get_section('/home/cyrf0006/data/dev_database/2017.nc', '39176', 'FC', 'temperature')
+    da = get_section('/home/cyrf0006/data/dev_database/2017.nc', '39176', 'FC', 'temperature', max_distance=5)
+    da.plot(x='distance', y='level', yincrease=False)
+    """
+
+    nc_in = netCDF4.Dataset(nc_file)
+    v = nc_in.variables
+
+    # Select casts on 1D variables
+    trip_ID = pd.Series(np.asarray(v['trip_ID'][:], dtype=object)).fillna('').astype(str)
+    comments = pd.Series(np.asarray(v['comments'][:], dtype=object)).fillna('').astype(str)
+    if max_distance is None:
+        keep = trip_ID.str.contains(survey_name).values & comments.str.contains(section_name + '-').values
+    else:
+        lon = np.ma.filled(v['longitude'][:].astype(float), np.nan)
+        lat = np.ma.filled(v['latitude'][:].astype(float), np.nan)
+        df_stn = stn.assign_stations(lon, lat, max_distance=max_distance)
+        keep = trip_ID.str.contains(survey_name).values & (df_stn['section'].values == stn.section_codes.get(section_name, section_name))
+    idx = np.where(keep)[0]
+    if idx.size == 0:
+        print('!! section ' + section_name + ' not found for survey ' + survey_name + ' in ' + nc_file + ' !!')
+        nc_in.close()
+        return None
+
+    # Read rows of selected casts only (by blocks of consecutive casts)
+    runs = np.split(idx, np.where(np.diff(idx)>1)[0]+1)
+    data = np.ma.concatenate([v[var_name][run[0]:run[-1]+1, :] for run in runs], axis=0)
+    data = np.ma.filled(data.astype(float), np.nan)
+    level = v['level'][:]
+    times = pd.to_datetime(np.atleast_1d(netCDF4.num2date(v['time'][idx], v['time'].units, getattr(v['time'], 'calendar', 'standard')))).values
+    lon_array = np.ma.filled(v['longitude'][idx].astype(float), np.nan)
+    lat_array = np.ma.filled(v['latitude'][idx].astype(float), np.nan)
+    nc_in.close()
+
+    # Sort by time
+    order = np.argsort(times, kind='mergesort')
+    data = data[order,:]
+    times = times[order]
+    lon_array = lon_array[order]
+    lat_array = lat_array[order]
+    stations = comments.values[idx][order]
+
+    # compute distance (from St.27 end of the section)
+    distance = geo.section_distance(lon_array, lat_array)
+
+    da = xr.DataArray(data, dims=['station', 'level'], name=var_name,
+                      coords={'level' : level, 'time' : ('station', times),
+                              'longitude' : ('station', lon_array), 'latitude' : ('station', lat_array),
+                              'comments' : ('station', stations), 'distance' : ('station', distance)})
+    return da
+
+
 def standard_section_plot(nc_file, survey_name, section_name, var_name):
     """
     Contour plot on standard AZMP-NL sections for a certain year (specified with nc_file), season (specified as survey), section and variable.
@@ -92,39 +142,13 @@ def standard_section_plot(nc_file, survey_name, section_name, var_name):
             'size'   : 14}
     plt.rc('font', **font)
 
-    # Open netCDF file using xarray
-    ds = xr.open_dataset(nc_file)
-    zVec = ds.level.to_masked_array()
-
-    # Select Survey and switch to DataFrame
-    #ds = ds.sel(time=ds['trip_ID'].values==survey_name)
-    df = ds.to_dataframe()
-
-    ## ----  plot FC-line ---- ##
-    df_section =  df[df['trip_ID'].str.contains(survey_name)] # Restrict for survey-name
-    df_section =  df_section[df_section['comments'].str.contains(section_name + '-')] # restrict for section name
-    sr_var = df_section[var_name]
-    sr_lon = df_section['longitude']
-    sr_lat = df_section['latitude']
-    sr_stn = df_section['comments']
-
-    df_stn = sr_stn.unstack()
-    df_var = sr_var.unstack()
-    df_lat = sr_lat.unstack()
-    df_lon = sr_lon.unstack()
-
-    # compute distance
-    lon_array = df_lon.values[0,]
-    lat_array = df_lat.values[0,]
-    distance = np.zeros(lon_array.shape)
-    for i in range(lon_array.size):
-        distance[i] = haversine(lon_array[0], lat_array[0], lon_array[i], lat_array[i])
-
-    # Check which direction we are going (approaching St.27 or not)
-    St27 = [47.550, -52.590]
-    if haversine(lon_array[0], lat_array[0], St27[1], St27[0]) > haversine(lon_array[-1], lat_array[-1], St27[1], St27[0]):
-        distance = np.abs(distance-distance.max())
-        
+    # Extract section (station x level)
+    da = get_section(nc_file, survey_name, section_name, var_name)
+    if da is None:
+        return None
+    distance = da['distance'].values
+    df_var = da.to_pandas().T # level x station
+
     # retrieve bathymetry using function
     bathymetry = section_bathymetry(section_name)
 
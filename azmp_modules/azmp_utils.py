@@ -2,12 +2,18 @@
 
 Contains following functions:
 - get_nafo_divisions()
+- get_polygon_mask(lon_reg, lat_reg, xlon, xlat)
+- get_nafo_mask(lon_reg, lat_reg, divisions)
+- get_bottom_climato(INFILES, LON_REG,  LAT_REG, variables=['temperature', 'salinity'], year_lims=[1981, 2010], season=[], zlims=[10, 1000], dz=5, h5_outputfile=[])
 - get_bottomT_climato(INFILES, LON_REG,  LAT_REG, year_lims=[1981, 2010], season=[], zlims=[10, 1000], dz=5, h5_outputfile=[])
 - get_bottomS_climato(INFILES, LON_REG,  LAT_REG, year_lims=[1981, 2010], season=[], zlims=[10, 1000], dz=5, h5_outputfile=[])
 - get_bottomT(year_file, season, climato_file):
 - get_bottomS(year_file, season, climato_file):
+- get_bottomT_years(years, season, climato_file, year_path='/home/cyrf0006/data/dev_database/', regions=['3LNO', '3Ps', '2J', '3K'], workers=1)
 - bottomT_quickplot(h5_outputfile, figure_file=[])
 - Tbot_to_GIS_ascii(h5file, ascfile)
+- polygon_temperature_stats(dict, shape)
+- regions_temperature_stats(Tbot, bathy, lon_reg, lat_reg, regions, years=None)
 -
 
 ** idea: add function 'plot_nafo_division(dict)'
@@ -24,7 +30,12 @@ __version__ = '0.1'
 
 import h5py
 import os
+import re
 import sys
+import glob
+import shutil
+import hashlib
+import datetime
 import netCDF4
 import numpy as np
 import pandas as pd
@@ -33,10 +44,16 @@ import xarray as xr
 from mpl_toolkits.basemap import Basemap
 from scipy.interpolate import griddata
 from scipy.interpolate import interp1d  # to remove NaNs in profiles
+from scipy.interpolate import LinearNDInterpolator
+from scipy.spatial import Delaunay
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import bathy_tools as bathy
+import archive_tools as archive
+from matplotlib.path import Path
 from shapely.geometry import Point
 from shapely.geometry.polygon import Polygon
 from shapely.ops import cascaded_union
-from area import area # external fns to compute surface area
 from seawater import extras as swx
 
     
@@ -91,6 +108,65 @@ def get_nafo_divisions():
     return dict
 
 
+# Masks of NAFO divisions already rasterized (see get_nafo_mask)
+nafo_masks = {}
+
+def get_polygon_mask(lon_reg, lat_reg, xlon, xlat):
+    """ Returns a boolean mask[lat_reg, lon_reg] of the grid points inside the polygon (xlon, xlat)
+    (vectorized point-in-polygon with matplotlib.path, no loop on the grid)
+
+    usage ex:
+    nafo_div = azu.get_nafo_divisions()
+    mask3L = azu.get_polygon_mask(lon_reg, lat_reg, nafo_div['3L']['lon'], nafo_div['3L']['lat'])
+    
+    """
+    path = Path(np.stack((xlon, xlat), axis=1))
+    lon_grid, lat_grid = np.meshgrid(lon_reg,lat_reg)
+    mask = path.contains_points(np.stack((lon_grid.ravel(), lat_grid.ravel()), axis=1))
+
+    return mask.reshape(np.size(lat_reg), np.size(lon_reg))
+
+def get_nafo_mask(lon_reg, lat_reg, divisions):
+    """ Returns a boolean mask[lat_reg, lon_reg] of the grid points inside NAFO division(s)
+    
+    Input params:
+    - divisions: a division (e.g. '3Ps'), a union written as one name (e.g. '3LNO' or '2J3KL')
+      or a list of divisions (e.g. ['3L', '3N', '3O']). See get_nafo_divisions.
+      ValueError is raised if a name cannot be parsed or a division is unknown.
+
+    The mask of each division is rasterized once per grid and kept in memory (nafo_masks),
+    so calling it again (e.g. for every year on the same climatology grid) costs nothing.
+    usage ex:
+    mask_3LNO = azu.get_nafo_mask(lon_reg, lat_reg, '3LNO')
+    Tbot[~mask_3LNO] = np.nan
+    
+    """
+    if isinstance(divisions, basestring):
+        # '2J3KL' -> ['2J', '3K', '3L'] ('s' of 'Ps' is lowercase)
+        if re.match('^([0-9]([A-Z][a-z]*)+)+$', divisions) is None:
+            raise ValueError('NAFO divisions ' + divisions + ' cannot be parsed (e.g. 3Ps, 3LNO or 2J3KL)')
+        div_list = []
+        for token in re.findall('[0-9]|[A-Z][a-z]*', divisions):
+            if token.isdigit():
+                number = token
+            else:
+                div_list.append(number + token)
+    else:
+        div_list = list(divisions)
+
+    nafo_div = get_nafo_divisions()
+    grid_key = (np.asarray(lon_reg, dtype=float).tobytes(), np.asarray(lat_reg, dtype=float).tobytes())
+    mask = np.zeros((np.size(lat_reg), np.size(lon_reg)), dtype=bool)
+    for div in div_list:
+        if div not in nafo_div.keys():
+            raise ValueError('NAFO division ' + div + ' unknown')
+        key = (div,) + grid_key
+        if key not in nafo_masks:
+            nafo_masks[key] = get_polygon_mask(lon_reg, lat_reg, nafo_div[div]['lon'], nafo_div[div]['lat'])
+        mask |= nafo_masks[key]
+
+    return mask
+
 def build_NLshelf_definition():
     """ Will generate a dict with NL shelf 1000m limit shape.
 
@@ -106,33 +182,8 @@ def build_NLshelf_definition():
     lat_reg = np.arange(latLims[0]+dc/2, latLims[1]-dc/2, dc)
     dataFile = '/home/cyrf0006/data/GEBCO/GEBCO_2014_1D.nc' # Maybe find a better way to handle this file
     lon_grid, lat_grid = np.meshgrid(lon_reg,lat_reg)
-    # Load data
-    dataset = netCDF4.Dataset(dataFile)
-    x = [-179-59.75/60, 179+59.75/60] # to correct bug in 30'' dataset?
-    y = [-89-59.75/60, 89+59.75/60]
-    spacing = dataset.variables['spacing']
-    # Compute Lat/Lon
-    nx = int((x[-1]-x[0])/spacing[0]) + 1  # num pts in x-dir
-    ny = int((y[-1]-y[0])/spacing[1]) + 1  # num pts in y-dir
-    lon = np.linspace(x[0],x[-1],nx)
-    lat = np.linspace(y[0],y[-1],ny)
-    # interpolate data on regular grid (temperature grid)
-    # Reshape data
-    zz = dataset.variables['z']
-    Z = zz[:].reshape(ny, nx)
-    Z = np.flipud(Z) # <------------ important!!!
-    # Reduce data according to Region params
-    idx_lon = np.where((lon>=lonLims[0]) & (lon<=lonLims[1]))
-    idx_lat = np.where((lat>=latLims[0]) & (lat<=latLims[1]))
-    Z = Z[idx_lat[0][0]:idx_lat[0][-1]+1, idx_lon[0][0]:idx_lon[0][-1]+1]
-    lon = lon[idx_lon[0]]
-    lat = lat[idx_lat[0]]
-    # interpolate data on regular grid (temperature grid)
-    lon_grid_bathy, lat_grid_bathy = np.meshgrid(lon,lat)
-    lon_vec_bathy = np.reshape(lon_grid_bathy, lon_grid_bathy.size)
-    lat_vec_bathy = np.reshape(lat_grid_bathy, lat_grid_bathy.size)
-    z_vec = np.reshape(Z, Z.size)
-    Zitp = griddata((lon_vec_bathy, lat_vec_bathy), z_vec, (lon_grid, lat_grid), method='linear')
+    # Load data (window of the region only, cached on disk)
+    Zitp = bathy.get_bathymetry_on_grid(lon_reg, lat_reg, dataFile)
 
     # Use matplotlib contour to extract 1000m isobath
     cc = plt.contour(lon_reg, lat_reg, -Zitp, [1000])
@@ -181,219 +232,416 @@ def get_NLshelf(infile):
     return A
 
 
-def get_bottomT_climato(INFILES, LON_REG,  LAT_REG, year_lims=[1981, 2010], season=[], zlims=[10, 1000], dz=5, h5_outputfile=[]):
-    """ Generate and returns the climatological bottom temperature map.
-    This script uses GEBCO dada. User should update the path below.
-    Maybe this is something I could work on...
+def get_cast_cells(lons, lats, lon_reg, lat_reg, dc):
+    """ Returns the index of the cell of each cast (j*lon_reg.size + i, -1 if outside the grid)
+    (cells are centered on lon_reg, lat_reg and dc wide in both directions)
 
-    If the pickled filename exists, the function will by-pass the processing and return only saved climatology.
+    """
+    lons = np.asarray(lons)
+    lats = np.asarray(lats)
+    i = np.floor((lons - lon_reg[0] + dc/2)/dc).astype(int)
+    j = np.floor((lats - lat_reg[0] + dc/2)/dc).astype(int)
+    cells = j*lon_reg.size + i
+    cells[(i<0) | (i>=lon_reg.size) | (j<0) | (j>=lat_reg.size)] = -1
+
+    return cells
+
+
+def fill_regular_cube(df, lons, lats, lon_reg, lat_reg, dc, vmax=None, cells=None):
+    """ Average casts on a regular grid and fill vertical gaps (used by get_bottomT_climato, get_bottomT, etc.)
+
+    Input params:
+    - df: DataFrame of vertically binned casts (one row per cast, columns are depth bins)
+    - lons, lats: coordinates of the casts (rows of df)
+    - lon_reg, lat_reg: centers of the grid cells (cells are dc wide in both directions)
+    - vmax: values >= vmax are ignored in the vertical interpolation (e.g. 30 for temperature)
+    - cells: cell of each cast if already known (see get_cast_cells)
+
+    Each cast is assigned once to its cell and all casts of a cell are averaged (NaNs ignored).
+    If a cell has more than one good value, gaps between the first and last good values
+    are linearly interpolated (NaN outside). If it has only one, its mean profile is kept as is.
+
+    Returns the cube V(lat_reg, lon_reg, z)
+    usage ex:
+    V = fill_regular_cube(df_temp, lons, lats, lon_reg, lat_reg, dc, vmax=30)
+
+    """
+    z = df.columns.values.astype(float)
+    V = np.full((lat_reg.size, lon_reg.size, z.size), np.nan)
+
+    # Assign casts to cells
+    if cells is None:
+        cells = get_cast_cells(lons, lats, lon_reg, lat_reg, dc)
+    idx_in = np.where(cells>=0)[0]
+    if idx_in.size == 0:
+        return V
+
+    # Average per cell
+    df_cells = df.iloc[idx_in].groupby(cells[idx_in]).mean()
+    tmp = df_cells.values
+    good = ~np.isnan(tmp)
+    if vmax is not None:
+        good[good] = tmp[good] < vmax
+    n_good = good.sum(axis=1)
+
+    # Vertical interpolation between good values (index of previous and next good value at each level)
+    k = np.arange(z.size)
+    idx_prev = np.maximum.accumulate(np.where(good, k, -1), axis=1)
+    idx_next = np.minimum.accumulate(np.where(good, k, z.size)[:,::-1], axis=1)[:,::-1]
+    inside = (idx_prev>=0) & (idx_next<z.size)
+    idx_prev = np.clip(idx_prev, 0, z.size-1)
+    idx_next = np.clip(idx_next, 0, z.size-1)
+    rows = np.arange(tmp.shape[0])[:,np.newaxis]
+    z0 = z[idx_prev]
+    z1 = z[idx_next]
+    y0 = tmp[rows, idx_prev]
+    y1 = tmp[rows, idx_next]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        itp = np.where(idx_prev==idx_next, y0, y0 + (y1-y0)*(z-z0)/(z1-z0))
+    itp[~inside] = np.nan
+
+    # Fill the cube
+    filled = np.where((n_good==1)[:,np.newaxis], tmp, itp)
+    filled[n_good==0,:] = np.nan
+    V_flat = V.reshape(lat_reg.size*lon_reg.size, z.size)
+    V_flat[df_cells.index.values,:] = filled
+
+    return V
+
+
+def interp_cube_levels(V, lon_reg, lat_reg, workers=1):
+    """ Horizontal (linear) interpolation of each level of a cube V(lat, lon, z) (see fill_regular_cube)
+
+    Same as calling griddata on the good (not NaN) cells of each level, but levels sharing
+    the same good cells are interpolated together with a single triangulation.
+    Levels with 3 good cells or less are left unchanged.
+    If workers > 1, groups of levels are interpolated by a pool of threads.
+
+    Returns the interpolated cube
+    usage ex:
+    V = interp_cube_levels(V, lon_reg, lat_reg)
+
+    """
+    lon_grid, lat_grid = np.meshgrid(lon_reg,lat_reg)
+    lon_vec = np.reshape(lon_grid, lon_grid.size)
+    lat_vec = np.reshape(lat_grid, lat_grid.size)
+    V_flat = np.reshape(V, (lon_grid.size, V.shape[2]))
+
+    # Group levels by good cells
+    groups = {}
+    for k in range(V.shape[2]):
+        idx_good = ~np.isnan(V_flat[:,k])
+        if idx_good.sum()>3: # will ignore depth where no data exist
+            key = idx_good.tobytes()
+            if key not in groups:
+                groups[key] = (idx_good, [])
+            groups[key][1].append(k)
+
+    def interp_group(group):
+        idx_good, levels = group
+        tri = Delaunay(np.stack((lon_vec[idx_good], lat_vec[idx_good]), axis=1))
+        interp = LinearNDInterpolator(tri, V_flat[idx_good][:,levels])
+        return levels, interp(lon_vec, lat_vec)
+
+    if workers > 1:
+        pool = ThreadPool(workers)
+        results = pool.map(interp_group, groups.values())
+        pool.close()
+        pool.join()
+    else:
+        results = [interp_group(group) for group in groups.values()]
+
+    V_itp = V.copy()
+    for levels, zi in results:
+        V_itp[:,:,levels] = np.reshape(zi, (lat_reg.size, lon_reg.size, len(levels)))
+
+    return V_itp
+
+
+def get_bottom_values(V, z, Zitp, tol=20, tol_max=50):
+    """ Extract bottom values from a cube V(lat, lon, z) (e.g. temperature, salinity, oxygen)
+
+    Input params:
+    - V: cube (see fill_regular_cube)
+    - z: depth vector of the cube (positive)
+    - Zitp: bathymetry on the same grid (negative below sea level)
+    - tol: value closest to bottom is taken if it is less than 'tol' m from the bottom (flag 1)
+    - tol_max: ...or less than 'tol_max' m from the bottom (flag 2)
+
+    For all cells at once, the good (not NaN) value the closest to the bottom depth is used.
+    Returns a dict with:
+    - 'Vbot': bottom value (NaN if no value within tol_max from the bottom)
+    - 'zbot': depth of the value the closest to the bottom (NaN if no data)
+    - 'dist': distance to the bottom of this value (bottom depth - zbot)
+    - 'flag': 0 (no value used), 1 (within tol) or 2 (within tol_max)
+    usage ex:
+    bottom = get_bottom_values(V, z, Zitp)
+    Tbot = bottom['Vbot']
+
+    """
+    z = np.asarray(z, dtype=float)
+    bottom_depth = -Zitp # minus to turn positive
+
+    # Distance of each good value to bottom (inf where no data)
+    with np.errstate(invalid='ignore'):
+        dist = np.abs(bottom_depth[:,:,np.newaxis] - z[np.newaxis,np.newaxis,:])
+    dist[np.isnan(V) | np.isnan(dist)] = np.inf
+    idx_closest = np.argmin(dist, axis=2)
+    has_data = np.isfinite(dist).any(axis=2)
+
+    # Value closest to bottom
+    jj, ii = np.indices(idx_closest.shape)
+    zbot = np.where(has_data, z[idx_closest], np.nan)
+    Vclosest = V[jj, ii, idx_closest]
+    dist = bottom_depth - zbot
+
+    flag = np.zeros(idx_closest.shape, dtype=int)
+    with np.errstate(invalid='ignore'):
+        flag[np.abs(dist) <= tol_max] = 2
+        flag[np.abs(dist) <= tol] = 1
+    Vbot = np.where(flag>0, Vclosest, np.nan)
+
+    dict = {}
+    dict['Vbot'] = Vbot
+    dict['zbot'] = zbot
+    dict['dist'] = dist
+    dict['flag'] = flag
+
+    return dict
+
+
+# Bottom fields computed by get_bottom_climato for each variable of the archive
+# - name: name of the field in the output (H5 dataset and dict key)
+# - vmax: values >= vmax are not used in the vertical interpolation (see fill_regular_cube)
+# - valid_range: values outside [min, max] are removed before gridding
+climato_variables = {'temperature' : {'name' : 'Tbot', 'vmax' : 30, 'valid_range' : None},
+                     'salinity' : {'name' : 'Sbot', 'vmax' : None, 'valid_range' : [28, 36.75]}}
+
+# Cache of climatology products (see get_bottom_climato; set to None to disable)
+climato_cache_dir = os.path.expanduser('~/.azmp_cache/climato')
+climato_cache_size = 5e9 # bytes; least recently used products are removed above that
+# Version of the climatology algorithm (get_bottom_climato, fill_regular_cube, interp_cube_levels,
+# get_bottom_values); bump it when results change so cached products are rebuilt
+climato_version = 1
+
+def climato_cache_key(INFILES, lon_reg, lat_reg, variables, year_lims, season, zlims, dz, dataFile):
+    """ Returns the md5 key of a climatology product, computed from all its inputs:
+    parameters, grid, input files (path, size and mtime), bathymetry file and climato_version
+    (so products are rebuilt when the algorithm changes)
+    
+    """
+    filelist = archive.archive_files(INFILES) # same files as read by query_archive
+
+    key = hashlib.md5()
+    key.update(np.str([climato_version, variables, [climato_variables.get(v) for v in variables], list(year_lims), season, list(zlims), dz]).encode())
+    key.update(np.asarray(lon_reg, dtype=float).tobytes())
+    key.update(np.asarray(lat_reg, dtype=float).tobytes())
+    for fname in filelist + [dataFile]:
+        if os.path.isfile(fname):
+            stat = os.stat(fname)
+            key.update((os.path.abspath(fname) + ' ' + np.str(stat.st_size) + ' ' + np.str(stat.st_mtime)).encode())
+        else:
+            key.update(os.path.abspath(fname).encode())
+
+    return key.hexdigest()
+
+def read_bottom_climato(h5file, names):
+    """ Read bottom fields 'names' (e.g. ['Tbot']) with grid and bathymetry from a climatology H5 file
+    (output dict of get_bottom_climato)
+    
+    """
+    dict = {}
+    h5f = h5py.File(h5file,'r')
+    for name in names:
+        dict[name] = h5f[name][:]
+    dict['bathy'] = h5f['Zitp'][:]
+    dict['lon_reg'] = h5f['lon_reg'][:]
+    dict['lat_reg'] = h5f['lat_reg'][:]
+    dict['lon_orig'] = h5f['lon_orig'][:]
+    dict['lat_orig'] = h5f['lat_orig'][:]
+    h5f.close()
+
+    return dict
+
+def evict_climato_cache(max_size=None):
+    """ Remove least recently used products from climato_cache_dir until its size is below max_size
+    (default climato_cache_size)
+    
+    """
+    if max_size is None:
+        max_size = climato_cache_size
+    if (climato_cache_dir is None) or (os.path.isdir(climato_cache_dir) is False):
+        return
+    files = glob.glob(os.path.join(climato_cache_dir, 'climato_*.h5'))
+    files.sort(key=lambda x: os.stat(x).st_mtime) # mtime is updated when a product is used
+    total_size = np.sum([os.stat(fname).st_size for fname in files])
+    for fname in files:
+        if total_size <= max_size:
+            break
+        total_size -= os.stat(fname).st_size
+        os.remove(fname)
+        print(' -> ' + fname + ' removed from cache')
+
+def get_bottom_climato(INFILES, LON_REG,  LAT_REG, variables=['temperature', 'salinity'], year_lims=[1981, 2010], season=[], zlims=[10, 1000], dz=5, h5_outputfile=[]):
+    """ Generate and returns the climatological bottom maps of several variables at once.
+    The archive is read, subset and vertically binned only once for all variables and casts
+    are assigned to grid cells only once. All fields are saved in the same H5 file with
+    the grid and bathymetry (can be used as climato_file in get_bottomT and get_bottomS).
+    This script uses GEBCO dada (see bathy_tools).
+
+    Input params:
+    - variables: variables of the archive (see climato_variables for names in output
+      and filtering; other variables are returned under their own name without filtering)
+    - others: see get_bottomT_climato
+
+    Returns None if no historical cast is found in the region, season and years.
+
+    If h5_outputfile exists and was built with the same inputs, the function will by-pass the
+    processing and return only saved climatology (a file built with other parameters, data or climato_version
+    is rebuilt). Products are also kept in climato_cache_dir (keyed by all inputs, see
+    climato_cache_key), so the same climatology is never computed twice, even without h5_outputfile.
     
     Usage ex:
     import numpy as np
     import azmp_utils as azu
     dc = .10
-    lonLims = [-60, -44] # fish_hab region
-    latLims = [39, 56]
-    lon_reg = np.arange(lonLims[0]+dc/2, lonLims[1]-dc/2, dc)
-    lat_reg = np.arange(latLims[0]+dc/2, latLims[1]-dc/2, dc)
-    Tbot_dict = azu.get_bottomT_climato('/home/cyrf0006/data/dev_database/*.nc', lon_reg, lat_reg, season='fall', h5_outputfile='Tbot_climato_fall.h5')
-
-    For Eugene's LabSea:
-    dc = .10
-    lonLims = [-63, -56] # Lab Sea
-    latLims = [54, 59]
+    lonLims = [-60, -45] # FC AZMP report region
+    latLims = [42, 56]
     lon_reg = np.arange(lonLims[0]+dc/2, lonLims[1]-dc/2, dc)
     lat_reg = np.arange(latLims[0]+dc/2, latLims[1]-dc/2, dc)
-    Tbot_dict = azu.get_bottomT_climato('/home/cyrf0006/data/dev_database/*.nc', lon_reg, lat_reg, year_lims=[1928, 2017], season='fall', h5_outputfile='Tbot_climato_LabSea_fall_1950-2017.h5')
-
-    OR
-
-    azu.get_bottomT_climato('/home/cyrf0006/data/dev_database/*.nc', lon_reg, lat_reg, season='spring', h5_outputfile='Tbot_climato_spring.h5') 
+    bot_dict = azu.get_bottom_climato('/home/cyrf0006/data/dev_database/*.nc', lon_reg, lat_reg, season='spring', h5_outputfile='TSbot_climato_spring_0.10.h5')
+    Tbot = bot_dict['Tbot']
+    Sbot = bot_dict['Sbot']
     
     """
-    
-    ## ---- Check if H5 file exists ---- ##        
-    if os.path.isfile(h5_outputfile):
-        print [h5_outputfile + ' exist! Reading directly']
+    names = []
+    for var in variables:
+        names.append(climato_variables.get(var, {'name' : var})['name'])
+
+    dataFile = '/home/cyrf0006/data/GEBCO/GEBCO_2014_1D.nc' # Maybe find a better way to handle this file
+    cache_key = climato_cache_key(INFILES, LON_REG, LAT_REG, variables, year_lims, season, zlims, dz, dataFile)
+
+    ## ---- Check if H5 file exists (and was built with same inputs) ---- ##
+    if np.size(h5_outputfile) and os.path.isfile(h5_outputfile):
         h5f = h5py.File(h5_outputfile,'r')
-        Tbot = h5f['Tbot'][:]
-        lon_reg = h5f['lon_reg'][:]
-        lat_reg = h5f['lat_reg'][:]
-        lon_orig = h5f['lon_orig'][:]
-        lat_orig = h5f['lat_orig'][:]
-        Zitp = h5f['Zitp'][:]
+        file_key = h5f.attrs.get('cache_key')
         h5f.close()
+        if file_key is None:
+            print [h5_outputfile + ' exist! Reading directly (no cache key, inputs cannot be checked)']
+            return read_bottom_climato(h5_outputfile, names)
+        elif file_key == cache_key:
+            print [h5_outputfile + ' exist! Reading directly']
+            return read_bottom_climato(h5_outputfile, names)
+        else:
+            print [h5_outputfile + ' was built with other inputs (parameters, data or code), rebuild it']
+
+    ## ---- Check cache ---- ##
+    cache_file = None
+    if climato_cache_dir is not None:
+        cache_file = os.path.join(climato_cache_dir, 'climato_' + cache_key + '.h5')
+        if os.path.isfile(cache_file):
+            print [cache_file + ' in cache! Reading directly']
+            os.utime(cache_file, None) # recently used
+            if np.size(h5_outputfile):
+                shutil.copyfile(cache_file, h5_outputfile)
+            return read_bottom_climato(cache_file, names)
+
+    ## ---- Region parameters ---- ##
+    lonLims = [LON_REG[0], LON_REG[-1]]
+    latLims = [LAT_REG[0], LAT_REG[-1]]
+    zmin = zlims[0] # do try to compute bottom temp above that depth
+    zmax = zlims[1] # do try to compute bottom temp below that depth
+    lon_reg = LON_REG
+    lat_reg = LAT_REG
+    dc = np.round(np.diff(lon_reg[0:2]), 3)[0]
+
+    ## ---- Bathymetry ---- ####
+    print('Load and grid bathymetry')
+    # Load data (window of the region only, cached on disk)
+    Zitp = bathy.get_bathymetry_on_grid(lon_reg, lat_reg, dataFile)
+    print(' -> Done!')
 
-    else:
+    ## ---- Get CTD data (all variables in one pass) --- ##
+    print('Get historical data')
+    # Selection of region, season, time period for climatology and max depth (only selected casts are read)
+    ds = archive.query_archive(INFILES, lonLims, latLims, timeLims=[np.str(year_lims[0]) + '-01-01', np.str(year_lims[1]+1) + '-01-01'], months=archive.season_to_months(season), levelLims=[None, zmax], variables=variables)
+    if ds is None:
+        print('!! no historical data for this climatology [skip] !!')
+        return None
+    # Vertical binning of all variables together
+    lons = np.array(ds.longitude)
+    lats = np.array(ds.latitude)
+    bins = np.arange(dz/2.0, ds.level.max(), dz)
+    ds_binned = ds[variables].groupby_bins('level', bins).mean(dim='level').load()
+    print(' -> Done!')        
 
-        ## ---- Region parameters ---- ##
-        #    add_path('/home/cyrf0006/data/GEBCO/')
-        dataFile = '/home/cyrf0006/data/GEBCO/GEBCO_2014_1D.nc' # Maybe find a better way to handle this file
-        lonLims = [LON_REG[0], LON_REG[-1]]
-        latLims = [LAT_REG[0], LAT_REG[-1]]
-        zmin = zlims[0] # do try to compute bottom temp above that depth
-        zmax = zlims[1] # do try to compute bottom temp below that depth
-        lon_reg = LON_REG
-        lat_reg = LAT_REG
-        lon_grid, lat_grid = np.meshgrid(lon_reg,lat_reg)
-        dc = np.round(np.diff(lon_reg[0:2]), 3)[0]
-
-        ## ---- Bathymetry ---- ####
-        print('Load and grid bathymetry')
-        # Load data
-        dataset = netCDF4.Dataset(dataFile)
-        # Extract variables
-        #x = dataset.variables['x_range'] 
-        #y = dataset.variables['y_range']
-        x = [-179-59.75/60, 179+59.75/60] # to correct bug in 30'' dataset?
-        y = [-89-59.75/60, 89+59.75/60]
-        spacing = dataset.variables['spacing']
-        # Compute Lat/Lon
-        nx = int((x[-1]-x[0])/spacing[0]) + 1  # num pts in x-dir
-        ny = int((y[-1]-y[0])/spacing[1]) + 1  # num pts in y-dir
-        lon = np.linspace(x[0],x[-1],nx)
-        lat = np.linspace(y[0],y[-1],ny)
-        # interpolate data on regular grid (temperature grid)
-        # Reshape data
-        zz = dataset.variables['z']
-        Z = zz[:].reshape(ny, nx)
-        Z = np.flipud(Z) # <------------ important!!!
-        # Reduce data according to Region params
-        idx_lon = np.where((lon>=lonLims[0]) & (lon<=lonLims[1]))
-        idx_lat = np.where((lat>=latLims[0]) & (lat<=latLims[1]))
-        Z = Z[idx_lat[0][0]:idx_lat[0][-1]+1, idx_lon[0][0]:idx_lon[0][-1]+1]
-        lon = lon[idx_lon[0]]
-        lat = lat[idx_lat[0]]
-        # interpolate data on regular grid (temperature grid)
-        lon_grid_bathy, lat_grid_bathy = np.meshgrid(lon,lat)
-        lon_vec_bathy = np.reshape(lon_grid_bathy, lon_grid_bathy.size)
-        lat_vec_bathy = np.reshape(lat_grid_bathy, lat_grid_bathy.size)
-        z_vec = np.reshape(Z, Z.size)
-        Zitp = griddata((lon_vec_bathy, lat_vec_bathy), z_vec, (lon_grid, lat_grid), method='linear')
-        print(' -> Done!')
-
-        ## ---- Get CTD data --- ##
-        print('Get historical data')
-        ds = xr.open_mfdataset(INFILES)
-        # Selection of a subset region
-        ds = ds.where((ds.longitude>lonLims[0]) & (ds.longitude<lonLims[1]), drop=True)
-        ds = ds.where((ds.latitude>latLims[0]) & (ds.latitude<latLims[1]), drop=True)
-        # Select time (save several options here)
-        if season == 'summer':
-            #ds = ds.sel(time=ds['time.season']=='JJA')
-            ds = ds.sel(time=((ds['time.month']>=7)) & ((ds['time.month']<=9)))
-        elif season == 'spring':
-            #ds = ds.sel(time=ds['time.season']=='MAM')
-            ds = ds.sel(time=((ds['time.month']>=4)) & ((ds['time.month']<=6)))
-        elif season == 'fall':
-            #ds = ds.sel(time=ds['time.season']=='SON')
-            ds = ds.sel(time=((ds['time.month']>=10)) & ((ds['time.month']<=12)))
-        else:
-            print('!! no season specified, used them all! !!')
-
-        # Time period for climatology
-        ds = ds.sel(time=ds['time.year']>=year_lims[0])
-        ds = ds.sel(time=ds['time.year']<=year_lims[1])
-        ds = ds.sel(level=ds['level']<zmax)
-        # Vertical binning (on dataArray; more appropriate here
-        da_temp = ds['temperature']
-        lons = np.array(ds.longitude)
-        lats = np.array(ds.latitude)
-        bins = np.arange(dz/2.0, ds.level.max(), dz)
-        da_temp = da_temp.groupby_bins('level', bins).mean(dim='level')
+    # Assign casts to cells (once for all variables)
+    cells = get_cast_cells(lons, lats, lon_reg, lat_reg, dc)
+    
+    dict = {}
+    has_data = np.zeros(lons.size, dtype=bool)
+    for var, name in zip(variables, names):
         #To Pandas Dataframe
-        df_temp = da_temp.to_pandas()
-        df_temp.columns = bins[0:-1] #rename columns with 'bins'
-        idx_empty_rows = df_temp.isnull().all(1).nonzero()[0]
-        df_temp = df_temp.dropna(axis=0,how='all')
-        lons = np.delete(lons,idx_empty_rows)
-        lats = np.delete(lats,idx_empty_rows)
-        print(' -> Done!')        
+        df_var = ds_binned[var].transpose('time', 'level_bins').to_pandas()
+        df_var.columns = bins[0:-1] #rename columns with 'bins'
+        var_info = climato_variables.get(var, {'vmax' : None, 'valid_range' : None})
+        if var_info['valid_range'] is not None:
+            df_var = df_var.where((df_var>=var_info['valid_range'][0]) & (df_var<=var_info['valid_range'][1]))
+        has_data = has_data | df_var.notnull().any(axis=1).values
 
         ## --- fill 3D cube --- ##  
-        print('Fill regular cube')
-        z = df_temp.columns.values
-        V = np.full((lat_reg.size, lon_reg.size, z.size), np.nan)
-
+        print('Fill regular cube (' + var + ')')
+        z = df_var.columns.values
         # Aggregate on regular grid
-        for i, xx in enumerate(lon_reg):
-            for j, yy in enumerate(lat_reg):    
-                idx = np.where((lons>=xx-dc/2) & (lons<xx+dc/2) & (lats>=yy-dc/2) & (lats<yy+dc/2))
-                tmp = np.array(df_temp.iloc[idx].mean(axis=0))
-                idx_good = np.argwhere((~np.isnan(tmp)) & (tmp<30))
-                if np.size(idx_good)==1:
-                    V[j,i,:] = np.array(df_temp.iloc[idx].mean(axis=0))
-                elif np.size(idx_good)>1: # vertical interpolation between pts
-                    interp = interp1d(np.squeeze(z[idx_good]), np.squeeze(tmp[idx_good]))
-                    idx_interp = np.arange(np.int(idx_good[0]),np.int(idx_good[-1]+1))
-                    V[j,i,idx_interp] = interp(z[idx_interp]) # interpolate only where possible (1st to last good idx)
-
-
-        # horiozntal interpolation at each depth
-        lon_grid, lat_grid = np.meshgrid(lon_reg,lat_reg)
-        lon_vec = np.reshape(lon_grid, lon_grid.size)
-        lat_vec = np.reshape(lat_grid, lat_grid.size)
-        for k, zz in enumerate(z):
-            # Meshgrid 1D data (after removing NaNs)
-            tmp_grid = V[:,:,k]
-            tmp_vec = np.reshape(tmp_grid, tmp_grid.size)
-            #print 'interpolate depth layer ' + np.str(k) + ' / ' + np.str(z.size) 
-            # griddata (after removing nans)
-            idx_good = np.argwhere(~np.isnan(tmp_vec))
-            if idx_good.size>3: # will ignore depth where no data exist
-                LN = np.squeeze(lon_vec[idx_good])
-                LT = np.squeeze(lat_vec[idx_good])
-                TT = np.squeeze(tmp_vec[idx_good])
-                zi = griddata((LN, LT), TT, (lon_grid, lat_grid), method='linear')
-                V[:,:,k] = zi
-            else:
-                continue
+        V = fill_regular_cube(df_var, lons, lats, lon_reg, lat_reg, dc, vmax=var_info['vmax'], cells=cells)
+
+        # horizontal interpolation at each depth
+        V = interp_cube_levels(V, lon_reg, lat_reg)
         print(' -> Done!')    
 
         # mask using bathymetry
-        for i, xx in enumerate(lon_reg):
-            for j,yy in enumerate(lat_reg):
-                if Zitp[j,i] > -10: # remove shallower than 10m
-                    V[j,i,:] = np.nan
-
-        # getting bottom temperature
-        print('Getting bottom Temp.')    
-        Tbot = np.full([lat_reg.size,lon_reg.size], np.nan) 
-        for i, xx in enumerate(lon_reg):
-            for j,yy in enumerate(lat_reg):
-                bottom_depth = -Zitp[j,i] # minus to turn positive
-                temp_vec = V[j,i,:]
-                ## idx_no_good = np.argwhere(temp_vec>30)
-                ## if idx_no_good.size:
-                ##     temp_vec[idx_no_good] = np.nan
-                idx_good = np.squeeze(np.where(~np.isnan(temp_vec)))
-                if idx_good.size:
-                    idx_closest = np.argmin(np.abs(bottom_depth-z[idx_good]))
-                else:
-                    continue
-
-                if np.abs([idx_closest] - bottom_depth) <= 20:
-                    Tbot[j,i] = temp_vec[idx_good[idx_closest]]
-                elif np.abs(z[idx_closest] - bottom_depth) <= 50:
-                    #print('used data located [30,50]m from bottom')
-                    Tbot[j,i] = temp_vec[idx_good[idx_closest]]
+        V[Zitp > -10, :] = np.nan # remove shallower than 10m
+
+        # getting bottom values
+        print('Getting bottom values (' + var + ')')
+        dict[name] = get_bottom_values(V, z, Zitp)['Vbot']
         print(' -> Done!')    
 
-        # Save data for further use
-        if np.size(h5_outputfile):
-            h5f = h5py.File(h5_outputfile, 'w')
-            h5f.create_dataset('Tbot', data=Tbot)
-            h5f.create_dataset('lon_reg', data=lon_reg)
-            h5f.create_dataset('lat_reg', data=lat_reg)
-            h5f.create_dataset('lon_orig', data=lons)
-            h5f.create_dataset('lat_orig', data=lats)
-            h5f.create_dataset('Zitp', data=Zitp)
-            h5f.create_dataset('z', data=z)
-            h5f.close()
+    # Casts with data
+    lons = lons[has_data]
+    lats = lats[has_data]
+
+    # Save data for further use (output file and/or cache, with inputs as metadata)
+    outfiles = []
+    if np.size(h5_outputfile):
+        outfiles.append(h5_outputfile)
+    if cache_file is not None:
+        if os.path.isdir(climato_cache_dir) is False:
+            os.makedirs(climato_cache_dir)
+        outfiles.append(cache_file)
+    for outfile in outfiles:
+        h5f = h5py.File(outfile, 'w')
+        for name in names:
+            h5f.create_dataset(name, data=dict[name])
+        h5f.create_dataset('lon_reg', data=lon_reg)
+        h5f.create_dataset('lat_reg', data=lat_reg)
+        h5f.create_dataset('lon_orig', data=lons)
+        h5f.create_dataset('lat_orig', data=lats)
+        h5f.create_dataset('Zitp', data=Zitp)
+        h5f.create_dataset('z', data=z)
+        h5f.attrs['cache_key'] = cache_key
+        h5f.attrs['infiles'] = np.str(INFILES)
+        h5f.attrs['variables'] = np.str(variables)
+        h5f.attrs['year_lims'] = year_lims
+        h5f.attrs['season'] = np.str(season)
+        h5f.attrs['zlims'] = zlims
+        h5f.attrs['dz'] = dz
+        h5f.attrs['created'] = datetime.datetime.now().isoformat()
+        h5f.close()
+    if cache_file is not None:
+        evict_climato_cache()
 
     # Fill dict for output
-    dict = {}
-    dict['Tbot'] = Tbot
     dict['bathy'] = Zitp
     dict['lon_reg'] = lon_reg
     dict['lat_reg'] = lat_reg
@@ -403,11 +651,48 @@ def get_bottomT_climato(INFILES, LON_REG,  LAT_REG, year_lims=[1981, 2010], seas
     return dict
 
 
+def get_bottomT_climato(INFILES, LON_REG,  LAT_REG, year_lims=[1981, 2010], season=[], zlims=[10, 1000], dz=5, h5_outputfile=[]):
+    """ Generate and returns the climatological bottom temperature map.
+    This script uses GEBCO dada. User should update the path below.
+    Maybe this is something I could work on...
+
+    Same as get_bottom_climato(..., variables=['temperature']).
+
+    If the pickled filename exists, the function will by-pass the processing and return only saved climatology.
+    
+    Usage ex:
+    import numpy as np
+    import azmp_utils as azu
+    dc = .10
+    lonLims = [-60, -44] # fish_hab region
+    latLims = [39, 56]
+    lon_reg = np.arange(lonLims[0]+dc/2, lonLims[1]-dc/2, dc)
+    lat_reg = np.arange(latLims[0]+dc/2, latLims[1]-dc/2, dc)
+    Tbot_dict = azu.get_bottomT_climato('/home/cyrf0006/data/dev_database/*.nc', lon_reg, lat_reg, season='fall', h5_outputfile='Tbot_climato_fall.h5')
+
+    For Eugene's LabSea:
+    dc = .10
+    lonLims = [-63, -56] # Lab Sea
+    latLims = [54, 59]
+    lon_reg = np.arange(lonLims[0]+dc/2, lonLims[1]-dc/2, dc)
+    lat_reg = np.arange(latLims[0]+dc/2, latLims[1]-dc/2, dc)
+    Tbot_dict = azu.get_bottomT_climato('/home/cyrf0006/data/dev_database/*.nc', lon_reg, lat_reg, year_lims=[1928, 2017], season='fall', h5_outputfile='Tbot_climato_LabSea_fall_1950-2017.h5')
+
+    OR
+
+    azu.get_bottomT_climato('/home/cyrf0006/data/dev_database/*.nc', lon_reg, lat_reg, season='spring', h5_outputfile='Tbot_climato_spring.h5') 
+    
+    """
+    return get_bottom_climato(INFILES, LON_REG, LAT_REG, ['temperature'], year_lims, season, zlims, dz, h5_outputfile)
+
+
 def get_bottomS_climato(INFILES, LON_REG,  LAT_REG, year_lims=[1981, 2010], season=[], zlims=[10, 1000], dz=5, h5_outputfile=[]):
     """ Generate and returns the climatological bottom salinity map.
     This script uses GEBCO dada. User should update the path below.
     Maybe this is something I could work on...
 
+    Same as get_bottom_climato(..., variables=['salinity']).
+
     If the pickled filename exists, the function will by-pass the processing and return only saved climatology.
     
     Usage ex:
@@ -425,212 +710,54 @@ def get_bottomS_climato(INFILES, LON_REG,  LAT_REG, year_lims=[1981, 2010], seas
     azu.get_bottomS_climato('/home/cyrf0006/data/dev_database/*.nc', lon_reg, lat_reg, season='spring', h5_outputfile='Sbot_climato_spring_0.10.h5') 
     
     """
+    return get_bottom_climato(INFILES, LON_REG, LAT_REG, ['salinity'], year_lims, season, zlims, dz, h5_outputfile)
     
-    ## ---- Check if H5 file exists ---- ##        
-    if os.path.isfile(h5_outputfile):
-        print [h5_outputfile + ' exist! Reading directly']
-        h5f = h5py.File(h5_outputfile,'r')
-        Sbot = h5f['Sbot'][:]
-        lon_reg = h5f['lon_reg'][:]
-        lat_reg = h5f['lat_reg'][:]
-        lon_orig = h5f['lon_orig'][:]
-        lat_orig = h5f['lat_orig'][:]
-        Zitp = h5f['Zitp'][:]
-        h5f.close()
 
-    else:
+# Contour (100m isobath) of data to mask near Labrador in fall
+labrador_contour = '/home/cyrf0006/AZMP/state_reports/bottomT/100m_contour_labrador.npy'
 
-        ## ---- Region parameters ---- ##
-        #    add_path('/home/cyrf0006/data/GEBCO/')
-        dataFile = '/home/cyrf0006/data/GEBCO/GEBCO_2014_1D.nc' # Maybe find a better way to handle this file
-        lonLims = [LON_REG[0], LON_REG[-1]]
-        latLims = [LAT_REG[0], LAT_REG[-1]]
-        zmin = zlims[0] # do try to compute bottom temp above that depth
-        zmax = zlims[1] # do try to compute bottom temp below that depth
-        lon_reg = LON_REG
-        lat_reg = LAT_REG
-        lon_grid, lat_grid = np.meshgrid(lon_reg,lat_reg)
-        dc = np.round(np.diff(lon_reg[0:2]), 3)[0]
-
-        ## ---- Bathymetry ---- ####
-        print('Load and grid bathymetry')
-        # Load data
-        dataset = netCDF4.Dataset(dataFile)
-        # Extract variables
-        #x = dataset.variables['x_range'] 
-        #y = dataset.variables['y_range']
-        x = [-179-59.75/60, 179+59.75/60] # to correct bug in 30'' dataset?
-        y = [-89-59.75/60, 89+59.75/60]
-        spacing = dataset.variables['spacing']
-        # Compute Lat/Lon
-        nx = int((x[-1]-x[0])/spacing[0]) + 1  # num pts in x-dir
-        ny = int((y[-1]-y[0])/spacing[1]) + 1  # num pts in y-dir
-        lon = np.linspace(x[0],x[-1],nx)
-        lat = np.linspace(y[0],y[-1],ny)
-        # interpolate data on regular grid (temperature grid)
-        # Reshape data
-        zz = dataset.variables['z']
-        Z = zz[:].reshape(ny, nx)
-        Z = np.flipud(Z) # <------------ important!!!
-        # Reduce data according to Region params
-        idx_lon = np.where((lon>=lonLims[0]) & (lon<=lonLims[1]))
-        idx_lat = np.where((lat>=latLims[0]) & (lat<=latLims[1]))
-        Z = Z[idx_lat[0][0]:idx_lat[0][-1]+1, idx_lon[0][0]:idx_lon[0][-1]+1]
-        lon = lon[idx_lon[0]]
-        lat = lat[idx_lat[0]]
-        # interpolate data on regular grid (temperature grid)
-        lon_grid_bathy, lat_grid_bathy = np.meshgrid(lon,lat)
-        lon_vec_bathy = np.reshape(lon_grid_bathy, lon_grid_bathy.size)
-        lat_vec_bathy = np.reshape(lat_grid_bathy, lat_grid_bathy.size)
-        z_vec = np.reshape(Z, Z.size)
-        Zitp = griddata((lon_vec_bathy, lat_vec_bathy), z_vec, (lon_grid, lat_grid), method='linear')
-        print(' -> Done!')
-
-        ## ---- Get CTD data --- ##
-        print('Get historical data')
-        ds = xr.open_mfdataset(INFILES)
-        # Selection of a subset region
-        ds = ds.where((ds.longitude>lonLims[0]) & (ds.longitude<lonLims[1]), drop=True)
-        ds = ds.where((ds.latitude>latLims[0]) & (ds.latitude<latLims[1]), drop=True)
-        # Select time (save several options here)
-        if season == 'summer':
-            #ds = ds.sel(time=ds['time.season']=='JJA')
-            ds = ds.sel(time=((ds['time.month']>=7)) & ((ds['time.month']<=9)))
-        elif season == 'spring':
-            #ds = ds.sel(time=ds['time.season']=='MAM')
-            ds = ds.sel(time=((ds['time.month']>=4)) & ((ds['time.month']<=6)))
-        elif season == 'fall':
-            #ds = ds.sel(time=ds['time.season']=='SON')
-            ds = ds.sel(time=((ds['time.month']>=10)) & ((ds['time.month']<=12)))
-        else:
-            print('!! no season specified, used them all! !!')
-
-        # Time period for climatology
-        ds = ds.sel(time=ds['time.year']>=year_lims[0])
-        ds = ds.sel(time=ds['time.year']<=year_lims[1])
-        ds = ds.sel(level=ds['level']<zmax)
-        # Vertical binning (on dataArray; more appropriate here
-        da_sal = ds['salinity']
-        lons = np.array(ds.longitude)
-        lats = np.array(ds.latitude)
-        bins = np.arange(dz/2.0, ds.level.max(), dz)
-        da_sal = da_sal.groupby_bins('level', bins).mean(dim='level')
-        #To Pandas Dataframe
-        df_sal = da_sal.to_pandas()
-        df_sal.columns = bins[0:-1] #rename columns with 'bins'
-        # Remove empty columns
-        idx_empty_rows = df_sal.isnull().all(1).nonzero()[0]
-        df_sal = df_sal.dropna(axis=0,how='all')
-        lons = np.delete(lons,idx_empty_rows)
-        lats = np.delete(lats,idx_empty_rows)        
-        print(' -> Done!')
-
-        ## ---- Try to remove outliers ---- ##
-        # METHOD 1
-        ## print('For climato, keep only profile with average salinity in [28,38]')
-        ## df_sal_vert_ave = df_sal.mean(axis=1)
-        ## mu =  df_sal_vert_ave.mean()
-        ## sigma = df_sal_vert_ave.std()
-        ## print mu, sigma
-        ## idx = np.where((df_sal_vert_ave>=mu-5*sigma) & (df_sal_vert_ave<=mu+5*sigma))
-        ## idx = np.where((df_sal_vert_ave>=mu-5*sigma) & (df_sal_vert_ave<=mu+5*sigma))
-        ## lons = lons[idx]
-        ## lats = lats[idx]
-        ## df_sal = df_sal[(df_sal_vert_ave>=mu-5*sigma) & (df_sal_vert_ave<=mu*5*sigma)]
-        # METHOD 2
-        df_sal = df_sal.apply(lambda x: [y if y <= 36.75 else np.nan for y in x])
-        df_sal = df_sal.apply(lambda x: [y if y >= 28 else np.nan for y in x])        
-        print(' -> Done!')        
-
-        ## --- fill 3D cube --- ##  
-        print('Fill regular cube')
-        z = df_sal.columns.values
-        V = np.full((lat_reg.size, lon_reg.size, z.size), np.nan)
+def load_bottom_climato(climato_file):
+    """ Load a climatology H5 file (from get_bottom_climato, get_bottomT_climato, etc.) in a dict
+    with the grid (lon_reg, lat_reg), bathymetry (Zitp), vertical bins (z) and bottom fields (Tbot, Sbot)
 
-        # Aggregate on regular grid
-        for i, xx in enumerate(lon_reg):
-            for j, yy in enumerate(lat_reg):    
-                idx = np.where((lons>=xx-dc/2) & (lons<xx+dc/2) & (lats>=yy-dc/2) & (lats<yy+dc/2))
-                tmp = np.array(df_sal.iloc[idx].mean(axis=0))
-                idx_good = np.argwhere((~np.isnan(tmp)))
-                if np.size(idx_good)==1:
-                    V[j,i,:] = np.array(df_sal.iloc[idx].mean(axis=0))
-                elif np.size(idx_good)>1: # vertical interpolation between pts
-                    interp = interp1d(np.squeeze(z[idx_good]), np.squeeze(tmp[idx_good]))
-                    idx_interp = np.arange(np.int(idx_good[0]),np.int(idx_good[-1]+1))
-                    V[j,i,idx_interp] = interp(z[idx_interp]) # interpolate only where possible (1st to last good idx)
+    The dict can be given instead of the file to get_bottomT and get_bottomS
+    (avoids reading the file again for each year).
+    usage ex:
+    climato = azu.load_bottom_climato('Tbot_climato_spring_0.10.h5')
+    Tdict = azu.get_bottomT(year_file, 'spring', climato)
+    
+    """
+    print('Load ' + climato_file)
+    climato = {}
+    h5f = h5py.File(climato_file, 'r')
+    for key in ['Tbot', 'Sbot', 'lon_reg', 'lat_reg', 'Zitp', 'z']:
+        if key in h5f.keys():
+            climato[key] = h5f[key][:]
+    h5f.close()
 
+    return climato
 
-        # horizontal interpolation at each depth
-        lon_grid, lat_grid = np.meshgrid(lon_reg,lat_reg)
-        lon_vec = np.reshape(lon_grid, lon_grid.size)
-        lat_vec = np.reshape(lat_grid, lat_grid.size)
-        for k, zz in enumerate(z):
-            # Meshgrid 1D data (after removing NaNs)
-            tmp_grid = V[:,:,k]
-            tmp_vec = np.reshape(tmp_grid, tmp_grid.size)
-            #print 'interpolate depth layer ' + np.str(k) + ' / ' + np.str(z.size) 
-            # griddata (after removing nans)
-            idx_good = np.argwhere(~np.isnan(tmp_vec))
-            if idx_good.size>3: # will ignore depth where no data exist
-                LN = np.squeeze(lon_vec[idx_good])
-                LT = np.squeeze(lat_vec[idx_good])
-                TT = np.squeeze(tmp_vec[idx_good])
-                zi = griddata((LN, LT), TT, (lon_grid, lat_grid), method='linear')
-                V[:,:,k] = zi
-            else:
-                continue
-        print(' -> Done!')    
+def get_season_mask(lon_reg, lat_reg, season):
+    """ Returns the boolean mask[lat_reg, lon_reg] of grid points removed from the bottom maps of a season
+    (spring: outside 3LNOPs; fall: near Labrador, see labrador_contour)
 
-        # mask using bathymetry
-        for i, xx in enumerate(lon_reg):
-            for j,yy in enumerate(lat_reg):
-                if Zitp[j,i] > -10: # remove shallower than 10m
-                    V[j,i,:] = np.nan
-
-        # getting bottom salinity
-        print('Getting bottom Sal.')    
-        Sbot = np.full([lat_reg.size,lon_reg.size], np.nan) 
-        for i, xx in enumerate(lon_reg):
-            for j,yy in enumerate(lat_reg):
-                bottom_depth = -Zitp[j,i] # minus to turn positive
-                sal_vec = V[j,i,:]
-                idx_good = np.squeeze(np.where(~np.isnan(sal_vec)))
-                if idx_good.size:
-                    idx_closest = np.argmin(np.abs(bottom_depth-z[idx_good]))
-                else:
-                    continue
-
-                if np.abs([idx_closest] - bottom_depth) <= 20:
-                    Sbot[j,i] = sal_vec[idx_good[idx_closest]]
-                elif np.abs(z[idx_closest] - bottom_depth) <= 50:
-                    #print('used data located [30,50]m from bottom')
-                    Sbot[j,i] = sal_vec[idx_good[idx_closest]]
-        print(' -> Done!')    
+    Masks are kept in memory with NAFO masks (nafo_masks).
+    
+    """
+    key = ('season_' + np.str(season), np.asarray(lon_reg, dtype=float).tobytes(), np.asarray(lat_reg, dtype=float).tobytes())
+    if key not in nafo_masks:
+        if season == 'spring':
+            nafo_masks[key] = ~get_nafo_mask(lon_reg, lat_reg, '3LNOPs')
+        elif season == 'fall':
+            #nafo_masks[key] = ~get_nafo_mask(lon_reg, lat_reg, '2J3KLNOPs') ### <--------------------- Do not mask the fall!!!!!
+            contour_mask = np.load(labrador_contour)
+            nafo_masks[key] = get_polygon_mask(lon_reg, lat_reg, contour_mask[:,0], contour_mask[:,1]) # mask data near Labrador in fall
+        else:
+            print('no division mask, all data taken')
+            nafo_masks[key] = np.zeros((np.size(lat_reg), np.size(lon_reg)), dtype=bool)
 
-        # Save data for further use
-        if np.size(h5_outputfile):
-            h5f = h5py.File(h5_outputfile, 'w')
-            h5f.create_dataset('Sbot', data=Sbot)
-            h5f.create_dataset('lon_reg', data=lon_reg)
-            h5f.create_dataset('lat_reg', data=lat_reg)
-            h5f.create_dataset('lon_orig', data=lons)
-            h5f.create_dataset('lat_orig', data=lats)
-            h5f.create_dataset('Zitp', data=Zitp)
-            h5f.create_dataset('z', data=z)
-            h5f.close()
+    return nafo_masks[key]
 
-    # Fill dict for output
-    dict = {}
-    dict['Sbot'] = Sbot
-    dict['bathy'] = Zitp
-    dict['lon_reg'] = lon_reg
-    dict['lat_reg'] = lat_reg
-    dict['lon_orig'] = lons
-    dict['lat_orig'] = lats
-    
-    return dict
-    
 
 def get_bottomT(year_file, season, climato_file):
     """ Generate and returns bottom temperature data corresponding to a certain climatology map
@@ -639,6 +766,7 @@ def get_bottomT(year_file, season, climato_file):
     - Tbot:  gridded bottom temperature
     - lons, lats: coordinates of good casts used to generate the grid
     *Note: they are not regular coordinates of the grid that can be obtained with get_bottomT_climato
+    (None if year_file has no cast in the region and season)
        
     Usage ex (suppose climato file already exist):
     import azmp_utils as azu
@@ -651,17 +779,19 @@ def get_bottomT(year_file, season, climato_file):
     Zitp = h5f['Zitp'][:]
     h5f.close()
     Tbot_dict = azu.get_bottomT(year_file, 'fall', climato_file)
+
+    climato_file can also be the dict returned by load_bottom_climato (see get_bottomT_years for many years).
     
     """
     ## ---- Load Climato data ---- ##    
-    print('Load ' + climato_file)
-    h5f = h5py.File(climato_file, 'r')
-    Tbot_climato = h5f['Tbot'][:]
-    lon_reg = h5f['lon_reg'][:]
-    lat_reg = h5f['lat_reg'][:]
-    Zitp = h5f['Zitp'][:]
-    z = h5f['z'][:]
-    h5f.close()
+    if isinstance(climato_file, str):
+        climato = load_bottom_climato(climato_file)
+    else:
+        climato = climato_file # already loaded (see load_bottom_climato)
+    lon_reg = climato['lon_reg']
+    lat_reg = climato['lat_reg']
+    Zitp = climato['Zitp']
+    z = climato['z']
     zmax = z.max()
     dz = z[1]-z[0]
     
@@ -673,30 +803,13 @@ def get_bottomT(year_file, season, climato_file):
     lon_grid, lat_grid = np.meshgrid(lon_reg,lat_reg)
     dc = np.diff(lon_reg[0:2])
     
-    ## ---- NAFO divisions ---- ##
-    nafo_div = get_nafo_divisions()
-
     ## ---- Get CTD data --- ##
     print('Get ' + year_file)
-    ds = xr.open_mfdataset(year_file)
-    # Selection of a subset region
-    ds = ds.where((ds.longitude>lonLims[0]) & (ds.longitude<lonLims[1]), drop=True)
-    ds = ds.where((ds.latitude>latLims[0]) & (ds.latitude<latLims[1]), drop=True)
-    # Select time (save several options here)
-    if season == 'summer':
-        #ds = ds.sel(time=ds['time.season']=='JJA')
-        ds = ds.sel(time=((ds['time.month']>=7)) & ((ds['time.month']<=9)))
-    elif season == 'spring':
-        #ds = ds.sel(time=ds['time.season']=='MAM')
-        ds = ds.sel(time=((ds['time.month']>=4)) & ((ds['time.month']<=6)))
-    elif season == 'fall':
-        #ds = ds.sel(time=ds['time.season']=='SON')
-        ds = ds.sel(time=((ds['time.month']>=10)) & ((ds['time.month']<=12)))
-    else:
-        print('!! no season specified, used them all! !!')
-
-    # Restrict max depth to zmax defined earlier
-    ds = ds.sel(level=ds['level']<zmax)
+    # Selection of region, season and max depth (only selected casts are read)
+    ds = archive.query_archive(year_file, lonLims, latLims, months=archive.season_to_months(season), levelLims=[None, zmax], variables=['temperature'])
+    if ds is None:
+        print('!! no cast in ' + year_file + ' [skip] !!')
+        return None
     # Vertical binning (on dataArray; more appropriate here
     da_temp = ds['temperature']
     lons = np.array(ds.longitude)
@@ -718,110 +831,25 @@ def get_bottomT(year_file, season, climato_file):
     ## --- fill 3D cube --- ##  
     print('Fill regular cube')
     z = df_temp.columns.values
-    V = np.full((lat_reg.size, lon_reg.size, z.size), np.nan)
-
     # Aggregate on regular grid
-    for i, xx in enumerate(lon_reg):
-        for j, yy in enumerate(lat_reg):    
-            idx = np.where((lons>=xx-dc/2) & (lons<xx+dc/2) & (lats>=yy-dc/2) & (lats<yy+dc/2))
-            tmp = np.array(df_temp.iloc[idx].mean(axis=0))
-            idx_good = np.argwhere((~np.isnan(tmp)) & (tmp<30))
-            if np.size(idx_good)==1:
-                V[j,i,:] = np.array(df_temp.iloc[idx].mean(axis=0))
-            elif np.size(idx_good)>1: # vertical interpolation between pts
-                interp = interp1d(np.squeeze(z[idx_good]), np.squeeze(tmp[idx_good]))
-                idx_interp = np.arange(np.int(idx_good[0]),np.int(idx_good[-1]+1))
-                V[j,i,idx_interp] = interp(z[idx_interp]) # interpolate only where possible (1st to last good idx)
+    V = fill_regular_cube(df_temp, lons, lats, lon_reg, lat_reg, dc, vmax=30)
     
     # horizontal interpolation at each depth
-    lon_grid, lat_grid = np.meshgrid(lon_reg,lat_reg)
-    lon_vec = np.reshape(lon_grid, lon_grid.size)
-    lat_vec = np.reshape(lat_grid, lat_grid.size)
-    for k, zz in enumerate(z):
-        # Meshgrid 1D data (after removing NaNs)
-        tmp_grid = V[:,:,k]
-        tmp_vec = np.reshape(tmp_grid, tmp_grid.size)
-        # griddata (after removing nans)
-        idx_good = np.argwhere(~np.isnan(tmp_vec))
-        if idx_good.size>3: # will ignore depth where no data exist
-            LN = np.squeeze(lon_vec[idx_good])
-            LT = np.squeeze(lat_vec[idx_good])
-            TT = np.squeeze(tmp_vec[idx_good])
-            zi = griddata((LN, LT), TT, (lon_grid, lat_grid), method='linear')
-            V[:,:,k] = zi
-        else:
-            continue
+    V = interp_cube_levels(V, lon_reg, lat_reg)
     print(' -> Done!')    
 
     # mask using bathymetry (I don't think it is necessary, but make nice figures)
-    for i, xx in enumerate(lon_reg):
-        for j,yy in enumerate(lat_reg):
-            if Zitp[j,i] > -10: # remove shallower than 10m
-                V[j,i,:] = np.nan
+    V[Zitp > -10, :] = np.nan # remove shallower than 10m
 
     # getting bottom temperature
     print('Getting bottom Temp.')    
-    Tbot = np.full([lat_reg.size,lon_reg.size], np.nan) 
-    for i, xx in enumerate(lon_reg):
-        for j,yy in enumerate(lat_reg):
-            bottom_depth = -Zitp[j,i] # minus to turn positive
-            temp_vec = V[j,i,:]
-            ## idx_no_good = np.argwhere(temp_vec>30)
-            ## if idx_no_good.size:
-            ##     temp_vec[idx_no_good] = np.nan
-            idx_good = np.squeeze(np.where(~np.isnan(temp_vec)))
-            if idx_good.size:
-                idx_closest = np.argmin(np.abs(bottom_depth-z[idx_good]))
-            else:
-                continue
-
-            if np.abs([idx_closest] - bottom_depth) <= 20:
-                Tbot[j,i] = temp_vec[idx_good[idx_closest]]
-            elif np.abs(z[idx_closest] - bottom_depth) <= 50:
-                #print('used data located [30,50]m from bottom')
-                Tbot[j,i] = temp_vec[idx_good[idx_closest]]
+    Tbot = get_bottom_values(V, z, Zitp)['Vbot']
 
     print(' -> Done!')    
 
     # Mask data outside Nafo div.
     print('Mask according to NAFO division for ' + season)
-    # Polygons
-    polygon3K = Polygon(zip(nafo_div['3K']['lon'], nafo_div['3K']['lat']))
-    polygon3L = Polygon(zip(nafo_div['3L']['lon'], nafo_div['3L']['lat']))
-    polygon3N = Polygon(zip(nafo_div['3N']['lon'], nafo_div['3N']['lat']))
-    polygon3O = Polygon(zip(nafo_div['3O']['lon'], nafo_div['3O']['lat']))
-    polygon3Ps = Polygon(zip(nafo_div['3Ps']['lon'], nafo_div['3Ps']['lat']))
-    polygon2J = Polygon(zip(nafo_div['2J']['lon'], nafo_div['2J']['lat']))
-
-    # Contour of data to mask
-    contour_mask = np.load('/home/cyrf0006/AZMP/state_reports/bottomT/100m_contour_labrador.npy')
-    polygon_mask = Polygon(contour_mask)
-    
-    if season == 'spring':
-        for i, xx in enumerate(lon_reg):
-            for j,yy in enumerate(lat_reg):
-                point = Point(lon_reg[i], lat_reg[j])
-                #if (~polygon3L.contains(point)) & (~polygon3N.contains(point)) & (~polygon3O.contains(point)) & (~polygon3Ps.contains(point)):
-                if polygon3L.contains(point) | polygon3N.contains(point) | polygon3O.contains(point) | polygon3Ps.contains(point):
-                    pass #nothing to do but cannot implement negative statement "if not" above
-                else:
-                    Tbot[j,i] = np.nan
-
-    elif season == 'fall':
-        for i, xx in enumerate(lon_reg):
-            for j,yy in enumerate(lat_reg):
-                point = Point(lon_reg[i], lat_reg[j])
-                #if (~polygon3L.contains(point)) & (~polygon3N.contains(point)) & (~polygon3O.contains(point)) & (~polygon3Ps.contains(point)):
-                if polygon2J.contains(point) | polygon3K.contains(point) | polygon3L.contains(point) | polygon3N.contains(point) | polygon3O.contains(point) | polygon3Ps.contains(point):
-                    pass #nothing to do but cannot implement negative statement "if not" above
-                else:
-                    pass
-                    #Tbot[j,i] = np.nan ### <--------------------- Do not mask the fall!!!!!
-
-                if polygon_mask.contains(point): # mask data near Labrador in fall
-                    Tbot[j,i] = np.nan 
-    else:
-        print('no division mask, all data taken')
+    Tbot[get_season_mask(lon_reg, lat_reg, season)] = np.nan
 
     print(' -> Done!')    
 
@@ -836,13 +864,14 @@ def get_bottomT(year_file, season, climato_file):
     
     return dict
 
-def get_bottomS(year_file, season, climato_file):    
+def get_bottomS(year_file, season, climato_file):
     """ Generate and returns bottom temperature data corresponding to a certain climatology map
     (previously generated with get_bottomS_climato)
     Function returns:
     - Sbot:  gridded bottom salinity
     - lons, lats: coordinates of good casts used to generate the grid
     *Note: they are not regular coordinates of the grid that can be obtained with get_bottomS_climato
+    (None if year_file has no cast in the region and season)
         
     Usage ex (suppose climato file already exist):
     import azmp_utils as azu
@@ -855,18 +884,20 @@ def get_bottomS(year_file, season, climato_file):
     Zitp = h5f['Zitp'][:]
     h5f.close()
     Sbot_dict = azu.get_bottomS(year_file, 'fall', climato_file)
+
+    climato_file can also be the dict returned by load_bottom_climato.
     
     """
 
     ## ---- Load Climato data ---- ##    
-    print('Load ' + climato_file)
-    h5f = h5py.File(climato_file, 'r')
-    Sbot_climato = h5f['Sbot'][:]
-    lon_reg = h5f['lon_reg'][:]
-    lat_reg = h5f['lat_reg'][:]
-    Zitp = h5f['Zitp'][:]
-    z = h5f['z'][:]
-    h5f.close()
+    if isinstance(climato_file, str):
+        climato = load_bottom_climato(climato_file)
+    else:
+        climato = climato_file # already loaded (see load_bottom_climato)
+    lon_reg = climato['lon_reg']
+    lat_reg = climato['lat_reg']
+    Zitp = climato['Zitp']
+    z = climato['z']
     zmax = z.max()
     dz = z[1]-z[0]
 
@@ -878,34 +909,13 @@ def get_bottomS(year_file, season, climato_file):
     lon_grid, lat_grid = np.meshgrid(lon_reg,lat_reg)
     dc = np.diff(lon_reg[0:2])
     
-    ## ---- NAFO divisions ---- ##
-    nafo_div = get_nafo_divisions()
-
     ## ---- Get CTD data --- ##
     print('Get ' + year_file)
-    ds = xr.open_mfdataset(year_file)
-    # Selection of a subset region
-    ds = ds.where((ds.longitude>lonLims[0]) & (ds.longitude<lonLims[1]), drop=True)
-    ds = ds.where((ds.latitude>latLims[0]) & (ds.latitude<latLims[1]), drop=True)
-    # Select time (save several options here)
-    if season == 'summer':
-        #ds = ds.sel(time=ds['time.season']=='JJA')
-        ds = ds.sel(time=((ds['time.month']>=7)) & ((ds['time.month']<=9)))
-    elif season == 'spring':
-        #ds = ds.sel(time=ds['time.season']=='MAM')
-        ds = ds.sel(time=((ds['time.month']>=4)) & ((ds['time.month']<=6)))
-    elif season == 'fall':
-        #ds = ds.sel(time=ds['time.season']=='SON')
-        ds = ds.sel(time=((ds['time.month']>=10)) & ((ds['time.month']<=12)))
-    else:
-        print('!! no season specified, used them all! !!')
-
-
-    # Vertical binning (on dataset; slower here as we don't need it)
-    #bins = np.arange(dz/2.0, df_temp.columns.max(), dz)
-    #ds = ds.groupby_bins('level', bins).mean(dim='level')
-    # Restrict max depth to zmax defined earlier
-    ds = ds.sel(level=ds['level']<zmax)
+    # Selection of region, season and max depth (only selected casts are read)
+    ds = archive.query_archive(year_file, lonLims, latLims, months=archive.season_to_months(season), levelLims=[None, zmax], variables=['salinity'])
+    if ds is None:
+        print('!! no cast in ' + year_file + ' [skip] !!')
+        return None
     lons = np.array(ds.longitude)
     lats = np.array(ds.latitude)
     # Vertical binning (on dataArray; more appropriate here
@@ -926,112 +936,25 @@ def get_bottomS(year_file, season, climato_file):
     ## --- fill 3D cube --- ##  
     print('Fill regular cube')
     z = df_sal.columns.values
-    V = np.full((lat_reg.size, lon_reg.size, z.size), np.nan)
-
     # Aggregate on regular grid
-    for i, xx in enumerate(lon_reg):
-        for j, yy in enumerate(lat_reg):    
-            idx = np.where((lons>=xx-dc/2) & (lons<xx+dc/2) & (lats>=yy-dc/2) & (lats<yy+dc/2))
-            tmp = np.array(df_sal.iloc[idx].mean(axis=0))
-            idx_good = np.argwhere(~np.isnan(tmp))
-            if np.size(idx_good)==1:
-                V[j,i,:] = np.array(df_sal.iloc[idx].mean(axis=0))
-            elif np.size(idx_good)>1: # vertical interpolation between pts
-                #V[j,i,:] = np.interp((z), np.squeeze(z[idx_good]), np.squeeze(tmp[idx_good]))  <--- this method propagate nans below max depth (extrapolation)
-                interp = interp1d(np.squeeze(z[idx_good]), np.squeeze(tmp[idx_good]))  # <---------- Pay attention here, this is a bit unusual, but seems to work!
-                idx_interp = np.arange(np.int(idx_good[0]),np.int(idx_good[-1]+1))
-                V[j,i,idx_interp] = interp(z[idx_interp]) # interpolate only where possible (1st to last good idx)
+    V = fill_regular_cube(df_sal, lons, lats, lon_reg, lat_reg, dc)
 
     # horizontal interpolation at each depth
-    lon_grid, lat_grid = np.meshgrid(lon_reg,lat_reg)
-    lon_vec = np.reshape(lon_grid, lon_grid.size)
-    lat_vec = np.reshape(lat_grid, lat_grid.size)
-    for k, zz in enumerate(z):
-        # Meshgrid 1D data (after removing NaNs)
-        tmp_grid = V[:,:,k]
-        tmp_vec = np.reshape(tmp_grid, tmp_grid.size)
-        #print 'interpolate depth layer ' + np.str(k) + ' / ' + np.str(z.size) 
-        # griddata (after removing nans)
-        idx_good = np.argwhere(~np.isnan(tmp_vec))
-        if idx_good.size>3: # will ignore depth where no data exist
-            LN = np.squeeze(lon_vec[idx_good])
-            LT = np.squeeze(lat_vec[idx_good])
-            TT = np.squeeze(tmp_vec[idx_good])
-            zi = griddata((LN, LT), TT, (lon_grid, lat_grid), method='linear')
-            V[:,:,k] = zi
-        else:
-            continue
+    V = interp_cube_levels(V, lon_reg, lat_reg)
     print(' -> Done!')    
 
     # mask using bathymetry (I don't think it is necessary, but make nice figures)
-    for i, xx in enumerate(lon_reg):
-        for j,yy in enumerate(lat_reg):
-            if Zitp[j,i] > -10: # remove shallower than 10m
-                V[j,i,:] = np.nan
+    V[Zitp > -10, :] = np.nan # remove shallower than 10m
 
     # getting bottom temperature
     print('Getting bottom Temp.')    
-    Sbot = np.full([lat_reg.size,lon_reg.size], np.nan) 
-    for i, xx in enumerate(lon_reg):
-        for j,yy in enumerate(lat_reg):
-            bottom_depth = -Zitp[j,i] # minus to turn positive
-            temp_vec = V[j,i,:]
-            ## idx_no_good = np.argwhere(temp_vec>30)
-            ## if idx_no_good.size:
-            ##     temp_vec[idx_no_good] = np.nan
-            idx_good = np.squeeze(np.where(~np.isnan(temp_vec)))
-            if idx_good.size:
-                idx_closest = np.argmin(np.abs(bottom_depth-z[idx_good]))
-            else:
-                continue
-
-            if np.abs([idx_closest] - bottom_depth) <= 20:
-                Sbot[j,i] = temp_vec[idx_good[idx_closest]]
-            elif np.abs(z[idx_closest] - bottom_depth) <= 50:
-                #print('used data located [30,50]m from bottom')
-                Sbot[j,i] = temp_vec[idx_good[idx_closest]]
+    Sbot = get_bottom_values(V, z, Zitp)['Vbot']
 
     print(' -> Done!')    
 
     # Mask data outside Nafo div.
     print('Mask according to NAFO division for ' + season)
-    # Polygons
-    polygon3K = Polygon(zip(nafo_div['3K']['lon'], nafo_div['3K']['lat']))
-    polygon3L = Polygon(zip(nafo_div['3L']['lon'], nafo_div['3L']['lat']))
-    polygon3N = Polygon(zip(nafo_div['3N']['lon'], nafo_div['3N']['lat']))
-    polygon3O = Polygon(zip(nafo_div['3O']['lon'], nafo_div['3O']['lat']))
-    polygon3Ps = Polygon(zip(nafo_div['3Ps']['lon'], nafo_div['3Ps']['lat']))
-    polygon2J = Polygon(zip(nafo_div['2J']['lon'], nafo_div['2J']['lat']))
-
-    # Contour of data to mask
-    contour_mask = np.load('/home/cyrf0006/AZMP/state_reports/bottomT/100m_contour_labrador.npy')
-    polygon_mask = Polygon(contour_mask)
-    
-    if season == 'spring':
-        for i, xx in enumerate(lon_reg):
-            for j,yy in enumerate(lat_reg):
-                point = Point(lon_reg[i], lat_reg[j])
-                #if (~polygon3L.contains(point)) & (~polygon3N.contains(point)) & (~polygon3O.contains(point)) & (~polygon3Ps.contains(point)):
-                if polygon3L.contains(point) | polygon3N.contains(point) | polygon3O.contains(point) | polygon3Ps.contains(point):
-                    pass #nothing to do but cannot implement negative statement "if not" above
-                else:
-                    Sbot[j,i] = np.nan
-
-    elif season == 'fall':
-        for i, xx in enumerate(lon_reg):
-            for j,yy in enumerate(lat_reg):
-                point = Point(lon_reg[i], lat_reg[j])
-                #if (~polygon3L.contains(point)) & (~polygon3N.contains(point)) & (~polygon3O.contains(point)) & (~polygon3Ps.contains(point)):
-                if polygon2J.contains(point) | polygon3K.contains(point) | polygon3L.contains(point) | polygon3N.contains(point) | polygon3O.contains(point) | polygon3Ps.contains(point):
-                    pass #nothing to do but cannot implement negative statement "if not" above
-                else:
-                    pass
-                    #Sbot[j,i] = np.nan ### <--------------------- Do not mask the fall!!!!!
-
-                if polygon_mask.contains(point): # mask data near Labrador in fall
-                    Sbot[j,i] = np.nan 
-    else:
-        print('no division mask, all data taken')
+    Sbot[get_season_mask(lon_reg, lat_reg, season)] = np.nan
 
     print(' -> Done!')
 
@@ -1047,6 +970,93 @@ def get_bottomS(year_file, season, climato_file):
 
     return dict
 
+
+def get_bottomT_year(args):
+    """ get_bottomT for one (year_file, season, climato) tuple, None if year_file does not exist
+    or has no cast in the region/season
+    (used by get_bottomT_years, one call per worker)
+    
+    """
+    year_file, season, climato = args
+    if os.path.isfile(year_file) is False:
+        print(year_file + ' not found! [skip]')
+        return None
+
+    return get_bottomT(year_file, season, climato)
+
+def get_bottomT_years(years, season, climato_file, year_path='/home/cyrf0006/data/dev_database/', regions=['3LNO', '3Ps', '2J', '3K'], workers=1):
+    """ Bottom temperature of many years (see get_bottomT) with NAFO division stats (see regions_temperature_stats)
+
+    The climatology file, NAFO and season masks are loaded/computed only once for all years
+    and years are processed in parallel by 'workers' processes.
+
+    Input params:
+    - years: list of years (file year_path + 'YYYY.nc' for each year)
+    - season: 'spring', 'summer' or 'fall'
+    - climato_file: climatology H5 file (see get_bottomT_climato)
+    - regions: NAFO divisions for stats
+    - workers: number of processes
+
+    Returns an xarray Dataset with:
+    - Tbot(year, lat, lon), Tbot_climato(lat, lon), bathy(lat, lon)
+    - stats (Tmean, area_colder0, etc.) (region, year)
+    - lon_casts, lat_casts, year_casts (cast): good casts of each year
+    (years without file or cast are NaN)
+    usage ex:
+    import azmp_utils as azu
+    ds = azu.get_bottomT_years(np.arange(1980, 2018), 'spring', 'Tbot_climato_spring_0.10.h5', workers=8)
+    anom = ds['Tbot'] - ds['Tbot_climato']
+    df_3LNO = ds[azu.temperature_stats].sel(region='3LNO').to_dataframe()
+    
+    """
+    ## ---- Shared state (loaded once) ---- ##
+    climato = load_bottom_climato(climato_file)
+    lon_reg = climato['lon_reg']
+    lat_reg = climato['lat_reg']
+    # fill masks cache before starting the workers
+    get_season_mask(lon_reg, lat_reg, season)
+    for region in regions:
+        get_nafo_mask(lon_reg, lat_reg, region)
+
+    ## ---- Process years ---- ##
+    args = [(os.path.join(year_path, np.str(year) + '.nc'), season, climato) for year in years]
+    if workers > 1:
+        pool = multiprocessing.Pool(workers)
+        try:
+            outputs = pool.map(get_bottomT_year, args, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        outputs = [get_bottomT_year(arg) for arg in args]
+
+    Tbot = np.full((len(years), lat_reg.size, lon_reg.size), np.nan)
+    lon_casts = []
+    lat_casts = []
+    year_casts = []
+    for k, year in enumerate(years):
+        if outputs[k] is None:
+            continue
+        Tbot[k,:,:] = outputs[k]['Tbot']
+        lon_casts = np.append(lon_casts, outputs[k]['lons'])
+        lat_casts = np.append(lat_casts, outputs[k]['lats'])
+        year_casts = np.append(year_casts, np.repeat(year, np.size(outputs[k]['lons'])))
+
+    ## ---- To Dataset ---- ##
+    ds = xr.Dataset({'Tbot' : (['year', 'lat', 'lon'], Tbot),
+                     'bathy' : (['lat', 'lon'], climato['Zitp']),
+                     'lon_casts' : (['cast'], np.asarray(lon_casts)),
+                     'lat_casts' : (['cast'], np.asarray(lat_casts)),
+                     'year_casts' : (['cast'], np.asarray(year_casts, dtype=int))},
+                    coords={'year' : np.asarray(years), 'lat' : lat_reg, 'lon' : lon_reg})
+    if 'Tbot' in climato.keys():
+        ds['Tbot_climato'] = (['lat', 'lon'], climato['Tbot'])
+    df_stats = regions_temperature_stats(Tbot, climato['Zitp'], lon_reg, lat_reg, regions, np.asarray(years))
+    ds = ds.merge(df_stats.to_xarray())
+
+    return ds
+
+
 def bottomT_quickplot(h5_outputfile, figure_file=[]):
     """ Using h5 file created by get_bottomT_climato, this function plots the bottom temperature using basemap.
     
@@ -1142,6 +1152,7 @@ def polygon_temperature_stats(dict, shape):
     shape_3LNO = [polygon3L, polygon3N, polygon3O]
     new_shape = cascaded_union(shape_3LNO)
     dict = azu.polygon_temperature_stats(Tdict, new_shape)
+    dict = azu.polygon_temperature_stats(Tdict, '3LNO') # same, using the (cached) mask of the divisions
     
     *** Ask Eugene why the choice of Division for these stats. ***
     
@@ -1153,52 +1164,93 @@ def polygon_temperature_stats(dict, shape):
     lon_reg = dict['lon_reg']
     lat_reg = dict['lat_reg']
 
-    # derive mean pixel area
-    obj = {'type':'Polygon','coordinates':[[[lon_reg[0],lat_reg[0]],[lon_reg[0],lat_reg[-1]],[lon_reg[-1],lat_reg[-1]],[lon_reg[-1],lat_reg[0]],[lon_reg[0],lat_reg[0]]]]}
-    pixel_area = area(obj)/1e6/map.size
-    
     # select data in polygon
-    data_vec = []
-    bathy_vec = []
-    for i, xx in enumerate(lon_reg):
-        for j,yy in enumerate(lat_reg):
-            point = Point(lon_reg[i], lat_reg[j])            
-            if shape.contains(point):
-                data_vec = np.append(data_vec, map[j,i])
-                bathy_vec = np.append(bathy_vec, bathy[j,i])
-            else:                
-                pass
-
-    # remove nans            
-    bathy_vec = bathy_vec[~np.isnan(data_vec)]
-    data_vec = data_vec[~np.isnan(data_vec)]
+    if isinstance(shape, basestring) | isinstance(shape, list):
+        mask = get_nafo_mask(lon_reg, lat_reg, shape)
+    else: # shapely Polygon or MultiPolygon
+        mask = np.zeros(map.shape, dtype=bool)
+        for polygon in getattr(shape, 'geoms', [shape]):
+            xlon, xlat = polygon.exterior.xy
+            mask |= get_polygon_mask(lon_reg, lat_reg, xlon, xlat)
+
+    df = regions_temperature_stats(map, bathy, lon_reg, lat_reg, {'shape' : mask})
     
-    # mean temperature all polygon
-    Tmean = data_vec.mean()
+    return df.loc['shape'].iloc[0].to_dict()
 
-    # mean temperature at depth shallower than 100m, 200m, 300m
-    Tmean100 = data_vec[bathy_vec>=-100].mean()
-    Tmean200 = data_vec[bathy_vec>=-200].mean()
-    Tmean300 = data_vec[bathy_vec>=-300].mean()
-    
-    # area with temperature < 0
-    area_colder_0deg = data_vec[data_vec<=0].size*pixel_area
-    # area with temperature < 1
-    area_colder_1deg = data_vec[data_vec<=1].size*pixel_area        
-    # area with temperature > 2
-    area_warmer_2deg = data_vec[data_vec>=2].size*pixel_area
+
+def get_cell_area(lon_reg, lat_reg):
+    """ Returns the area (km2) of each cell [lat_reg, lon_reg] of a regular grid
+    (cells centered on lon_reg, lat_reg; area of a spherical cell, i.e. ~cos(lat)*dlon*dlat)
     
-    # Fill dict for output
-    dict = {}
-    dict['Tmean'] = Tmean
-    dict['Tmean_sha100'] = Tmean100
-    dict['Tmean_sha200'] = Tmean200
-    dict['Tmean_sha300'] = Tmean300
-    dict['area_colder0'] = area_colder_0deg # <--- now in km2. They are divisded by 1000 in scorecard.
-    dict['area_colder1'] = area_colder_1deg # <--- now in km2. They are divisded by 1000 in scorecard.
-    dict['area_warmer2'] = area_warmer_2deg
+    """
+    R = 6378.137 # Earth radius (km), same as 'area' module
+    dlon = np.abs(lon_reg[1]-lon_reg[0])*np.pi/180
+    dlat = np.abs(lat_reg[1]-lat_reg[0])*np.pi/180
+    lat_rad = np.asarray(lat_reg, dtype=float)*np.pi/180
+    band = R**2*dlon*(np.sin(lat_rad+dlat/2) - np.sin(lat_rad-dlat/2))
 
-    return dict
+    return np.repeat(band[:,np.newaxis], np.size(lon_reg), axis=1)
+
+
+# Stats computed by regions_temperature_stats
+temperature_stats = ['Tmean', 'Tmean_sha100', 'Tmean_sha200', 'Tmean_sha300', 'area_colder0', 'area_colder1', 'area_warmer2']
+
+def regions_temperature_stats(Tbot, bathy, lon_reg, lat_reg, regions, years=None):
+    """ Bottom temperature stats (same as polygon_temperature_stats) for many maps and regions at once
+    
+    Input params:
+    - Tbot: map [lat, lon] or stack of maps [year, lat, lon] (e.g. from get_bottomT)
+    - bathy: bathymetry [lat, lon] (negative, e.g. Zitp of the climato file)
+    - lon_reg, lat_reg: grid of the maps
+    - regions: list of NAFO divisions or unions (e.g. ['3LNO', '3Ps', '2J', '3K'], see get_nafo_mask)
+      or dict {name : boolean mask[lat, lon]}
+    - years: labels of the maps (default 0, 1, 2, ...)
+
+    Stats are (NaNs ignored):
+    - Tmean, Tmean_sha100, Tmean_sha200, Tmean_sha300: mean temperature (all, shallower than 100, 200, 300m)
+    - area_colder0, area_colder1, area_warmer2: area (km2) with T <= 0, T <= 1 and T >= 2,
+      summed using the true area of each cell (see get_cell_area)
+
+    Returns a DataFrame indexed by (region, year) with stats in columns
+    (use df.loc['3LNO'] for one region or df.stack() for a long table).
+    usage ex:
+    Tbot = np.stack([azu.get_bottomT(year_file, 'spring', climato_file)['Tbot'] for year_file in year_files])
+    df = azu.regions_temperature_stats(Tbot, Zitp, lon_reg, lat_reg, ['3LNO', '3Ps', '2J', '3K'], years)
+    
+    """
+    Tbot = np.asarray(Tbot, dtype=float)
+    if Tbot.ndim == 2:
+        Tbot = Tbot[np.newaxis,:,:]
+    if years is None:
+        years = np.arange(Tbot.shape[0])
+    if isinstance(regions, dict) is False:
+        regions = dict([(region, get_nafo_mask(lon_reg, lat_reg, region)) for region in np.atleast_1d(regions)])
+    cell_area = get_cell_area(lon_reg, lat_reg)
+
+    df_list = []
+    names = sorted(regions.keys())
+    for name in names:
+        mask = regions[name]
+        T = Tbot[:, mask] # [year, cells in region]
+        z = bathy[mask]
+        A = cell_area[mask]
+        good = ~np.isnan(T)
+        T0 = np.where(good, T, 0)
+
+        stats = {}
+        with np.errstate(invalid='ignore', divide='ignore'):
+            stats['Tmean'] = T0.sum(axis=1)/good.sum(axis=1) # all cells, even where bathymetry is NaN
+            for col, zmin in zip(temperature_stats[1:4], [-100, -200, -300]):
+                sel = good & (z >= zmin)
+                stats[col] = (T0*sel).sum(axis=1)/sel.sum(axis=1)
+        stats['area_colder0'] = ((good & (T0<=0))*A).sum(axis=1) # <--- in km2. They are divisded by 1000 in scorecard.
+        stats['area_colder1'] = ((good & (T0<=1))*A).sum(axis=1)
+        stats['area_warmer2'] = ((good & (T0>=2))*A).sum(axis=1)
+        for col in temperature_stats[4:]:
+            stats[col][good.sum(axis=1)==0] = np.nan # no data in region (e.g. missing year)
+        df_list.append(pd.DataFrame(stats, index=years, columns=temperature_stats))
+
+    return pd.concat(df_list, keys=names, names=['region', 'year'])
 
 
 def masterfile_section_to_multiindex(section, z_vec):
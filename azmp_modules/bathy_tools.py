@@ -0,0 +1,218 @@
+"""Tools to load GEBCO bathymetry (1D netCDF files, e.g. GRIDONE_1D.nc or GEBCO_2014_1D.nc)
+
+Contains following functions:
+- get_bathymetry(dataFile, lonLims, latLims)
+- get_bathymetry_on_grid(lon_reg, lat_reg, dataFile=GEBCO_2014, method='linear')
+- regrid_bathymetry(lon, lat, Z, lon_reg, lat_reg, method='bilinear')
+
+Only the requested lat/lon window is read from the file (not the whole planet) and
+bathymetry interpolated on a regular grid is cached on disk (see cache_dir).
+
+----------
+
+Atlantic Zone Monitoring Program @NAFC:
+https://azmp-nl.github.io/
+
+"""
+
+__author__ = 'Frederic.Cyr@dfo-mpo.gc.ca'
+__version__ = '0.1'
+
+import os
+import hashlib
+import netCDF4
+import numpy as np
+import pandas as pd
+from scipy.interpolate import griddata
+from scipy.interpolate import RegularGridInterpolator
+
+# Default files
+GEBCO_2014 = '/home/cyrf0006/data/GEBCO/GEBCO_2014_1D.nc'
+GRIDONE = '/home/cyrf0006/data/GEBCO/GRIDONE_1D.nc'
+
+# Where gridded bathymetry is cached (set to None to disable)
+cache_dir = os.path.expanduser('~/.azmp_cache')
+
+
+def gebco_coordinates(dataset):
+    """ Returns lon, lat vectors of a GEBCO 1D dataset (lat in increasing order, i.e. after flipud)
+
+    """
+    spacing = dataset.variables['spacing'][:]
+    if spacing[0] < 1/60.0:
+        x = [-179-59.75/60, 179+59.75/60] # to correct bug in 30'' dataset?
+        y = [-89-59.75/60, 89+59.75/60]
+    else:
+        x = dataset.variables['x_range'][:]
+        y = dataset.variables['y_range'][:]
+
+    # Compute Lat/Lon
+    nx = int((x[-1]-x[0])/spacing[0]) + 1  # num pts in x-dir
+    ny = int((y[-1]-y[0])/spacing[1]) + 1  # num pts in y-dir
+    lon = np.linspace(x[0],x[-1],nx)
+    lat = np.linspace(y[0],y[-1],ny)
+
+    return lon, lat
+
+
+def get_bathymetry(dataFile, lonLims, latLims, rows_per_read=None):
+    """ Read GEBCO bathymetry in a lat/lon window
+
+    Input params:
+    - dataFile: GEBCO 1D netCDF file (e.g. GRIDONE or GEBCO_2014)
+    - lonLims, latLims: [min, max] of the window (inclusive)
+    - rows_per_read: number of rows of the file read at once (default is ~4M values per read)
+
+    Returns lon, lat, Z with Z[lat, lon] (same as reshaping the whole 'z' variable, flipud and crop,
+    but only rows of the window are read).
+    usage ex:
+    import bathy_tools as bathy
+    lon, lat, Z = bathy.get_bathymetry(bathy.GRIDONE, [-60, -45], [42, 56])
+
+    """
+    dataset = netCDF4.Dataset(dataFile)
+    lon, lat = gebco_coordinates(dataset)
+    nx = lon.size
+    ny = lat.size
+
+    # Window indices
+    idx_lon = np.where((lon>=lonLims[0]) & (lon<=lonLims[1]))[0]
+    idx_lat = np.where((lat>=latLims[0]) & (lat<=latLims[1]))[0]
+    if (idx_lon.size == 0) | (idx_lat.size == 0):
+        print('!! no bathymetry in this window !!')
+        dataset.close()
+        return lon[idx_lon], lat[idx_lat], np.full((idx_lat.size, idx_lon.size), np.nan)
+
+    # Rows in the file go from North to South
+    row_start = ny-1 - idx_lat[-1]
+    row_end = ny-1 - idx_lat[0] + 1
+    if rows_per_read is None:
+        rows_per_read = np.max([1, 4194304 // nx])
+
+    zz = dataset.variables['z']
+    Z = []
+    for row in range(row_start, row_end, rows_per_read):
+        nrows = np.min([rows_per_read, row_end-row])
+        tmp = zz[row*nx:(row+nrows)*nx].reshape(nrows, nx)
+        Z.append(tmp[:, idx_lon[0]:idx_lon[-1]+1])
+    dataset.close()
+    Z = np.ma.concatenate(Z, axis=0)
+    Z = np.flipud(Z) # <------------ important!!!
+
+    return lon[idx_lon], lat[idx_lat], Z
+
+
+def get_bathymetry_on_grid(lon_reg, lat_reg, dataFile=GEBCO_2014, method='linear'):
+    """ Returns GEBCO bathymetry interpolated on the regular grid (lon_reg, lat_reg)
+
+    Input params:
+    - lon_reg, lat_reg: vectors of the regular grid
+    - dataFile: GEBCO 1D netCDF file
+    - method: 'bilinear', 'mean', 'min' or 'max' (see regrid_bathymetry) or a griddata
+      method ('linear', 'nearest' or 'cubic', much slower since the source grid is
+      triangulated as scattered points)
+
+    Result (Zitp[lat, lon], negative below sea level) is cached in 'cache_dir', keyed by
+    source file, grid and method, so the next call is read from disk.
+    usage ex:
+    import bathy_tools as bathy
+    dc = .1
+    lon_reg = np.arange(-60+dc/2, -45-dc/2, dc)
+    lat_reg = np.arange(42+dc/2, 56-dc/2, dc)
+    Zitp = bathy.get_bathymetry_on_grid(lon_reg, lat_reg)
+    Zmean = bathy.get_bathymetry_on_grid(lon_reg, lat_reg, method='mean') # average depth of each cell
+
+    """
+    lon_reg = np.asarray(lon_reg, dtype=float)
+    lat_reg = np.asarray(lat_reg, dtype=float)
+
+    # Check cache
+    cache_file = None
+    if cache_dir is not None:
+        key = hashlib.md5()
+        key.update(os.path.abspath(dataFile).encode())
+        key.update(np.str(os.path.getmtime(dataFile)).encode())
+        key.update(lon_reg.tobytes())
+        key.update(lat_reg.tobytes())
+        key.update(method.encode())
+        cache_file = os.path.join(cache_dir, 'bathy_' + key.hexdigest() + '.npy')
+        if os.path.isfile(cache_file):
+            return np.load(cache_file)
+
+    # Read window (+ one grid point, or half a cell for block methods, around the grid)
+    dataset = netCDF4.Dataset(dataFile)
+    spacing = dataset.variables['spacing'][:]
+    dataset.close()
+    margin_lon = spacing[0]
+    margin_lat = spacing[1]
+    if method in ['mean', 'min', 'max']:
+        margin_lon = np.max([margin_lon, np.abs(lon_reg[1]-lon_reg[0])/2])
+        margin_lat = np.max([margin_lat, np.abs(lat_reg[1]-lat_reg[0])/2])
+    lonLims = [lon_reg.min()-margin_lon, lon_reg.max()+margin_lon]
+    latLims = [lat_reg.min()-margin_lat, lat_reg.max()+margin_lat]
+    lon, lat, Z = get_bathymetry(dataFile, lonLims, latLims)
+
+    # interpolate data on regular grid
+    if method in ['bilinear', 'mean', 'min', 'max']:
+        Zitp = regrid_bathymetry(lon, lat, Z, lon_reg, lat_reg, method)
+    else:
+        lon_grid, lat_grid = np.meshgrid(lon_reg,lat_reg)
+        lon_grid_bathy, lat_grid_bathy = np.meshgrid(lon,lat)
+        lon_vec_bathy = np.reshape(lon_grid_bathy, lon_grid_bathy.size)
+        lat_vec_bathy = np.reshape(lat_grid_bathy, lat_grid_bathy.size)
+        z_vec = np.reshape(Z, Z.size)
+        Zitp = griddata((lon_vec_bathy, lat_vec_bathy), z_vec, (lon_grid, lat_grid), method=method)
+
+    # Save cache
+    if cache_file is not None:
+        if os.path.isdir(cache_dir) is False:
+            os.makedirs(cache_dir)
+        np.save(cache_file, Zitp)
+
+    return Zitp
+
+
+def regrid_bathymetry(lon, lat, Z, lon_reg, lat_reg, method='bilinear'):
+    """ Resample bathymetry given on a regular grid (lon, lat, Z[lat, lon], e.g. from get_bathymetry)
+    on another regular grid (lon_reg, lat_reg), using the grid structure (no triangulation)
+
+    Input params:
+    - method: 'bilinear': bilinear interpolation at the grid points (RegularGridInterpolator)
+              'mean', 'min' or 'max': aggregate of all source points in each cell of the new grid
+              (cells are centered on lon_reg, lat_reg; better suited for coarser grids)
+
+    Returns Zitp[lat_reg, lon_reg] (NaN where no source data), ValueError if method is unknown
+    usage ex:
+    lon, lat, Z = get_bathymetry(GEBCO_2014, [-61, -44], [41, 57])
+    Zmax = regrid_bathymetry(lon, lat, Z, lon_reg, lat_reg, method='max') # shallowest point of each cell
+
+    """
+    Z = np.ma.filled(np.ma.asarray(Z, dtype=float), np.nan)
+    lon_reg = np.asarray(lon_reg, dtype=float)
+    lat_reg = np.asarray(lat_reg, dtype=float)
+
+    if method == 'bilinear':
+        interp = RegularGridInterpolator((lat, lon), Z, method='linear', bounds_error=False, fill_value=np.nan)
+        lon_grid, lat_grid = np.meshgrid(lon_reg,lat_reg)
+        Zitp = interp(np.stack((lat_grid.ravel(), lon_grid.ravel()), axis=1))
+        return Zitp.reshape(lat_reg.size, lon_reg.size)
+
+    elif method in ['mean', 'min', 'max']:
+        # Cell of each source row/column
+        dlon = lon_reg[1]-lon_reg[0]
+        dlat = lat_reg[1]-lat_reg[0]
+        i = np.floor((lon - lon_reg[0] + dlon/2)/dlon).astype(int)
+        j = np.floor((lat - lat_reg[0] + dlat/2)/dlat).astype(int)
+        idx_lon = np.where((i>=0) & (i<lon_reg.size))[0]
+        idx_lat = np.where((j>=0) & (j<lat_reg.size))[0]
+        Zitp = np.full(lat_reg.size*lon_reg.size, np.nan)
+        if (idx_lon.size == 0) | (idx_lat.size == 0):
+            return Zitp.reshape(lat_reg.size, lon_reg.size)
+        cells = (j[idx_lat][:,np.newaxis]*lon_reg.size + i[idx_lon][np.newaxis,:]).ravel()
+        z_vec = Z[idx_lat[0]:idx_lat[-1]+1, idx_lon[0]:idx_lon[-1]+1].ravel()
+        agg = pd.Series(z_vec).groupby(cells).agg(method)
+        Zitp[agg.index.values] = agg.values
+        return Zitp.reshape(lat_reg.size, lon_reg.size)
+
+    else:
+        raise ValueError('method ' + method + ' unknown (bilinear, mean, min or max)')
@@ -0,0 +1,142 @@
+"""Distances on the sphere (vectorized with numpy)
+
+Contains following functions:
+- haversine(lon1, lat1, lon2, lat2, R=earth_radius)
+- along_track_distance(lon, lat)
+- section_distance(lon, lat)
+- distance_matrix(lon1, lat1, lon2=None, lat2=None)
+- lonlat_to_xyz(lon, lat)
+- station_tree(lon, lat)
+- nearest_station(lon, lat, st_lon=None, st_lat=None, max_distance=None, tree=None)
+
+All positions in decimal degrees, distances in km. Nearest station lookups use a KD-tree
+on unit-sphere coordinates (chord distance has the same ordering as great circle distance).
+
+----------
+
+Atlantic Zone Monitoring Program @NAFC:
+https://azmp-nl.github.io/
+
+"""
+
+__author__ = 'Frederic.Cyr@dfo-mpo.gc.ca'
+__version__ = '0.1'
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+# Earth radius (km) used in section tools since the beginning
+earth_radius = 6367.0
+
+# St.27 [lat, lon]
+St27 = [47.550, -52.590]
+
+
+def haversine(lon1, lat1, lon2, lat2, R=earth_radius):
+    """ Great circle distance (km) between two points (or arrays of points, numpy broadcasting)
+
+    usage ex:
+    d = haversine(-52.59, 47.55, -50, 48) # scalar
+    distance = haversine(lon[0], lat[0], lon, lat) # distance of all stations from the 1st one
+    """
+    lon1, lat1, lon2, lat2 = map(np.radians, [np.asarray(lon1, dtype=float), np.asarray(lat1, dtype=float),
+                                              np.asarray(lon2, dtype=float), np.asarray(lat2, dtype=float)])
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = np.sin(dlat/2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon/2)**2
+    c = 2 * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+    return R * c
+
+
+def along_track_distance(lon, lat):
+    """ Cumulative distance (km) along a track (first point is 0)
+
+    """
+    lon = np.asarray(lon, dtype=float)
+    lat = np.asarray(lat, dtype=float)
+    if lon.size == 0:
+        return np.zeros(0)
+    steps = haversine(lon[:-1], lat[:-1], lon[1:], lat[1:])
+    return np.concatenate(([0], np.cumsum(steps)))
+
+
+def section_distance(lon, lat):
+    """ Distance (km) of section stations from the first one, or from the last one if the
+    section goes toward St.27 (so distance always increases away from St.27 end)
+
+    """
+    lon = np.asarray(lon, dtype=float)
+    lat = np.asarray(lat, dtype=float)
+    distance = haversine(lon[0], lat[0], lon, lat)
+    if haversine(lon[0], lat[0], St27[1], St27[0]) > haversine(lon[-1], lat[-1], St27[1], St27[0]):
+        distance = np.abs(distance-distance.max())
+    return distance
+
+
+def distance_matrix(lon1, lat1, lon2=None, lat2=None):
+    """ Pairwise distances (km) between points 1 (rows) and points 2 (columns, default points 1)
+
+    """
+    lon1 = np.ravel(lon1).astype(float)
+    lat1 = np.ravel(lat1).astype(float)
+    if lon2 is None:
+        lon2 = lon1
+        lat2 = lat1
+    lon2 = np.ravel(lon2).astype(float)
+    lat2 = np.ravel(lat2).astype(float)
+    return haversine(lon1[:,np.newaxis], lat1[:,np.newaxis], lon2[np.newaxis,:], lat2[np.newaxis,:])
+
+
+def lonlat_to_xyz(lon, lat):
+    """ Cartesian coordinates (n x 3) on the unit sphere
+
+    """
+    lon = np.radians(np.ravel(lon).astype(float))
+    lat = np.radians(np.ravel(lat).astype(float))
+    return np.stack((np.cos(lat)*np.cos(lon), np.cos(lat)*np.sin(lon), np.sin(lat)), axis=1)
+
+
+def station_tree(lon, lat):
+    """ KD-tree of station positions (to be reused by nearest_station)
+
+    """
+    return cKDTree(lonlat_to_xyz(lon, lat))
+
+
+def nearest_station(lon, lat, st_lon=None, st_lat=None, max_distance=None, tree=None, R=earth_radius):
+    """ Nearest station of each point (e.g. archive casts)
+
+    Input params:
+    - lon, lat: positions of the points
+    - st_lon, st_lat: positions of the stations (not needed if tree is given)
+    - max_distance: points further than this (km) from any station are not assigned
+    - tree: KD-tree of the stations (see station_tree), built from st_lon, st_lat if None
+
+    Returns index of the nearest station (-1 if not assigned or position is NaN) and distance (km, NaN if not assigned).
+    usage ex:
+    idx, dist = nearest_station(ds.longitude.values, ds.latitude.values, stn_lon, stn_lat, max_distance=5)
+    """
+    if tree is None:
+        tree = station_tree(st_lon, st_lat)
+    xyz = lonlat_to_xyz(lon, lat)
+    valid = np.all(np.isfinite(xyz), axis=1)
+
+    idx = np.full(xyz.shape[0], -1, dtype=int)
+    distance = np.full(xyz.shape[0], np.nan)
+    if (valid.sum() == 0) | (tree.n == 0):
+        return idx, distance
+
+    if max_distance is None:
+        chord, i = tree.query(xyz[valid])
+    else:
+        chord_max = 2*np.sin(np.min([max_distance/R, np.pi])/2)
+        chord, i = tree.query(xyz[valid], distance_upper_bound=chord_max*(1+1e-12))
+    found = np.isfinite(chord)
+    idx_valid = np.full(i.size, -1, dtype=int)
+    idx_valid[found] = i[found]
+    dist_valid = np.full(i.size, np.nan)
+    dist_valid[found] = 2 * R * np.arcsin(np.clip(chord[found]/2, 0, 1))
+    idx[valid] = idx_valid
+    distance[valid] = dist_valid
+
+    return idx, distance
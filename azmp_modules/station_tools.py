@@ -0,0 +1,171 @@
+"""Catalogue of AZMP-NL standard stations (STANDARD_SECTIONS.xlsx)
+
+Contains following functions:
+- station_catalogue(stationFile=station_file)
+- section_stations(section, catalogue=None)
+- assign_stations(lon, lat, max_distance=2.0, sections=None, catalogue=None)
+
+The Excel file is read once and cached on disk (pickle in cache_dir, keyed by file and
+modification time) and in memory (reloaded if the file is modified). The catalogue holds a KD-tree of the stations (see
+geodesy_tools.nearest_station), so any set of casts can be assigned to the nearest
+standard station in one call, instead of matching 'comments' on section names.
+
+Section membership by position (used by azmp_sections_tools.get_section and
+water_masses.water_mass_timeseries with max_distance): each cast is assigned to its nearest
+standard station among ALL stations (assign_stations without sections) and belongs to the
+section of that station if it is within max_distance. A cast between two sections thus
+belongs to the closest one only.
+
+----------
+
+Atlantic Zone Monitoring Program @NAFC:
+https://azmp-nl.github.io/
+
+"""
+
+__author__ = 'Frederic.Cyr@dfo-mpo.gc.ca'
+__version__ = '0.1'
+
+import os
+import hashlib
+import numpy as np
+import pandas as pd
+import geodesy_tools as geo
+
+# Default file
+station_file = '/home/cyrf0006/github/AZMP-NL/data/STANDARD_SECTIONS.xlsx'
+
+# Where the catalogue is cached (set to None to disable)
+cache_dir = os.path.expanduser('~/.azmp_cache')
+
+# Section codes (as in azmp_sections_tools.section_bathymetry and pfile comments, e.g. 'FC-01')
+section_codes = {'SOUTHEAST GRAND BANK' : 'SEGB',
+                 'FLEMISH CAP' : 'FC',
+                 'BONAVISTA' : 'BB',
+                 'WHITE BAY' : 'WB',
+                 'SEAL ISLAND' : 'SI',
+                 'MAKKOVIK BANK' : 'MB',
+                 'BEACH ISLAND' : 'BI',
+                 'FUNK ISLAND' : 'FI',
+                 'STATION 27' : 'S27',
+                 'SOUTHEAST ST PIERRE BANK' : 'SESP',
+                 'SOUTHWEST ST PIERRE BANK' : 'SWSP',
+                 'SMITH SOUND' : 'SS'}
+
+# Catalogues already loaded (key is file name, value is (modification time, catalogue))
+station_catalogues = {}
+
+
+def station_catalogue(stationFile=station_file):
+    """ Returns the catalogue of standard stations, a dict with:
+    - 'stations': DataFrame of the file (columns SECTION, STATION, LAT, LONG.1, ...) with added column CODE
+    - 'index': {section code : list of rows of 'stations'} (same as df.SECTION[df.SECTION==name].index.tolist())
+    - 'lon', 'lat', 'code', 'station': arrays of station positions, section codes and names
+    - 'tree': KD-tree of station positions (see geodesy_tools.station_tree)
+    Stations without position (LAT or LONG.1 missing) are not in the catalogue.
+
+    usage ex:
+    import station_tools as stn
+    catalogue = stn.station_catalogue()
+    index_FC = catalogue['index']['FC']
+    """
+    mtime = None
+    if os.path.isfile(stationFile):
+        mtime = os.path.getmtime(stationFile)
+    if (stationFile in station_catalogues.keys()) and (station_catalogues[stationFile][0] == mtime):
+        return station_catalogues[stationFile][1]
+
+    # Read cache or Excel file
+    cache_file = None
+    if (cache_dir is not None) and (mtime is not None):
+        key = hashlib.md5()
+        key.update(os.path.abspath(stationFile).encode())
+        key.update(np.str(mtime).encode())
+        cache_file = os.path.join(cache_dir, 'stations_' + key.hexdigest() + '.pkl')
+    if (cache_file is not None) and os.path.isfile(cache_file):
+        df = pd.read_pickle(cache_file)
+    else:
+        df = pd.read_excel(stationFile)
+        df['CODE'] = df['SECTION'].map(lambda x: section_codes.get(x, x))
+        if cache_file is not None:
+            if os.path.isdir(cache_dir) is False:
+                os.makedirs(cache_dir)
+            df.to_pickle(cache_file)
+    missing = df['LAT'].isnull() | df['LONG.1'].isnull()
+    if missing.any():
+        print('!! ' + np.str(missing.sum()) + ' station(s) without position in ' + stationFile + ' [skip] !!')
+        df = df[~missing].reset_index(drop=True)
+
+    catalogue = {}
+    catalogue['stations'] = df
+    catalogue['index'] = dict([(code, df.index[df['CODE']==code].tolist()) for code in df['CODE'].unique()])
+    catalogue['lon'] = df['LONG.1'].values.astype(float)
+    catalogue['lat'] = df['LAT'].values.astype(float)
+    catalogue['code'] = df['CODE'].values.astype(str)
+    catalogue['station'] = df['STATION'].values.astype(str)
+    catalogue['tree'] = geo.station_tree(catalogue['lon'], catalogue['lat'])
+
+    station_catalogues[stationFile] = (mtime, catalogue)
+    return catalogue
+
+
+def section_stations(section, catalogue=None):
+    """ Returns the stations (rows of the catalogue) of a section (code, e.g. 'FC', or name, e.g. 'FLEMISH CAP')
+
+    """
+    if catalogue is None:
+        catalogue = station_catalogue()
+    code = section_codes.get(section, section)
+    if code not in catalogue['index'].keys():
+        print('!! section ' + section + ' not in station catalogue !!')
+        return catalogue['stations'].iloc[0:0]
+    return catalogue['stations'].loc[catalogue['index'][code]]
+
+
+def assign_stations(lon, lat, max_distance=2.0, sections=None, catalogue=None):
+    """ Assign casts to the nearest standard station
+
+    Input params:
+    - lon, lat: positions of the casts (e.g. ds.longitude.values or pfile index lon/lat)
+    - max_distance: casts further than this (km) from their nearest station are not assigned
+    - sections: only consider stations of these sections (codes or names, default all)
+    - catalogue: see station_catalogue (default file if None)
+
+    Returns a DataFrame (one row per cast, same order) with columns section (code), station,
+    distance (km) and station_index (row of catalogue['stations']); section and station are ''
+    and station_index -1 for casts not assigned.
+    usage ex:
+    import station_tools as stn
+    df = stn.assign_stations(ds.longitude.values, ds.latitude.values, max_distance=5, sections=['FC', 'BB'])
+    ds_FC = ds.isel(time=np.where(df.section=='FC')[0])
+    """
+    if catalogue is None:
+        catalogue = station_catalogue()
+
+    if sections is None:
+        rows = np.arange(catalogue['lon'].size)
+        tree = catalogue['tree']
+    else:
+        codes = [section_codes.get(section, section) for section in sections]
+        rows = np.where(np.in1d(catalogue['code'], codes))[0]
+        if rows.size:
+            tree = geo.station_tree(catalogue['lon'][rows], catalogue['lat'][rows])
+        else:
+            print('!! no station for sections ' + ', '.join(codes) + ' !!')
+            tree = None
+
+    if tree is None:
+        idx = np.full(np.size(lon), -1, dtype=int)
+        distance = np.full(np.size(lon), np.nan)
+    else:
+        idx, distance = geo.nearest_station(lon, lat, max_distance=max_distance, tree=tree)
+    found = idx>=0
+    station_index = np.full(idx.size, -1, dtype=int)
+    station_index[found] = rows[idx[found]]
+    section = np.full(idx.size, '', dtype=object)
+    section[found] = catalogue['code'][station_index[found]]
+    station = np.full(idx.size, '', dtype=object)
+    station[found] = catalogue['station'][station_index[found]]
+
+    return pd.DataFrame({'section' : section, 'station' : station, 'distance' : distance,
+                         'station_index' : station_index}, columns=['section', 'station', 'distance', 'station_index'])
@@ -15,11 +15,15 @@ __author__ = 'Frederic.Cyr@dfo-mpo.gc.ca'
 __version__ = '0.1'
 
 import numpy as np
+import pandas as pd
+import netCDF4
+import multiprocessing
 import time as tt
 import os
 from sys import version_info
-from shapely.geometry import Point
-from shapely.geometry.polygon import Polygon
+from matplotlib.path import Path
+import archive_tools as archive
+import station_tools as stn
 
 
 def water_masses_def_petrie():
@@ -109,32 +113,288 @@ def water_masses_def_petrie():
     return dict
 
 
-def water_mass_id(T,S):
-    """Returns the water mass associated to the given T-S properties.
+# Classifier built from water_masses_def_petrie() at first use (see get_classifier)
+petrie_classifier = None
+
+def get_classifier(wm_def=None):
+    """ Returns the water masses classifier (dict) used by classify_water_masses:
+    - 'names': names of the water masses (code i+1 is names[i], 0 is no water mass)
+    - 'paths': matplotlib Path of each water mass in (S, T) space
+    - 'bounds': [Smin, Smax, Tmin, Tmax] of each water mass
+
+    Input params:
+    - wm_def: water masses definition (dict of (S, T) polygons); default is water_masses_def_petrie()
+      (its classifier is built only once)
+
+    """
+    global petrie_classifier
+    if (wm_def is None) and (petrie_classifier is not None):
+        return petrie_classifier
+
+    definition = wm_def
+    if definition is None:
+        definition = water_masses_def_petrie()
+    
+    classifier = {'names' : [], 'paths' : [], 'bounds' : []}
+    for name in sorted(definition.keys()):
+        vertices = np.array(definition[name], dtype=float)
+        classifier['names'].append(name)
+        classifier['paths'].append(Path(vertices))
+        classifier['bounds'].append([vertices[:,0].min(), vertices[:,0].max(), vertices[:,1].min(), vertices[:,1].max()])
+
+    if wm_def is None:
+        petrie_classifier = classifier
+
+    return classifier
+
+
+def classify_water_masses(T, S, classifier=None):
+    """ Returns the water mass code of each T-S pair (vectorized)
+
+    Input params:
+    - T, S: arrays of any shape (numpy arrays or xarray DataArrays, e.g. ds['temperature'] over time x level)
+    - classifier: see get_classifier (default: Petrie's water masses)
+
+    Returns an integer array of the same shape as T (a DataArray if T is a DataArray) with
+    0 for no water mass (or NaN) and i+1 for classifier['names'][i].
+    Points exactly on the limit between 2 water masses are given to one of them.
+    usage ex:
+    import water_masses as wm
+    codes = wm.classify_water_masses(ds['temperature'], ds['salinity'])
+    names = wm.get_classifier()['names']
+    CIL = ds['temperature'].where(codes == names.index('InLC')+1)
 
     """
+    if classifier is None:
+        classifier = get_classifier()
 
-    wm =  water_masses_def()
+    T_values = np.asarray(T, dtype=float)
+    S_values = np.asarray(S, dtype=float)
+    T_vec = T_values.ravel()
+    S_vec = S_values.ravel()
+    codes = np.zeros(T_vec.size, dtype=np.int8)
 
-    point = Point(S,T)
-    wm_id = ''
-    for name in wm.keys():
-        polygon = Polygon(wm.get(name))
-        if polygon.contains(point):
-            wm_id = name
+    good = np.where(~np.isnan(T_vec) & ~np.isnan(S_vec))[0]
+    for k, path in enumerate(classifier['paths']):
+        # only points in the bounding box are tested
+        Smin, Smax, Tmin, Tmax = classifier['bounds'][k]
+        idx = good[(S_vec[good]>=Smin) & (S_vec[good]<=Smax) & (T_vec[good]>=Tmin) & (T_vec[good]<=Tmax)]
+        if idx.size == 0:
+            continue
+        inside = path.contains_points(np.stack((S_vec[idx], T_vec[idx]), axis=1))
+        codes[idx[inside]] = k+1
+    codes = codes.reshape(T_values.shape)
+
+    if hasattr(T, 'dims') and hasattr(T, 'coords'): # xarray DataArray
+        codes = T.copy(data=codes)
+        codes.name = 'water_mass'
+        codes.attrs = {'flag_values' : np.arange(len(classifier['names'])+1), 'flag_meanings' : ' '.join(['none'] + classifier['names'])}
     
-    return wm_id
+    return codes
+
+
+def water_mass_id(T,S):
+    """Returns the water mass associated to the given T-S properties ('' if none).
+
+    """
+    code = classify_water_masses(np.array([T]), np.array([S]))[0]
+    if code == 0:
+        return ''
+    else:
+        return get_classifier()['names'][code-1]
         
 
 def get_water_mass(T,S, wm_name):
     """Given a list of T-S properties and the name of a water mass, the function returns the indices that fits in the definition.
 
     """
+    names = get_classifier()['names']
+    if wm_name not in names:
+        return []
+    codes = classify_water_masses(np.ravel(T), np.ravel(S))
     
-    indices = []
-    for idx, tt in enumerate(T):
-        if water_mass_id(T[idx],S[idx]) == wm_name:
-            indices.append(idx)
+    return list(np.where(codes == names.index(wm_name)+1)[0])
+
+
+def water_mass_thickness(T, S, level, classifier=None):
+    """ Returns the thickness of each water mass in each cast
+
+    Input params:
+    - T, S: binned profiles (ncasts x nlevels)
+    - level: levels of the bins (e.g. dbar, ~m); thickness of a bin is np.gradient(level)
+    - classifier: see get_classifier (default: Petrie's water masses)
+
+    Returns thickness (ncasts x nmasses, same order as classifier['names']) and the sampled
+    thickness of each cast (bins with both T and S).
     
-    return indices
-        
+    """
+    if classifier is None:
+        classifier = get_classifier()
+    T = np.atleast_2d(np.asarray(T, dtype=float))
+    S = np.atleast_2d(np.asarray(S, dtype=float))
+    level = np.asarray(level, dtype=float)
+    if level.size > 1:
+        dz = np.gradient(level)
+    else:
+        dz = np.ones(level.size)
+
+    codes = classify_water_masses(T, S, classifier)
+    thickness = np.zeros((T.shape[0], len(classifier['names'])))
+    for k in range(len(classifier['names'])):
+        thickness[:,k] = ((codes==k+1)*dz).sum(axis=1)
+    sampled = ((~np.isnan(T) & ~np.isnan(S))*dz).sum(axis=1)
+
+    return thickness, sampled
+
+
+def water_mass_file(args):
+    """ Water masses thickness of the casts of one yearly netCDF file that are in the regions/sections
+    (used by water_mass_timeseries, one call per worker)
+
+    args is (fname, regions, sections, stations, classifier, block_size), with stations None
+    (sections from comments) or (catalogue, max_distance) of standard stations (see
+    station_tools.station_catalogue and station_tools for the membership rule).
+    Returns a DataFrame with one row per cast and group (region or section).
+    
+    """
+    fname, regions, sections, stations, classifier, block_size = args
+    nc_in = netCDF4.Dataset(fname)
+    v = nc_in.variables
+
+    # Groups of each cast from 1D variables
+    lon = np.ma.filled(v['longitude'][:].astype(float), np.nan)
+    lat = np.ma.filled(v['latitude'][:].astype(float), np.nan)
+    times = pd.DatetimeIndex(np.atleast_1d(netCDF4.num2date(v['time'][:], v['time'].units, getattr(v['time'], 'calendar', 'standard'))))
+    groups = {}
+    for name in regions.keys():
+        path = Path(np.stack((regions[name]['lon'], regions[name]['lat']), axis=1))
+        groups[name] = path.contains_points(np.stack((lon, lat), axis=1))
+    if len(sections) and (stations is not None):
+        catalogue, max_distance = stations
+        code = stn.assign_stations(lon, lat, max_distance=max_distance, catalogue=catalogue)['section'].values
+        for name in sections:
+            groups[name] = code==stn.section_codes.get(name, name)
+    elif len(sections):
+        comments = pd.Series(np.asarray(v['comments'][:], dtype=object)).fillna('').astype(str)
+        for name in sections:
+            groups[name] = comments.str.contains(name + '-').values
+    in_group = np.zeros(lon.size, dtype=bool)
+    for name in groups.keys():
+        in_group |= groups[name]
+    idx = np.where(in_group)[0]
+
+    columns = ['time', 'group'] + classifier['names'] + ['sampled']
+    if idx.size == 0:
+        nc_in.close()
+        return pd.DataFrame(columns=columns)
+
+    # Read T-S of selected casts only, by blocks of consecutive casts
+    level = v['level'][:]
+    thickness = []
+    sampled = []
+    runs = np.split(idx, np.where(np.diff(idx)>1)[0]+1)
+    for run in runs:
+        for i0 in range(run[0], run[-1]+1, block_size):
+            i1 = np.min([i0+block_size, run[-1]+1])
+            T = np.ma.filled(v['temperature'][i0:i1,:].astype(float), np.nan)
+            S = np.ma.filled(v['salinity'][i0:i1,:].astype(float), np.nan)
+            H, Hs = water_mass_thickness(T, S, level, classifier)
+            thickness.append(H)
+            sampled.append(Hs)
+    nc_in.close()
+    thickness = np.concatenate(thickness, axis=0)
+    sampled = np.concatenate(sampled)
+
+    # One row per cast and group
+    df_list = []
+    for name in sorted(groups.keys()):
+        keep = groups[name][idx]
+        if keep.sum() == 0:
+            continue
+        df = pd.DataFrame(thickness[keep,:], columns=classifier['names'])
+        df.insert(0, 'group', name)
+        df.insert(0, 'time', times[idx][keep])
+        df['sampled'] = sampled[keep]
+        df_list.append(df)
+    if len(df_list) == 0:
+        return pd.DataFrame(columns=columns)
+
+    return pd.concat(df_list, ignore_index=True)
+
+
+def water_mass_timeseries(infiles, regions={}, sections=[], workers=1, outfile=None, classifier=None, block_size=1000, max_distance=None):
+    """ Time series of water masses thickness and fraction by region/section, season and year
+
+    Input params:
+    - infiles: yearly netCDF files (pattern, e.g. '/home/cyrf0006/data/dev_database/*.nc', or list)
+    - regions: dict of polygons {name : {'lon' : [...], 'lat' : [...]}} (e.g. azu.get_nafo_divisions())
+    - sections: list of sections (casts with comments containing e.g. 'FC-' for 'FC')
+    - workers: number of processes (one file per process at a time)
+    - outfile: where the table is saved ('.nc' for netCDF, pickle otherwise)
+    - classifier: see get_classifier (default: Petrie's water masses)
+    - block_size: number of casts read at once
+    - max_distance: if given (km), casts are assigned to sections by position (nearest standard
+      station within max_distance, see station_tools for the rule) instead of comments
+
+    For each cast in a region/section, the thickness of each water mass is computed over the
+    binned profile (see water_mass_thickness). Casts with T-S pairs (sampled thickness > 0)
+    are then averaged by group, season (winter, spring, summer, fall) and year.
+    Returns a DataFrame indexed by (group, season, year) with the mean thickness of each water mass,
+    its mean fraction of the sampled profile (<name>_frac), the mean sampled thickness and ncasts.
+    usage ex:
+    import azmp_utils as azu
+    import water_masses as wm
+    df = wm.water_mass_timeseries('/home/cyrf0006/data/dev_database/*.nc', regions=azu.get_nafo_divisions(), sections=['FC', 'BB', 'SI'], workers=8, outfile='water_masses_timeseries.pkl')
+    df.loc[('FC', 'summer'), 'InLC'].plot()
+    
+    """
+    if classifier is None:
+        classifier = get_classifier()
+    filelist = archive.archive_files(infiles)
+
+    stations = None
+    if max_distance is not None:
+        stations = (stn.station_catalogue(), max_distance) # loaded once, sent to the workers
+
+    args = [(fname, regions, sections, stations, classifier, block_size) for fname in filelist]
+    if workers > 1:
+        pool = multiprocessing.Pool(workers)
+        outputs = pool.map(water_mass_file, args, chunksize=1)
+        pool.close()
+        pool.join()
+    else:
+        outputs = [water_mass_file(arg) for arg in args]
+    df = pd.concat(outputs, ignore_index=True)
+    if df.shape[0] == 0:
+        print('!! no cast in regions/sections !!')
+        return None
+
+    # Casts without T-S pairs (e.g. XBT) are not averaged
+    df[classifier['names']+['sampled']] = df[classifier['names']+['sampled']].astype(float)
+    df = df[df['sampled']>0]
+    if df.shape[0] == 0:
+        print('!! no cast with temperature and salinity in regions/sections !!')
+        return None
+
+    # Season and year of each cast
+    df['time'] = pd.to_datetime(df['time'])
+    month_to_season = dict([(month, season) for season in archive.season_months.keys() for month in archive.season_months[season]])
+    df['season'] = df['time'].dt.month.map(lambda x: month_to_season.get(x, 'winter'))
+    df['year'] = df['time'].dt.year
+    for name in classifier['names']:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            df[name + '_frac'] = df[name]/df['sampled']
+
+    # Average per group, season and year
+    grouped = df.drop('time', axis=1).groupby(['group', 'season', 'year'])
+    df_ts = grouped.mean()
+    df_ts['ncasts'] = grouped.size()
+
+    if outfile is not None:
+        if outfile.endswith('.nc'):
+            df_ts.to_xarray().to_netcdf(outfile)
+        else:
+            df_ts.to_pickle(outfile)
+        print(' -> ' + outfile + ' saved!')
+
+    return df_ts
@@ -78,25 +78,9 @@ df_coords = df_SI.groupby(['sname'])['Latitude', 'Longitude'].mean()
 
 
 # Compute along-transect distance
-from math import radians, cos, sin, asin, sqrt
-from math import radians, cos, sin, asin, sqrt
-def haversine(lon1, lat1, lon2, lat2):
-    """
-    Calculate the great circle distance between two points 
-    on the earth (specified in decimal degrees)
-    """
-    # convert decimal degrees to radians 
-    lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
-    dlon = lon2 - lon1 
-    dlat = lat2 - lat1 
-    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-    c = 2 * asin(sqrt(a)) 
-    km = 6367 * c
-    return km
-
-distance = np.zeros(df_coords['Latitude'].shape)
-for i in range(df_coords['Latitude'].size):
-    distance[i] = haversine(df_coords['Longitude'][0], df_coords['Latitude'][0], df_coords['Longitude'][i], df_coords['Latitude'][i])
+import geodesy_tools as geo
+
+distance = geo.haversine(df_coords['Longitude'].values[0], df_coords['Latitude'].values[0], df_coords['Longitude'].values, df_coords['Latitude'].values)
 
 # Load bathymetry
 si_bathy = '/home/cyrf0006/github/AZMP-NL/bathymetry/bottom_profiles/siline.txt'
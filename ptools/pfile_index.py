@@ -0,0 +1,186 @@
+"""Header index of a pfile archive
+
+The archive is scanned once (see build_pfile_index) and the header of each pfile
+(cast info line, channels and number of data lines) is stored in a pandas DataFrame
+indexed by path and pickled on disk. Files can then be selected by position, time,
+instrument, etc. without opening them (see query_pfile_index).
+
+Example (list of 1995 casts with temperature in 3L):
+In [1]: import pfile_index as pi
+In [2]: index = pi.build_pfile_index('/home/cyrf0006/data/dev_database/data2', 'pfiles_index.pkl')
+In [3]: df = pi.query_pfile_index('pfiles_index.pkl', lonLims=[-53, -46], latLims=[46, 50], timeLims=['1995-01-01', '1996-01-01'], channels=['temp'])
+In [4]: np.savetxt('1995.list', df.index.values, fmt='%s')
+
+"""
+
+__author__ = 'Frederic.Cyr@dfo-mpo.gc.ca'
+__version__ = '0.1'
+
+import os
+import fnmatch
+import multiprocessing
+import numpy as np
+import pandas as pd
+import pfile_tools
+
+# columns of the index (index is 'path')
+index_columns = ['size', 'mtime', 'header_ok', 'cast_id', 'lat', 'lon', 'time', 'time_flag', 'sounder_depth',
+                 'instrument_id', 'set', 'instrument_type', 'comment', 'channels', 'ndata']
+
+
+def pfile_index_row(fname):
+    """Scan a single pfile (see pfile_tools.read_pfile) and returns its index row as a dict (see index_columns)
+
+    'channels' is the space-separated list of columns and 'ndata' the number of data lines.
+    'time' is corrected as in pfile_tools.pfile_to_cast and 'time_flag' is the QC code of the
+    correction ('' if none, see pfile_tools.check_cast_time).
+
+    """
+    stat = os.stat(fname)
+    row = {'size' : stat.st_size, 'mtime' : stat.st_mtime, 'header_ok' : False,
+           'cast_id' : '', 'lat' : np.nan, 'lon' : np.nan, 'time' : pd.NaT, 'time_flag' : '', 'sounder_depth' : np.nan,
+           'instrument_id' : '', 'set' : '', 'instrument_type' : '', 'comment' : '',
+           'channels' : '', 'ndata' : 0}
+
+    pfile = pfile_tools.read_pfile(fname)
+    header = pfile['header']
+    if (len(header) < 3) or ('NAFC_Y2K_HEADER' not in header[0]):
+        return row
+
+    row.update(pfile['cast_info'])
+    row['header_ok'] = True
+    row['channels'] = ' '.join(pfile['columns'])
+    data = pfile['text'][pfile['data_start']:].split('\n')
+    row['ndata'] = len([line for line in data if line.strip()])
+
+    return row
+
+
+def find_pfiles(path, pattern='*.p[0-9][0-9][0-9][0-9]'):
+    """Returns the sorted list of pfiles found (recursively) in directory 'path'
+
+    """
+    filelist = []
+    for root, dirs, files in os.walk(path):
+        for fname in fnmatch.filter(files, pattern):
+            filelist.append(os.path.join(root, fname))
+    filelist.sort()
+
+    return filelist
+
+
+def build_pfile_index(infiles, index_file=None, workers=1, update=True):
+    """Build (or update) the header index of a pfile archive
+
+    Input params:
+        - infiles: directory of the archive (searched recursively for *.pYYYY),
+          a file containing the list of pfiles, or a python list of pfiles
+        - index_file: pickle where the index is saved (not saved if None)
+        - workers: number of processes used to scan the files
+        - update: if index_file exists, only files that are new or whose size/mtime
+          changed are scanned (files no longer in 'infiles' are dropped)
+
+    Returns the index (DataFrame indexed by path, see index_columns)
+    usage ex:
+    index = build_pfile_index('/home/cyrf0006/data/dev_database/data2', 'pfiles_index.pkl', workers=8)
+
+    """
+    # get the list of files
+    if isinstance(infiles, list):
+        filelist = infiles
+    elif os.path.isdir(infiles):
+        filelist = find_pfiles(infiles)
+    else:
+        filelist = list(np.genfromtxt(infiles, dtype=str, ndmin=1))
+
+    # rows that can be kept from previous index
+    old_index = None
+    if update & (index_file is not None):
+        if os.path.isfile(index_file):
+            old_index = pd.read_pickle(index_file)
+            if 'time_flag' not in old_index.columns: # index built before time correction, rescan
+                print ' -> ' + index_file + ' has no time_flag column, all files are rescanned'
+                old_index = None
+
+    rows = {}
+    to_scan = []
+    for fname in filelist:
+        if os.path.isfile(fname) is False:
+            print fname + ' not found! [skip]'
+            continue
+        if (old_index is not None) and (fname in old_index.index):
+            stat = os.stat(fname)
+            old_row = old_index.loc[fname]
+            if (old_row['size'] == stat.st_size) & (old_row['mtime'] == stat.st_mtime):
+                rows[fname] = old_row.to_dict()
+                continue
+        to_scan.append(fname)
+
+    print ' -> ' + str(len(to_scan)) + ' files to scan (' + str(len(rows)) + ' unchanged)'
+    if workers > 1:
+        pool = multiprocessing.Pool(workers)
+        scanned = pool.map(pfile_index_row, to_scan, chunksize=64)
+        pool.close()
+        pool.join()
+    else:
+        scanned = [pfile_index_row(fname) for fname in to_scan]
+    rows.update(dict(zip(to_scan, scanned)))
+
+    # to DataFrame (keep order of filelist)
+    paths = [fname for fname in filelist if fname in rows]
+    index = pd.DataFrame([rows[fname] for fname in paths], index=pd.Index(paths, name='path'), columns=index_columns)
+    index['time'] = pd.to_datetime(index['time'])
+    index['header_ok'] = index['header_ok'].astype(bool)
+    index['ndata'] = index['ndata'].astype(int)
+
+    n_bad = (~index['header_ok']).sum()
+    if n_bad > 0:
+        print ' -> ' + str(n_bad) + ' files with bad header (header_ok = False)'
+
+    if index_file is not None:
+        index.to_pickle(index_file)
+
+    return index
+
+
+def query_pfile_index(index, lonLims=None, latLims=None, timeLims=None, months=None, instrument_type=None, instrument_id=None, channels=None, min_ndata=1):
+    """Select pfiles from the index without opening them
+
+    Input params:
+        - index: the index (DataFrame) or its pickle file (see build_pfile_index)
+        - lonLims, latLims: [min, max] (inclusive)
+        - timeLims: [start, end[ (anything understood by pd.Timestamp)
+        - months: list of months (e.g. [4, 5, 6] for spring)
+        - instrument_type: type(s) as written in the header (e.g. 'V' or ['V', 'S'])
+        - instrument_id: id(s) as written in the header
+        - channels: list of channels (pfile columns) that must be in the file
+        - min_ndata: minimum number of data lines
+
+    Files with a bad header are never returned.
+    Returns the selected rows of the index (use .index.values for the list of files).
+    usage ex:
+    df = query_pfile_index('pfiles_index.pkl', timeLims=['1995-01-01', '1996-01-01'], months=[7, 8, 9], channels=['temp', 'sal'])
+
+    """
+    if isinstance(index, basestring):
+        index = pd.read_pickle(index)
+
+    keep = index['header_ok'].values & (index['ndata'].values >= min_ndata)
+    if lonLims is not None:
+        keep &= (index['lon'].values >= lonLims[0]) & (index['lon'].values <= lonLims[1])
+    if latLims is not None:
+        keep &= (index['lat'].values >= latLims[0]) & (index['lat'].values <= latLims[1])
+    if timeLims is not None:
+        keep &= ((index['time'] >= pd.Timestamp(timeLims[0])) & (index['time'] < pd.Timestamp(timeLims[1]))).values
+    if months is not None:
+        keep &= index['time'].dt.month.isin(months).values
+    if instrument_type is not None:
+        keep &= index['instrument_type'].isin(np.atleast_1d(instrument_type)).values
+    if instrument_id is not None:
+        keep &= index['instrument_id'].isin(np.atleast_1d(instrument_id)).values
+    if channels is not None:
+        file_channels = index['channels'].str.split()
+        for channel in channels:
+            keep &= file_channels.apply(lambda x: channel in x).values
+
+    return index[keep]
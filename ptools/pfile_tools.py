@@ -23,7 +23,14 @@ import numpy as np
 import time as tt
 import netCDF4 as nc
 import os
+import functools
+import hashlib
+import multiprocessing
 from sys import version_info
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from io import StringIO
 
 
 def pfile_variables(filename):
@@ -74,351 +81,400 @@ def pfile_header(filename):
 
     return header
 
+def parse_cast_info(cast_info):
+    """Parse the fixed-width cast info line of a pfile (header[1]) into a dict
+
+    Fields are returned as written in the file, except time which is corrected as in
+    pfile_to_cast (see check_cast_time) and flagged in 'time_flag' ('' if ok, else the
+    QC code, e.g. 'bad_minute'). Fields that cannot be read are NaN (NaT for time).
+    Example:
+    In [1]: header = pfile_header('39173013.p2017')
+    In [2]: parse_cast_info(header[1])['time']
+    Out[2]: Timestamp('2017-07-23 10:52:00')
+
+    """
+    cast_info = cast_info.replace(',',' ')
+    info = {}
+    info['cast_id'] = cast_info[0:8].strip()
+
+    try:
+        info['lat'] = np.float(cast_info[10:12]) + np.float(cast_info[13:18])/60.0
+        info['lon'] = np.sign(np.float(cast_info[19:23])) * (np.abs(np.float(cast_info[19:23])) + np.float(cast_info[24:29])/60.0)
+    except ValueError:
+        info['lat'] = np.nan
+        info['lon'] = np.nan
+
+    # time (corrected as in pfile_to_cast, see check_cast_time)
+    try:
+        cast_info, event = check_cast_time(cast_info)
+        info['time_flag'] = '' if event is None else event['code']
+        if (event is not None) and event['skip']:
+            info['time'] = pd.NaT
+        else:
+            info['time'] = pd.Timestamp(cast_info[29:40] + ' ' + cast_info[40:46])
+    except ValueError:
+        info['time_flag'] = 'bad_time'
+        info['time'] = pd.NaT
+
+    try:
+        info['sounder_depth'] = np.float(cast_info[46:51])
+    except ValueError:
+        info['sounder_depth'] = np.nan
+
+    info['instrument_id'] = cast_info[51:57].replace(' ','')
+    info['set'] = cast_info[57:61].replace(' ','')
+    info['instrument_type'] = cast_info[62:63].replace(' ','')
+    info['comment'] = cast_info[64:78].replace(' ','')
+
+    return info
+
+def check_cast_time(cast_info):
+    """Check the time fields of a cast info line (header[1], commas replaced by spaces)
+
+    Minute > 59 or hour > 23 are set to 00, a wrong date (month > 12 or day > 31) rejects the cast.
+    Returns (cast_info, event) with the corrected line and the QC event (see qc_event, None if
+    time is ok). Used by both parse_cast_info and pfile_to_cast so they agree on cast times.
+
+    """
+    event = None
+    if np.int(cast_info[44:46])>59:
+        event = qc_event('bad_minute', 'time problem', cast_info[29:46])
+        tmp = list(cast_info)
+        tmp[44:46]=['0','0']
+        cast_info = "".join(tmp)
+    elif np.int(cast_info[41:43])>23:
+        event = qc_event('bad_hour', 'time problem', cast_info[29:46])
+        tmp = list(cast_info)
+        tmp[41:43]=['0','0']
+        cast_info = "".join(tmp)
+    elif ((np.int(cast_info[35:37])>12) | (np.int(cast_info[38:40])>31)):
+        event = qc_event('bad_date', 'Problem with file: wrong date [skip]', cast_info[29:46])
+
+    return cast_info, event
+
+def read_pfile(filename, data=False):
+    """Read a pfile in a single read() and returns a dict with:
+        - header: list of header lines (same as pfile_header)
+        - columns: channel names (last line of header, same as pfile_variables)
+        - cast_info: parsed cast info line (see parse_cast_info, None if no such line)
+        - data: Pandas.DataFrame of the data (None until pfile_data() is called,
+          unless data=True)
+
+    The raw text is kept in the dict so the data can be parsed later (or never)
+    without reopening the file.
+    Example:
+    In [1]: pfile = read_pfile('39173013.p2017')
+    In [2]: pfile['columns']
+    Out[2]: ['pres', 'temp', 'sal', 'cond', 'sigt', 'flor', 'oxy', 'par']
+    In [3]: df = pfile_data(pfile)
+
+    """
+    eoh = pfiles_basics.eoh()
+
+    with open(filename, 'r') as td:
+        text = td.read()
+
+    # locate end-of-header line and beginning of data
+    if text.startswith(eoh):
+        idx_eoh = 0
+    else:
+        idx_eoh = text.find('\n' + eoh)
+        idx_eoh = len(text) if idx_eoh == -1 else idx_eoh+1
+    idx_data = text.find('\n', idx_eoh)
+    idx_data = len(text) if idx_data == -1 else idx_data+1
+
+    pfile = {}
+    pfile['header'] = text[0:idx_eoh].splitlines(True)
+    if len(pfile['header']) > 0:
+        pfile['columns'] = pfile['header'][-1].split()
+    else:
+        pfile['columns'] = []
+    if len(pfile['header']) > 1:
+        pfile['cast_info'] = parse_cast_info(pfile['header'][1])
+    else:
+        pfile['cast_info'] = None
+    pfile['text'] = text
+    pfile['data_start'] = idx_data
+    pfile['data'] = None
+
+    if data:
+        pfile_data(pfile)
+
+    return pfile
+
+def pfile_data(pfile):
+    """Returns (and keeps in pfile['data']) the data of a pfile read by read_pfile as a
+       Pandas.DataFrame with columns being the variables
+
+    """
+    if pfile['data'] is None:
+        td = StringIO(pfile['text'][pfile['data_start']:])
+        try:
+            pfile['data'] = pd.read_csv(td, sep=r'\s+', header=None, names=pfile['columns'], dtype=float, float_precision='high')
+        except pd.errors.EmptyDataError: # no data
+            pfile['data'] = pd.DataFrame(columns=pfile['columns'], dtype=float)
+
+    return pfile['data']
+
 def pfile_to_dataframe(filename):
     """Reads a pfile given in 'filename' as returns a Pandas.DataFrame with
        columns being the variables
 
+       The file is read once (see read_pfile) and the data block is handed in
+       one go to pandas' C parser.
+
     """
-    eoh = pfiles_basics.eoh()
-    in_header = True
+    return pfile_data(read_pfile(filename))
 
-    # Read header
-    header = []
-    data = []
-    with open(filename, 'r') as td:
-        for line in td:
-        
-            if re.match(eoh, line): # end-of-header            
-                in_header = False
-                continue # ignore line
-            elif in_header: # read header
-                header.append(line)
-            else: # read data
-                line = re.sub('\n','', line)
-                line = line.strip()
-                line = re.sub(' +',' ', line)
-                data.append(line.split(' '))
+def bin_pressure(P, X, Pbin):
+    """Bin-average one or many channels on the pressure bins Pbin (single pass)
 
-    # Read columns & remove last line of header
-    columns = header[-1]
-    header = header[:-1]           
+    Input params:
+        - P: pressure (or depth) vector of the cast (n_samples)
+        - X: channels to bin, shape (n_vars, n_samples) (a 1D vector is accepted)
+        - Pbin: binned pressure vector
 
-    # clean columns
-    columns = re.sub('\n','', columns)
-    columns = columns.strip()
-    columns = re.sub(' +',' ', columns)
+    Returns a (n_vars, len(Pbin)) array. As with np.digitize, bin i holds samples with
+    Pbin[i-1] <= P < Pbin[i] and only the downcast (up to max pressure) is used.
+    NaN samples are skipped (same as pandas mean) and bins without finite samples are NaN.
+
+    """
+    P = np.asarray(P, dtype=float)
+    X = np.atleast_2d(np.asarray(X, dtype=float))
+    nvar = X.shape[0]
+    nbin = len(Pbin)
+
+    Ibtm = np.argmax(P)
+    digitized = np.digitize(P[0:Ibtm], Pbin)
+    idx_keep = digitized < nbin # samples deeper than last bin are dropped
+    digitized = digitized[idx_keep]
+    X = X[:, 0:Ibtm][:, idx_keep]
 
-    # to dataFrame       
-    df = pd.DataFrame(data, columns=columns.split(' '), dtype=float)
+    # One bincount for all channels (channel k uses bins k*nbin to (k+1)*nbin-1),
+    # only finite samples are summed and counted
+    idx_flat = (digitized[np.newaxis,:] + nbin*np.arange(nvar)[:,np.newaxis]).ravel()
+    finite = np.isfinite(X)
+    sums = np.bincount(idx_flat, weights=np.where(finite, X, 0).ravel(), minlength=nvar*nbin).reshape(nvar, nbin)
+    counts = np.bincount(idx_flat, weights=finite.ravel().astype(float), minlength=nvar*nbin).reshape(nvar, nbin)
+    counts[counts==0] = np.nan
 
-    return df
+    return sums/counts
 
 def bin_pressure_from_dataframe(df, Pbin, var):
     """Extract variable 'var' from dataframe generated by pfile_to_dataframe and digitize it to Pbin
 
   """
-    P = np.array(df['pres'])
-    Ibtm = np.argmax(P)
-    digitized = np.digitize(P[0:Ibtm], Pbin) 
-        
-    if var in df.columns: # This if part should be put in a function.
-        X = df[var]
-        X = np.array([X[0:Ibtm][digitized == i].mean() for i in range(0, len(Pbin))])
-        X = X.reshape(1, len(X)) # row shape for appending in netCDF
+    if var in df.columns:
+        X = bin_pressure(df['pres'].values, df[var].values, Pbin) # row shape for appending in netCDF
     else:
         X = Pbin*np.nan
         X = X.reshape(1, len(X))
 
     return X
 
-def pfiles_to_netcdf(infiles, nc_outfile, zbin=1, zmax=1500, zshrink=False): # pfiles_to_pannel
-    """Given a list of pfiles stored in 'infiles', create a netCDF files with attributes
+def pfile_to_cast(fname, Pbin, variables=None):
+    """Read, check and bin a single pfile (used by pfiles_to_netcdf)
+
+    'variables' is the list of channels to bin (keys of pfiles_basics.channels(), all by default)
+
+    Returns (cast, log, fingerprint) where:
+        - cast: None if the file is skipped, else (cast_info, cast_time, X) with
+          X the (len(variables), len(Pbin)) binned channels
+        - log: list of QC events found with the file (see qc_event)
+        - fingerprint: [size, mtime, md5] of the file (see pfile_fingerprint, None if not found)
+
+    This function has no side effects so it can be run in a pool of workers.
+
+    """
+    log = []
+
+    # check if file's there
+    if os.path.isfile(fname) is False:
+        log.append(qc_event('not_found', 'not found! [skip]'))
+        return None, log, None
+
+    # read file once (header and data)
+    pfile = read_pfile(fname)
+    fingerprint = pfile_fingerprint(fname, pfile['text'])
+    header = pfile['header']
+    #check header
+    if 'NAFC_Y2K_HEADER' not in header[0]:
+        log.append(qc_event('bad_header', 'Problem with file: header [skip]', header[0].strip()))
+        return None, log, fingerprint
+
+    #get cast info and store the info (inspired from J Holden's pfile_IO.py
+    cast_info = header[1]
+    cast_info = cast_info.replace(',',' ')
+    cast_id = cast_info[0:8]
+
+    # Coordinate check
+    cast_lat = np.float(cast_info[10:12]) + np.float(cast_info[13:18])/60.0
+    cast_lon = np.sign(np.float(cast_info[19:23])) * (np.abs(np.float(cast_info[19:23])) + np.float(cast_info[24:29])/60.0)
+    if ((np.int(cast_lon)==0) & (np.int(cast_lat)==0)):
+        log.append(qc_event('zero_latlon', 'Problem with file: (lat,lon) = (0,0) looks wrong [skip]', cast_info[10:29]))
+        return None, log, fingerprint
+    elif ((np.int(cast_lat)>90) | (np.int(cast_lat)<-90)):
+        log.append(qc_event('bad_lat', 'Problem with file: |lat| > 90 looks wrong [skip]', cast_info[10:29]))
+        return None, log, fingerprint
+    elif ((np.int(cast_lon)>180) | (np.int(cast_lon)<-180)):
+        log.append(qc_event('bad_lon', 'Problem with file: |lon| > 180 looks wrong [skip]', cast_info[10:29]))
+        return None, log, fingerprint
+
+    # time check
+    cast_info, event = check_cast_time(cast_info)
+    if event is not None:
+        log.append(event)
+        if event['skip']:
+            return None, log, fingerprint
+
+    # if tests passed, store the rest
+    cast_time = pd.Timestamp(cast_info[29:40] + ' ' + cast_info[40:46])
+    cast_sounder = np.int(cast_info[46:51])
+    cast_instid = cast_info[51:57]
+    cast_instid = cast_instid.replace(' ','')
+    cast_set = cast_info[57:61] # unused
+    cast_set = cast_set.replace(' ','')
+    cast_insttype = cast_info[62]
+    cast_insttype = cast_insttype.replace(' ','')
+    cast_comment = cast_info[64:78]
+    cast_comment = cast_comment.replace(' ','')
+
+    if 'S' in cast_insttype:
+        cast_insttype = "V"
+    elif 'XBT' in cast_insttype:
+        cast_insttype = "F"
+    elif 'CTD' in cast_insttype:
+        cast_insttype = "V"
+
+    # To DataFrame (and check if empty)
+    df = pfile_data(pfile)
+    if df.empty:
+        log.append(qc_event('empty', 'Problem with file: empty [skip]'))
+        return None, log, fingerprint
+
+    # Pressure
+    if 'pres' in df.columns:
+        P = np.array(df['pres'])
+    elif 'depth' in df.columns:
+        P = np.array(df['depth'])
+    else:
+        log.append(qc_event('no_pressure', 'Problem with file, no pressure channel found [skip]', ' '.join(df.columns)))
+        return None, log, fingerprint
+
+    # Bin all channels at once (missing channels are NaN)
+    if variables is None:
+        variables = list(pfiles_basics.channels().keys())
+    X = bin_pressure(P, df.reindex(columns=variables).values.T, Pbin)
+
+    cast_info_row = [cast_id, cast_lat, cast_lon, cast_sounder, cast_insttype, cast_instid, cast_comment]
+
+    return (cast_info_row, cast_time, X), log, fingerprint
+
+
+def qc_event(code, message, value=''):
+    """Returns a QC event (dict) as stored in the logs of pfile_to_cast
 
     Input params:
-        - infiles: list of files (e.g. '2017pfiles.list')
-          * '$ ls *.p2017 > 2017pfiles.list' would generate the appropriate file list in Linux
-        - outfile: output file (e.g. 'AZMP2017.nc')
-        - zbin: vertical averaging in final file (zbin=1 is default)
-        - zmax: maximum possible depth of the final product (maximum depth may be smaller if zshrink=True, see below)
-        - zshrink: if 'True', vertical dimension 'Z' will  be shrink to the first non-empty value (Default is 'False') 
-          *NOTE: To open multiple nc files with xarray, Z dim must be the same!
+        - code: reason code (e.g. 'bad_header', 'bad_minute', 'duplicated_time')
+        - message: message printed on screen
+        - value: field value(s) that triggered the event (as written in the file)
+
+    The cast is rejected if the message ends with '[skip]' (event['skip'] is True).
 
     """
-    
-    # Check if outfile already exist
-    if os.path.exists(nc_outfile):
+    return {'code' : code, 'message' : message, 'value' : value.strip(), 'skip' : message.endswith('[skip]')}
 
-        print nc_outfile + ' already exists!' 
 
-        py3 = version_info[0] > 2 #creates boolean value for test that Python major version > 2
+def write_qc_log(qc_file, events, append=False):
+    """Write QC events (see qc_event) to a csv file (columns: file, code, skip, value, message)
 
-        response_isnt_good = True
-        while response_isnt_good:
-            if py3:
-                response = input(" -> Do you want to remove it? (yes/no?): ")
-            else:
-                response = raw_input(" -> Do you want to remove it? (yes/no?): ")
+    If append=True, events are added to an existing file.
 
-            if response == 'yes':
-                os.remove(nc_outfile)
-                print ' -> ' + nc_outfile + ' removed!' 
-                response_isnt_good = False
-            elif response == 'no':
-                print ' -> Nothing to be done then (an error will be raised)'
-                break
-            else:
-                print ' -> Please answer "yes" or "no"'
+    """
+    qc_log = pd.DataFrame(events, columns=['file', 'code', 'skip', 'value', 'message'])
+    if append and os.path.isfile(qc_file):
+        qc_log.to_csv(qc_file, mode='a', header=False, index=False)
+    else:
+        qc_log.to_csv(qc_file, index=False)
 
-    # Generate the list
-    filelist = np.genfromtxt(infiles, dtype=str)
-    filelist = np.reshape(filelist, filelist.size) # <--------- check if this doesn't cause error
-    
-    # Original binned depth vector
-    Pbin = np.arange(zbin/2.0, zmax, zbin) #will be shrink after if zshrink=True
 
-    
-    ##### ------- Loop and store in lists ------- #####
-    # Initialize lists
-    cast_info_list = []
-    cast_index = []
-    Tlist = []
-    Slist = []
-    Clist = []
-    SIGlist = []
-    Flist = []
-    O2list = []
-    PHlist = []
-    PARlist = []
+def qc_summary(events):
+    """Summary table of QC events: number of events and of files per reason code
 
-    for fname in filelist:
+    """
+    qc_log = pd.DataFrame(events, columns=['file', 'code', 'skip', 'value', 'message'])
+    grouped = qc_log.groupby('code')
+    summary = pd.DataFrame({'events' : grouped['file'].size(),
+                            'files' : grouped['file'].nunique(),
+                            'skip' : grouped['skip'].max().astype(bool)}, columns=['events', 'files', 'skip'])
 
-        # check if file's there
-        if os.path.isfile(fname) is False:
-            print ' ->' + fname + ' not found! [skip]'
-            continue
-        
-        # Else, do normal    
-        print fname
+    return summary
 
-        # get header
-        header = pfile_header(fname)
-        #check header
-        if 'NAFC_Y2K_HEADER' not in header[0]:
-            error_msg = 'Problem with file: header [skip]'
-            print error_msg
-            expr = 'echo ' + fname + ' : ' + error_msg +' >> .netcdfgen_log.txt'
-            os.system(expr)
-            continue 
-        
-        #get cast info and store the info (inspired from J Holden's pfile_IO.py
-        cast_info = header[1]
-        cast_info = cast_info.replace(',',' ')
-        cast_id = cast_info[0:8]
-
-        # Coordinate check
-        cast_lat = np.float(cast_info[10:12]) + np.float(cast_info[13:18])/60.0
-        cast_lon = np.sign(np.float(cast_info[19:23])) * (np.abs(np.float(cast_info[19:23])) + np.float(cast_info[24:29])/60.0)
-        if ((np.int(cast_lon)==0) & (np.int(cast_lat)==0)):
-            error_msg = 'Problem with file: (lat,lon) = (0,0) looks wrong [skip]'
-            print error_msg
-            expr = 'echo ' + fname + ' : ' + error_msg +' >> .netcdfgen_log.txt'
-            os.system(expr)
-            continue
-        elif ((np.int(cast_lat)>90) | (np.int(cast_lat)<-90)):
-            error_msg = 'Problem with file: |lat| > 90 looks wrong [skip]'
-            print error_msg
-            expr = 'echo ' + fname + ' : ' + error_msg +' >> .netcdfgen_log.txt'
-            os.system(expr)
-            continue
-        elif ((np.int(cast_lon)>180) | (np.int(cast_lon)<-180)):
-            error_msg = 'Problem with file: |lon| > 180 looks wrong [skip]'
-            print error_msg
-            expr = 'echo ' + fname + ' : ' + error_msg +' >> .netcdfgen_log.txt'
-            os.system(expr)
-            continue
-        
-    
-        ## if '24:00' in cast_info: #correct 24:00 time
-        ##     cast_info = cast_info.replace('24:00', '00:00')
-        ##     expr = 'echo ' + fname + ' : time problem >> .netcdfgen_log.txt'
-        ##     os.system(expr)
-        ## elif '25:' in cast_info: #correct 25:00 time
-        ##     cast_info = cast_info.replace('25:', '23:')
-        ##     expr = 'echo ' + fname + ' : time problem >> .netcdfgen_log.txt'
-        ##     os.system(expr)
-
-        # time check
-        if np.int(cast_info[44:46])>59:
-            tmp = list(cast_info)
-            tmp[44:46]=['0','0']
-            #cast_info = cast_info.replace(cast_info[44:46], '00')
-            cast_info = "".join(tmp)
-            expr = 'echo ' + fname + ' : time problem >> .netcdfgen_log.txt'
-            os.system(expr)
-        elif np.int(cast_info[41:43])>23:
-            tmp = list(cast_info)
-            tmp[41:43]=['0','0']
-            cast_info = "".join(tmp)
-            #cast_info = cast_info.replace(cast_info[41:43], '00')
-            expr = 'echo ' + fname + ' : time problem >> .netcdfgen_log.txt'
-            os.system(expr)
-        elif ((np.int(cast_info[35:37])>12) | (np.int(cast_info[38:40])>31)):
-            error_msg = 'Problem with file: wrong date [skip]'
-            print error_msg
-            expr = 'echo ' + fname + ' : ' + error_msg +' >> .netcdfgen_log.txt'
-            os.system(expr)
-            continue
-        
-        # if tests passed, store the rest    
-        cast_time = pd.Timestamp(cast_info[29:40] + ' ' + cast_info[40:46])
-        cast_sounder = np.int(cast_info[46:51])
-        cast_instid = cast_info[51:57]
-        cast_instid = cast_instid.replace(' ','')
-        cast_set = cast_info[57:61] # unused
-        cast_set = cast_set.replace(' ','')
-        cast_insttype = cast_info[62]
-        cast_insttype = cast_insttype.replace(' ','')
-        cast_comment = cast_info[64:78]
-        cast_comment = cast_comment.replace(' ','')
-
-        if 'S' in cast_insttype:
-            cast_insttype = "V"
-        elif 'XBT' in cast_insttype:
-            cast_insttype = "F"
-        elif 'CTD' in cast_insttype:
-            cast_insttype = "V" 
-        
-        # To DataFrame (and check if empty)
-        df = pfile_to_dataframe(fname)
-        if df.empty:
-            error_msg = 'Problem with file: empty [skip]'
-            print error_msg
-            expr = 'echo ' + fname + ' : ' + error_msg +' >> .netcdfgen_log.txt'
-            os.system(expr)
-            continue    
-        
-        ## ----- Fill wanted variables one by one ----- ##
-        # deal with duplicated time (add one sec.)
-        if cast_time in cast_index:
-            cast_time = cast_time + + pd.Timedelta(seconds=1)
-       
-        # Pressure
-        if 'pres' in df.columns:
-            P = np.array(df['pres'])            
-            Ibtm = np.argmax(P)    
-            digitized = np.digitize(P[0:Ibtm], Pbin) #<- this is awesome!
-        elif 'depth' in df.columns:
-            P = np.array(df['depth'])
-            Ibtm = np.argmax(P)    
-            digitized = np.digitize(P[0:Ibtm], Pbin) #<- this is awesome!
-        else:
-            error_msg = 'Problem with file, no pressure channel found [skip]'
-            print error_msg
-            expr = 'echo ' + fname + ' : ' + error_msg +' >> .netcdfgen_log.txt'
-            os.system(expr)
-            continue
-            
-        # Meta Data        
-        cast_info_list.append([cast_id, cast_lat, cast_lon, cast_sounder, cast_insttype, cast_instid, cast_comment])
-        cast_index.append(cast_time)
 
-        
-        # Temperature
-        if 'temp' in df.columns:
-            X = np.array(df['temp'])
-            Tlist.append([X[0:Ibtm][digitized == i].mean() for i in range(0, len(Pbin))])
-        else:
-            Tlist.append(list(Pbin*np.nan))
+def pfile_fingerprint(fname, text):
+    """Returns [size, mtime, md5] of a pfile, md5 being computed from its content 'text'
+    as returned by read_pfile (the file is not read again)
 
-        # Salinity
-        if 'sal' in df.columns:
-            X = np.array(df['sal'])
-            Slist.append([X[0:Ibtm][digitized == i].mean() for i in range(0, len(Pbin))])
-        else:
-            Slist.append(list(Pbin*np.nan))
+    """
+    stat = os.stat(fname)
+    if isinstance(text, bytes) is False:
+        text = text.encode()
 
-        # Conductivity
-        if 'cond' in df.columns:
-            X = np.array(df['cond'])
-            Clist.append([X[0:Ibtm][digitized == i].mean() for i in range(0, len(Pbin))])
-        else:
-            Clist.append(list(Pbin*np.nan))
+    return [stat.st_size, stat.st_mtime, hashlib.md5(text).hexdigest()]
 
-        # Sigma-t
-        if 'sigt' in df.columns:
-            X = np.array(df['sigt'])
-            SIGlist.append([X[0:Ibtm][digitized == i].mean() for i in range(0, len(Pbin))])
-        else:
-            SIGlist.append(list(Pbin*np.nan))
 
-        # Fluorescence
-        if 'flor' in df.columns:
-            X = np.array(df['flor'])
-            Flist.append([X[0:Ibtm][digitized == i].mean() for i in range(0, len(Pbin))])
-        else:
-            Flist.append(list(Pbin*np.nan))
+def process_pfile(fname, Pbin, variables=None):
+    """Returns (fname, fingerprint, cast, log) for a single pfile (see pfile_to_cast)
 
-        # Oxygen
-        if 'oxy' in df.columns:
-            X = np.array(df['oxy'])
-            O2list.append([X[0:Ibtm][digitized == i].mean() for i in range(0, len(Pbin))])
-        else:
-            O2list.append(list(Pbin*np.nan))
+    """
+    cast, log, fingerprint = pfile_to_cast(fname, Pbin, variables)
+    return fname, fingerprint, cast, log
 
-        # PAR
-        if 'par' in df.columns:
-            X = np.array(df['par'])
-            PARlist.append([X[0:Ibtm][digitized == i].mean() for i in range(0, len(Pbin))])
-        else:
-            PARlist.append(list(Pbin*np.nan))
 
-        # PH
-        if 'ph' in df.columns:
-            X = np.array(df['ph'])
-            PHlist.append([X[0:Ibtm][digitized == i].mean() for i in range(0, len(Pbin))])
-        else:
-            PHlist.append(list(Pbin*np.nan))
-    #### -------------------------------------------------------- ####
+def process_pfiles(filelist, Pbin, workers=1, variables=None, qc_log=None):
+    """Generator of process_pfile() results, in the order of filelist
 
+    If workers > 1, pfiles are processed by a pool of processes (imap keeps the order).
+    Messages returned by pfile_to_cast are printed and, if a list is given in 'qc_log',
+    the QC events are appended to it (with their 'file'). The pool is terminated if an error
+    occurs or if the generator is closed before the end.
 
-    # List to array (for easier manipulation in next step)
-    Tarray = np.array(Tlist)
-    Sarray = np.array(Slist)
-    Carray = np.array(Clist)
-    SIGarray = np.array(SIGlist)
-    Farray = np.array(Flist)
-    O2array = np.array(O2list)
-    PHarray = np.array(PHlist)
-    PARarray = np.array(PARlist)
+    """
+    if workers > 1:
+        pool = multiprocessing.Pool(workers)
+        results = pool.imap(functools.partial(process_pfile, Pbin=Pbin, variables=variables), filelist, chunksize=16)
+    else:
+        pool = None
+        results = (process_pfile(fname, Pbin, variables) for fname in filelist)
+
+    done = False
+    try:
+        for fname, fingerprint, cast, log in results:
+            print fname
+            for event in log:
+                print ' -> ' + event['message']
+                if qc_log is not None:
+                    event['file'] = fname
+                    qc_log.append(event)
+
+            yield fname, fingerprint, cast, log
+        done = True
+    finally:
+        # workers are killed on error or if the consumer stops early
+        if pool is not None:
+            if done:
+                pool.close()
+            else:
+                pool.terminate()
+            pool.join()
 
-    # Resize Lists to unused maximum depth encountered (a bit weak the way I do it)
-    if zshrink:
-        idx_nan = np.squeeze(np.where(np.isnan(np.nanmean(Tarray, axis=0))==True))
-        Tarray = Tarray[:,0:idx_nan[0]-1]
-        Sarray = Sarray[:,0:idx_nan[0]-1]
-        Carray = Carray[:,0:idx_nan[0]-1]
-        SIGarray = SIGarray[:,0:idx_nan[0]-1]
-        Farray = Farray[:,0:idx_nan[0]-1]
-        O2array = O2array[:,0:idx_nan[0]-1]
-        PHarray = PHarray[:,0:idx_nan[0]-1]
-        PARarray = PARarray[:,0:idx_nan[0]-1]
-        Pbin = Pbin[0:idx_nan[0]-1]
-
-    # Dataframe content
-    columns = ['cast_id', 'lat', 'lon', 'sounder_depth', 'instrument_type', 'instrument_id', 'cast_comment']
-    df_info = pd.DataFrame(cast_info_list, index=cast_index, columns=columns)
-    df_temp = pd.DataFrame(Tarray, index=cast_index, columns=Pbin)
-    df_sali = pd.DataFrame(Sarray, index=cast_index, columns=Pbin)
-    df_cond = pd.DataFrame(Carray, index=cast_index, columns=Pbin)
-    df_sigt = pd.DataFrame(SIGarray, index=cast_index, columns=Pbin)
-    df_fluo = pd.DataFrame(Farray, index=cast_index, columns=Pbin)
-    df_oxyg = pd.DataFrame(O2array, index=cast_index, columns=Pbin)
-    df_parr = pd.DataFrame(PARarray, index=cast_index, columns=Pbin)
-    df_ph = pd.DataFrame(PHarray, index=cast_index, columns=Pbin)
 
+def create_netcdf(nc_outfile, Pbin, variables=None):
+    """Create an empty AZMP netCDF file (unlimited time dimension, levels=Pbin) and returns it opened
 
-    #### ------ Building netCDF file (inspired from MEOPAR & NCAR examples) ------ #####
+    2D variables are created from pfiles_basics.channels() for the channels listed in 'variables' (all by default)
 
+    """
     # File name + global attributes
     nc_out = nc.Dataset(nc_outfile, 'w')
 
@@ -439,7 +495,7 @@ def pfiles_to_netcdf(infiles, nc_outfile, zbin=1, zmax=1500, zshrink=False): # p
 
     # Create dimensions
     time = nc_out.createDimension('time', None)
-    level = nc_out.createDimension('level', len(df_temp.columns))
+    level = nc_out.createDimension('level', len(Pbin))
 
     # Create coordinate variables
     times = nc_out.createVariable('time', np.float64, ('time',))
@@ -455,16 +511,6 @@ def pfiles_to_netcdf(infiles, nc_outfile, zbin=1, zmax=1500, zshrink=False): # p
     instrument_IDs = nc_out.createVariable('instrument_ID', str, ('time'), zlib=True)
     sounder_depths = nc_out.createVariable('sounder_depth', np.float32, ('time'), zlib=True)
 
-    # Create 2D variables
-    temp = nc_out.createVariable('temperature', np.float32, ('time', 'level'), zlib=True, fill_value=-9999)
-    sal = nc_out.createVariable('salinity', np.float32, ('time', 'level'), zlib=True, fill_value=-9999)
-    cond = nc_out.createVariable('conductivity', np.float32, ('time', 'level'), zlib=True, fill_value=-9999)
-    sigt = nc_out.createVariable('sigma-t', np.float32, ('time', 'level'), zlib=True, fill_value=-9999)
-    o2 = nc_out.createVariable('oxygen', np.float32, ('time', 'level'), zlib=True, fill_value=-9999)
-    fluo = nc_out.createVariable('fluorescence', np.float32, ('time', 'level'), zlib=True, fill_value=-9999)
-    par = nc_out.createVariable('irradiance', np.float32, ('time', 'level'), zlib=True, fill_value=-9999)
-    ph = nc_out.createVariable('ph', np.float32, ('time', 'level'), zlib=True, fill_value=-9999)
-
     # Variable Attributes
     latitudes.units = 'degree_north'
     longitudes.units = 'degree_east'
@@ -474,68 +520,392 @@ def pfiles_to_netcdf(infiles, nc_outfile, zbin=1, zmax=1500, zshrink=False): # p
     levels.standard_name = "pressure"
     #levels.valid_range = np.array((0.0, 5000.0))
     levels.valid_min = 0
-    temp.units = 'Celsius'
-    temp.long_name = "Water Temperature" # (may be use to label plots)
-    temp.standard_name = "sea_water_temperature"
-    sal.long_name = "Practical Salinity"
-    sal.standard_name = "sea_water_salinity"
-    sal.units = "1"
-    sal.valid_min = 0
-    sigt.standard_name = "sigma_t"
-    sigt.long_name = "Sigma-t"
-    sigt.units = "Kg m-3"
-    o2.long_name = "Dissolved Oxygen Concentration" ;
-    o2.standard_name = "oxygen_concentration" ;
-    o2.units = "mg L-1" ;
-    cond.long_name = "Water Conductivity" ;
-    cond.standard_name = "sea_water_conductivity" ;
-    cond.units = "S m-1" ;
-    fluo.long_name = "Chl-a Fluorescence" ;
-    fluo.standard_name = "concentration_of_chlorophyll_in_sea_water" ;
-    fluo.units = "mg m-3" ;
-    par.long_name = "Irradiance" ;
-    par.standard_name = "irradiance" ;
-    par.units = "umol photons m-2 s-1" ;
-    ph.long_name = "water PH" ;
-    ph.standard_name = "PH" ;
-    ph.units = "unitless" ;
-
-    # Fill structure
-    #print 'temp shape before adding data = ', temp.shape
-    latitudes[:] = np.array(df_info.lat)
-    longitudes[:] = np.array(df_info.lon)
-    cast_IDs[:] = np.array(df_info.cast_id)
-    comments[:] = np.array(df_info.cast_comment)
-    instrument_types[:] = np.array(df_info.instrument_type)
-    instrument_IDs[:] = np.array(df_info.instrument_id)
-    sounder_depths[:] = np.array(df_info.sounder_depth)
-
-    temp[:,:] = df_temp.values
-    sal[:,:] = df_sali.values
-    cond[:,:] = df_cond.values
-    sigt[:,:] = df_sigt.values
-    o2[:,:] = df_oxyg.values
-    fluo[:,:] = df_fluo.values
-    par[:,:] = df_parr.values
-    ph[:,:] = df_ph.values
-
-    # Fill time
-    times[:] = nc.date2num(cast_index, units = times.units, calendar = times.calendar)
+
+    # Create 2D variables
+    channels = pfiles_basics.channels()
+    if variables is None:
+        variables = list(channels.keys())
+    for key in variables:
+        channel = channels[key]
+        var = nc_out.createVariable(channel['name'], channel['dtype'], ('time', 'level'), zlib=True, fill_value=channel['fill_value'])
+        for attr, value in channel['attributes'].items():
+            setattr(var, attr, value)
+
     levels[:] = Pbin
+
+    return nc_out
+
+
+def write_casts(nc_out, idx, cast_info, cast_time, X, variables=None):
+    """Write casts (as returned by pfile_to_cast) from index 'idx' of the time dimension
+
+    Input params:
+        - nc_out: netCDF file created by create_netcdf
+        - idx: index of the first cast along the time dimension
+        - cast_info, cast_time: lists of cast infos and times (n_casts)
+        - X: binned variables, shape (n_casts, len(variables), n_levels)
+        - variables: channels in X (keys of pfiles_basics.channels(), all by default)
+
+    """
+    v = nc_out.variables
+    I = slice(idx, idx + len(cast_time))
+    cast_id, lat, lon, sounder, insttype, instid, comment = [np.array(x, dtype=object) for x in zip(*cast_info)]
+    v['time'][I] = nc.date2num(cast_time, units = v['time'].units, calendar = v['time'].calendar)
+    v['latitude'][I] = lat.astype(float)
+    v['longitude'][I] = lon.astype(float)
+    v['trip_ID'][I] = cast_id
+    v['comments'][I] = comment
+    v['instrument_type'][I] = insttype
+    v['instrument_ID'][I] = instid
+    v['sounder_depth'][I] = sounder.astype(float)
+
+    channels = pfiles_basics.channels()
+    if variables is None:
+        variables = list(channels.keys())
+    for k, key in enumerate(variables):
+        v[channels[key]['name']][I,:] = X[:,k,:]
+
+
+def blank_cast(nc_out, idx, variables=None):
+    """Blank the cast at index 'idx' of the time dimension (e.g. file now rejected)
+
+    Time is kept (coordinate), channels are set to their fill value, position and
+    sounder depth to NaN, IDs to '' and comments to 'REJECTED'.
+
+    """
+    v = nc_out.variables
+    v['latitude'][idx] = np.nan
+    v['longitude'][idx] = np.nan
+    v['sounder_depth'][idx] = np.nan
+    v['trip_ID'][idx] = ''
+    v['comments'][idx] = 'REJECTED'
+    v['instrument_type'][idx] = ''
+    v['instrument_ID'][idx] = ''
+
+    channels = pfiles_basics.channels()
+    if variables is None:
+        variables = list(channels.keys())
+    for key in variables:
+        v[channels[key]['name']][idx,:] = np.ma.masked
+
+
+def pfiles_to_netcdf(infiles, nc_outfile, zbin=1, zmax=1500, zshrink=False, workers=1, incremental=False, chunksize=500, variables=None): # pfiles_to_pannel
+    """Given a list of pfiles stored in 'infiles', create a netCDF files with attributes
+
+    Input params:
+        - infiles: list of files (e.g. '2017pfiles.list')
+          * '$ ls *.p2017 > 2017pfiles.list' would generate the appropriate file list in Linux
+        - outfile: output file (e.g. 'AZMP2017.nc')
+        - zbin: vertical averaging in final file (zbin=1 is default)
+        - zmax: maximum possible depth of the final product (maximum depth may be smaller if zshrink=True, see below)
+        - zshrink: if 'True', vertical dimension 'Z' will  be shrink to the first non-empty value (Default is 'False') 
+          (based on the first channel of 'variables', i.e. temperature by default)
+          *NOTE: To open multiple nc files with xarray, Z dim must be the same!
+        - workers: number of processes used to read and bin the pfiles (Default is 1, no pool).
+          Casts are merged in the list order, so the output is the same as with workers=1.
+        - incremental: if 'True' and 'nc_outfile' exists, only new or modified pfiles are processed
+          and added to it (see pfiles_to_netcdf_incremental). No question is asked.
+          *NOTE: a manifest ('AZMP2017_manifest.csv') is saved alongside the netCDF file for this.
+        - chunksize: casts are written to the netCDF file by chunks of 'chunksize' (Default is 500),
+          so memory use does not depend on the number of casts in the list.
+        - variables: list of pfile channels to export (keys of pfiles_basics.channels(), e.g. ['temp', 'sal']).
+          All channels are exported by default. Channels not listed are not binned nor written.
+
+    QC events (rejected files, time fixes, etc.) are saved in 'AZMP2017_qclog.csv' (see write_qc_log).
+    Returns the summary table of QC events (see qc_summary).
+
+    """
+    # Channels to export
+    channels = pfiles_basics.channels()
+    if variables is None:
+        variables = list(channels.keys())
+    for key in variables:
+        if key not in channels:
+            print ' -> ' + key + ' is not in pfiles_basics.channels() [ignored]'
+    variables = [key for key in variables if key in channels]
+
+    manifest_file = os.path.splitext(nc_outfile)[0] + '_manifest.csv'
+    qc_file = os.path.splitext(nc_outfile)[0] + '_qclog.csv'
+
+    # Incremental update of an existing file
+    if incremental and os.path.exists(nc_outfile) and os.path.exists(manifest_file):
+        if zshrink:
+            print ' -> zshrink is ignored in incremental mode'
+        return pfiles_to_netcdf_incremental(infiles, nc_outfile, zbin=zbin, zmax=zmax, workers=workers, variables=variables)
+    elif incremental and os.path.exists(nc_outfile):
+        print nc_outfile + ' has no manifest, full rebuild'
+        os.remove(nc_outfile)
+
+    # Check if outfile already exist
+    if os.path.exists(nc_outfile):
+
+        print nc_outfile + ' already exists!' 
+
+        py3 = version_info[0] > 2 #creates boolean value for test that Python major version > 2
+
+        response_isnt_good = True
+        while response_isnt_good:
+            if py3:
+                response = input(" -> Do you want to remove it? (yes/no?): ")
+            else:
+                response = raw_input(" -> Do you want to remove it? (yes/no?): ")
+
+            if response == 'yes':
+                os.remove(nc_outfile)
+                print ' -> ' + nc_outfile + ' removed!' 
+                response_isnt_good = False
+            elif response == 'no':
+                print ' -> Nothing to be done then (an error will be raised)'
+                break
+            else:
+                print ' -> Please answer "yes" or "no"'
+
+    # Generate the list
+    filelist = np.genfromtxt(infiles, dtype=str)
+    filelist = np.reshape(filelist, filelist.size) # <--------- check if this doesn't cause error
+    
+    # Original binned depth vector
+    Pbin = np.arange(zbin/2.0, zmax, zbin) #will be shrink after if zshrink=True
+
+    
+    ##### ------- Loop and write casts by chunks ------- #####
+    #### ------ Building netCDF file (inspired from MEOPAR & NCAR examples) ------ #####
+    nc_out = create_netcdf(nc_outfile, Pbin, variables)
+
+    # Chunk buffers (preallocated, memory does not depend on the number of casts)
+    X_buffer = np.full((chunksize, len(variables), Pbin.size), np.nan, dtype=np.float32)
+    info_buffer = []
+    time_buffer = []
+    ntimes = 0
+    level_has_data = np.zeros(Pbin.size, dtype=bool) # for zshrink
+    manifest = [] # for incremental updates
+    qc_log = []
+
+    # Read, check and bin casts (in parallel if workers > 1), merged in the list order
+    cast_times = set()
+    for fname, fingerprint, cast, log in process_pfiles(filelist, Pbin, workers, variables, qc_log):
+
+        if cast is None:
+            if fingerprint is not None:
+                manifest.append([fname] + fingerprint + ['', -1])
+            continue
+        cast_info, cast_time, X = cast
+
+        # deal with duplicated time (add one sec.)
+        if cast_time in cast_times:
+            event = qc_event('duplicated_time', 'duplicated time (+1 sec.)', str(cast_time))
+            event['file'] = fname
+            qc_log.append(event)
+            cast_time = cast_time + pd.Timedelta(seconds=1)
+        cast_times.add(cast_time)
+
+        # Store in buffer
+        manifest.append([fname] + fingerprint + [cast_info[0], ntimes + len(info_buffer)])
+        X_buffer[len(info_buffer)] = X
+        info_buffer.append(cast_info)
+        time_buffer.append(cast_time)
+        level_has_data |= ~np.isnan(X[0,:])
+
+        # Flush buffer
+        if len(info_buffer) == chunksize:
+            write_casts(nc_out, ntimes, info_buffer, time_buffer, X_buffer, variables)
+            ntimes += len(info_buffer)
+            info_buffer = []
+            time_buffer = []
+
+    if len(info_buffer):
+        write_casts(nc_out, ntimes, info_buffer, time_buffer, X_buffer[0:len(info_buffer)], variables)
+        ntimes += len(info_buffer)
+    nc_out.close()
     #### -------------------------------------------------------- ####
+
+    # Resize to unused maximum depth encountered (a bit weak the way I do it)
+    if zshrink:
+        idx_nan = np.where(~level_has_data)[0]
+        if idx_nan.size:
+            shrink_netcdf(nc_outfile, idx_nan[0]-1, chunksize, variables)
+
     print 'Done!'
 
+    # Manifest for later incremental updates
+    columns = ['path', 'size', 'mtime', 'md5', 'cast_id', 'slot']
+    manifest = pd.DataFrame(manifest, columns=columns).set_index('path')
+    write_manifest(manifest_file, manifest)
+    write_qc_log(qc_file, qc_log)
+
+    return qc_summary(qc_log)
+
+
+def shrink_netcdf(nc_file, nlevels, chunksize=500, variables=None):
+    """Keep only the first 'nlevels' levels of a netCDF file created by pfiles_to_netcdf
+
+    The file is copied by chunks of 'chunksize' casts and replaced.
+    'variables' are the channels present in the file (all by default, see create_netcdf)
+
+    """
+    tmp_file = nc_file + '.tmp'
+    nc_in = nc.Dataset(nc_file, 'r')
+    nc_in.set_auto_mask(False)
+    v = nc_in.variables
+    nc_out = create_netcdf(tmp_file, v['level'][0:nlevels], variables)
+
+    ntimes = len(nc_in.dimensions['time'])
+    names = [name for name in v if v[name].dimensions == ('time', 'level')]
+    for idx in range(0, ntimes, chunksize):
+        I = slice(idx, np.min([idx+chunksize, ntimes]))
+        for name in ['time', 'latitude', 'longitude', 'trip_ID', 'comments', 'instrument_type', 'instrument_ID', 'sounder_depth']:
+            nc_out.variables[name][I] = v[name][I]
+        for name in names:
+            nc_out.variables[name][I,:] = v[name][I,0:nlevels]
+
+    nc_in.close()
     nc_out.close()
-    return None
+    os.rename(tmp_file, nc_file)
+
+
+def pfiles_to_netcdf_incremental(infiles, nc_outfile, zbin=1, zmax=1500, workers=1, variables=None):
+    """Update an existing netCDF file (created by pfiles_to_netcdf) with new or modified pfiles only
+
+    Each pfile of 'infiles' is compared with the manifest (size, mtime, md5, cast_id, slot) stored
+    alongside the netCDF file. Only new or modified files are processed: modified casts replace
+    their row (slot) along the time dimension, new casts are appended. A cast that is now rejected
+    has its row blanked (see blank_cast) and its slot set to -1 in the manifest.
+    (should normally be called via pfiles_to_netcdf(..., incremental=True))
+
+    'variables' must be the channels the file was created with (all by default).
+
+    """
+    manifest_file = os.path.splitext(nc_outfile)[0] + '_manifest.csv'
+    qc_file = os.path.splitext(nc_outfile)[0] + '_qclog.csv'
+    manifest = read_manifest(manifest_file)
+
+    # Check that the vertical dimension is unchanged
+    Pbin = np.arange(zbin/2.0, zmax, zbin)
+    nc_out = nc.Dataset(nc_outfile, 'a')
+    levels = nc_out.variables['level'][:]
+    if (levels.size != Pbin.size) or np.any(levels != Pbin.astype(levels.dtype)):
+        print ' -> ' + nc_outfile + ' was built with different zbin/zmax (or zshrink), a full rebuild is needed [skip]'
+        nc_out.close()
+        return None
+
+    # Check that the channels are unchanged
+    channels = pfiles_basics.channels()
+    if variables is None:
+        variables = list(channels.keys())
+    names = [name for name in nc_out.variables if nc_out.variables[name].dimensions == ('time', 'level')]
+    if sorted(names) != sorted([channels[key]['name'] for key in variables]):
+        print ' -> ' + nc_outfile + ' was built with different variables, a full rebuild is needed [skip]'
+        nc_out.close()
+        return None
+
+    # Files to process (new, or size/mtime changed)
+    filelist = np.genfromtxt(infiles, dtype=str)
+    filelist = np.reshape(filelist, filelist.size)
+    todo = []
+    for fname in filelist:
+        if fname in manifest.index:
+            entry = manifest.loc[fname]
+            if os.path.isfile(fname):
+                stat = os.stat(fname)
+                if (stat.st_size == entry['size']) & (np.abs(stat.st_mtime - entry['mtime']) < 1e-5):
+                    continue
+        todo.append(fname)
+
+    missing = manifest.index[~manifest.index.isin(filelist)]
+    if missing.size:
+        print ' -> ' + np.str(missing.size) + ' files in manifest are not in ' + infiles + ' (their casts are kept)'
+    print ' -> ' + np.str(len(todo)) + ' new or modified files to process'
+
+    # Existing times (to deal with duplicated time)
+    v = nc_out.variables
+    ntimes = len(nc_out.dimensions['time'])
+    time_existing = pd.Timestamp('1900-01-01') + pd.to_timedelta(v['time'][:], unit='h')
+    time_existing = time_existing.round('s')
+    cast_times = set(time_existing)
+
+    n_new = 0
+    n_replaced = 0
+    n_blanked = 0
+    qc_log = []
+    for fname, fingerprint, cast, log in process_pfiles(todo, Pbin, workers, variables, qc_log):
+
+        if fingerprint is None:
+            continue
+        if fname in manifest.index:
+            slot = np.int(manifest.loc[fname, 'slot'])
+            if fingerprint[2] == manifest.loc[fname, 'md5']: # content unchanged (e.g. touched)
+                manifest.loc[fname, ['size', 'mtime']] = fingerprint[0:2]
+                continue
+        else:
+            slot = -1
+
+        if cast is None:
+            if slot >= 0: # was accepted before: blank its row
+                event = qc_event('rejected_cast', 'was in ' + nc_outfile + ' but is now rejected (row ' + np.str(slot) + ' blanked)', manifest.loc[fname, 'cast_id'])
+                event['file'] = fname
+                qc_log.append(event)
+                print ' -> ' + event['message']
+                blank_cast(nc_out, slot, variables)
+                n_blanked += 1
+            manifest.loc[fname] = fingerprint + ['', -1]
+            continue
+        cast_info, cast_time, X = cast
+
+        if slot >= 0: # replace existing cast
+            cast_times.discard(time_existing[slot])
+            n_replaced += 1
+        else: # append new cast
+            slot = ntimes
+            ntimes += 1
+            n_new += 1
+
+        # deal with duplicated time (add one sec.)
+        if cast_time in cast_times:
+            event = qc_event('duplicated_time', 'duplicated time (+1 sec.)', str(cast_time))
+            event['file'] = fname
+            qc_log.append(event)
+            cast_time = cast_time + pd.Timedelta(seconds=1)
+        cast_times.add(cast_time)
+
+        write_casts(nc_out, slot, [cast_info], [cast_time], X[np.newaxis,:,:], variables)
+        manifest.loc[fname] = fingerprint + [cast_info[0], slot]
+
+    nc_out.close()
+    write_manifest(manifest_file, manifest)
+    write_qc_log(qc_file, qc_log, append=True)
+    print 'Done! (' + np.str(n_new) + ' casts added, ' + np.str(n_replaced) + ' replaced, ' + np.str(n_blanked) + ' blanked)'
+
+    return qc_summary(qc_log)
+
+
+def read_manifest(manifest_file):
+    """Read the manifest of a netCDF file generated by pfiles_to_netcdf
+
+    """
+    manifest = pd.read_csv(manifest_file, index_col='path', dtype={'md5':str, 'cast_id':str}, keep_default_na=False)
+    return manifest
+
+
+def write_manifest(manifest_file, manifest):
+    """Write the manifest of a netCDF file generated by pfiles_to_netcdf
+
+    Columns are: path (index), size, mtime, md5, cast_id and slot (index along the time
+    dimension of the netCDF file, -1 for rejected files)
+
+    """
+    manifest = manifest[['size', 'mtime', 'md5', 'cast_id', 'slot']]
+    manifest.index.name = 'path'
+    manifest.to_csv(manifest_file, float_format='%.6f')
 
 
-def pfiles_to_netcdf_unlimitedz(infiles, nc_outfile, zbin=1): # pfiles_to_pannel
+def pfiles_to_netcdf_unlimitedz(infiles, nc_outfile, zbin=1, variables=None): # pfiles_to_pannel
     """Given a list of pfiles stored in 'infiles', create a netCDF files with attributes
 
     Input params:
         - infiles: list of files (e.g. '2017pfiles.lis'**)
         - outfile: output file (e.g. 'AZMP2017.nc')
         - zbin: vertical averaging in final file (zbin=1 is default)
+        - variables: list of pfile channels to export (keys of pfiles_basics.channels(), all by default)
 
         ** '$ ls *.p2017 > 2017pfiles.list' would generate the appropriate file list in Linux
   """
@@ -605,13 +975,14 @@ def pfiles_to_netcdf_unlimitedz(infiles, nc_outfile, zbin=1): # pfiles_to_pannel
     sounder_depths = nc_out.createVariable('sounder_depth', np.float32, ('time'), zlib=True)
 
     # Create 2D variables
-    temp = nc_out.createVariable('temperature', np.float32, ('time', 'level'), zlib=True, fill_value=-9999)
-    sal = nc_out.createVariable('salinity', np.float32, ('time', 'level'), zlib=True, fill_value=-9999)
-    cond = nc_out.createVariable('conductivity', np.float32, ('time', 'level'), zlib=True, fill_value=-9999)
-    sigt = nc_out.createVariable('sigma-t', np.float32, ('time', 'level'), zlib=True, fill_value=-9999)
-    o2 = nc_out.createVariable('oxygen', np.float32, ('time', 'level'), zlib=True, fill_value=-9999)
-    fluo = nc_out.createVariable('fluorescence', np.float32, ('time', 'level'), zlib=True, fill_value=-9999)
-    par = nc_out.createVariable('irradiance', np.float32, ('time', 'level'), zlib=True, fill_value=-9999)
+    channels = pfiles_basics.channels()
+    if variables is None:
+        variables = list(channels.keys())
+    for key in variables:
+        channel = channels[key]
+        var = nc_out.createVariable(channel['name'], channel['dtype'], ('time', 'level'), zlib=True, fill_value=channel['fill_value'])
+        for attr, value in channel['attributes'].items():
+            setattr(var, attr, value)
 
     # Variable Attributes
     latitudes.units = 'degree_north'
@@ -622,28 +993,6 @@ def pfiles_to_netcdf_unlimitedz(infiles, nc_outfile, zbin=1): # pfiles_to_pannel
     levels.standard_name = "pressure"
     #levels.valid_range = np.array((0.0, 5000.0))
     levels.valid_min = 0
-    temp.units = 'Celsius'
-    temp.long_name = "Water Temperature" # (may be use to label plots)
-    temp.standard_name = "sea_water_temperature"
-    sal.long_name = "Practical Salinity"
-    sal.standard_name = "sea_water_salinity"
-    sal.units = "1"
-    sal.valid_min = 0
-    sigt.standard_name = "sigma_t"
-    sigt.long_name = "Sigma-t"
-    sigt.units = "Kg m-3"
-    o2.long_name = "Dissolved Oxygen Concentration" ;
-    o2.standard_name = "oxygen_concentration" ;
-    o2.units = "mg L-1" ;
-    cond.long_name = "Water Conductivity" ;
-    cond.standard_name = "sea_water_conductivity" ;
-    cond.units = "S m-1" ;
-    fluo.long_name = "Chl-a Fluorescence" ;
-    fluo.standard_name = "concentration_of_chlorophyll_in_sea_water" ;
-    fluo.units = "mg m-3" ;
-    par.long_name = "Irradiance" ;
-    par.standard_name = "irradiance" ;
-    par.units = "umol photons m-2 s-1" ;
     ##### ------------------------------------- #####
 
     for idx, fname in enumerate(filelist):
@@ -706,14 +1055,10 @@ def pfiles_to_netcdf_unlimitedz(infiles, nc_outfile, zbin=1): # pfiles_to_pannel
             levels[:] = np.array(Pbin)
 
             
-        # Fill nc file with variables
-        temp[idx,:] = bin_pressure_from_dataframe(df, Pbin, 'temp')
-        sal[idx,:] = bin_pressure_from_dataframe(df, Pbin, 'sal')
-        cond[idx,:] = bin_pressure_from_dataframe(df, Pbin, 'cond')
-        sigt[idx,:] = bin_pressure_from_dataframe(df, Pbin, 'sigt')
-        fluo[idx,:] = bin_pressure_from_dataframe(df, Pbin, 'flor')
-        o2[idx,:] = bin_pressure_from_dataframe(df, Pbin, 'oxy')
-        par[idx,:] = bin_pressure_from_dataframe(df, Pbin, 'par')
+        # Fill nc file with variables (all channels binned at once)
+        X = bin_pressure(P, df.reindex(columns=variables).values.T, Pbin)
+        for k, key in enumerate(variables):
+            nc_out.variables[channels[key]['name']][idx,:] = X[k,:]
     # -------------------------------------------------------- #    
     print 'Done!'
     
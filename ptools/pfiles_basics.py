@@ -5,6 +5,8 @@
 __author__ = 'Frederic.Cyr@dfo-mpo.gc.ca'
 __version__ = '0.1'
 
+from collections import OrderedDict
+
 
 def eoh():
     """End-of-header key
@@ -15,3 +17,50 @@ def eoh():
 
     return eoh
 
+
+def channels():
+    """Registry of pfile channels exported to netCDF (see pfile_tools.pfiles_to_netcdf)
+
+    Keys are the pfile column names, values the netCDF variable name, dtype, fill value and
+    attributes. To export a new channel, simply add it here.
+    Example to access info:
+    In [1]: channels()['temp']['name']
+    Out[1]: 'temperature'
+
+    """
+    channels = OrderedDict()
+    channels['temp'] = {'name' : 'temperature', 'dtype' : 'f4', 'fill_value' : -9999,
+                        'attributes' : {'long_name' : 'Water Temperature',
+                                        'standard_name' : 'sea_water_temperature',
+                                        'units' : 'Celsius'}}
+    channels['sal'] = {'name' : 'salinity', 'dtype' : 'f4', 'fill_value' : -9999,
+                       'attributes' : {'long_name' : 'Practical Salinity',
+                                       'standard_name' : 'sea_water_salinity',
+                                       'units' : '1',
+                                       'valid_min' : 0}}
+    channels['cond'] = {'name' : 'conductivity', 'dtype' : 'f4', 'fill_value' : -9999,
+                        'attributes' : {'long_name' : 'Water Conductivity',
+                                        'standard_name' : 'sea_water_conductivity',
+                                        'units' : 'S m-1'}}
+    channels['sigt'] = {'name' : 'sigma-t', 'dtype' : 'f4', 'fill_value' : -9999,
+                        'attributes' : {'long_name' : 'Sigma-t',
+                                        'standard_name' : 'sigma_t',
+                                        'units' : 'Kg m-3'}}
+    channels['oxy'] = {'name' : 'oxygen', 'dtype' : 'f4', 'fill_value' : -9999,
+                       'attributes' : {'long_name' : 'Dissolved Oxygen Concentration',
+                                       'standard_name' : 'oxygen_concentration',
+                                       'units' : 'mg L-1'}}
+    channels['flor'] = {'name' : 'fluorescence', 'dtype' : 'f4', 'fill_value' : -9999,
+                        'attributes' : {'long_name' : 'Chl-a Fluorescence',
+                                        'standard_name' : 'concentration_of_chlorophyll_in_sea_water',
+                                        'units' : 'mg m-3'}}
+    channels['par'] = {'name' : 'irradiance', 'dtype' : 'f4', 'fill_value' : -9999,
+                       'attributes' : {'long_name' : 'Irradiance',
+                                       'standard_name' : 'irradiance',
+                                       'units' : 'umol photons m-2 s-1'}}
+    channels['ph'] = {'name' : 'ph', 'dtype' : 'f4', 'fill_value' : -9999,
+                      'attributes' : {'long_name' : 'water PH',
+                                      'standard_name' : 'PH',
+                                      'units' : 'unitless'}}
+
+    return channels
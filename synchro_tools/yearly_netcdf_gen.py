@@ -10,19 +10,50 @@ Frederic.Cyr@dfo-mpo.gc.ca, October 2017
 
 
 import pfile_tools as p
+import pandas as pd
 import glob
 import os
+import multiprocessing
 
-lists = glob.glob('*.list')
+# Parallelism: either over years (year_workers) or over casts within a year (cast_workers).
+# (pools cannot be nested, so cast_workers is only used when year_workers = 1)
+year_workers = 1
+cast_workers = 1
+# Only process new/modified pfiles if the yearly netCDF (and its manifest) already exist
+incremental = True
 
-os.system('echo " --------- New run ------ " >> .netcdfgen_log.txt')
-
-for yearfile in lists:
+def yearly_netcdf(yearfile):
     outfile = os.path.splitext(yearfile)[0] + '.nc'
-    p.pfiles_to_netcdf(yearfile, outfile, zbin=5, zmax=2000)
+    qc = p.pfiles_to_netcdf(yearfile, outfile, zbin=5, zmax=2000, workers=cast_workers, incremental=incremental)
     print ' -> ' + outfile + ' done!'
     expr = 'mv ' + yearfile + ' ./list_done'
     os.system(expr)
+    return qc
+
+if __name__ == '__main__':
+    # largest lists first (so a big year does not start last)
+    lists = sorted(glob.glob('*.list'), key=os.path.getsize, reverse=True)
+
+    if year_workers > 1:
+        cast_workers = 1
+        pool = multiprocessing.Pool(year_workers)
+        try:
+            qcs = pool.map(yearly_netcdf, lists, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        qcs = []
+        for yearfile in lists:
+            qcs.append(yearly_netcdf(yearfile))
+
+    # QC summary of the run (details in each *_qclog.csv)
+    qcs = [qc for qc in qcs if qc is not None]
+    if len(qcs):
+        qc = pd.concat(qcs).groupby(level=0).sum()
+        qc['skip'] = qc['skip'] > 0
+        print qc
+        qc.to_csv('netcdfgen_qc_summary.csv')
 
 ## To generate the lists:
 ## import numpy as np
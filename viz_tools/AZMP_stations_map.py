@@ -80,7 +80,9 @@ Z = Z[::decim_scale, ::decim_scale]
 
 ## ---- Station info ---- ##
 import pandas as pd
-df = pd.read_excel(stationFile)
+import station_tools as stn
+catalogue = stn.station_catalogue(stationFile) # read once, then cached
+df = catalogue['stations']
 #print the column names
 print df.columns
 #get the values for a given column
@@ -89,18 +91,18 @@ stations = df['STATION'].values
 stationLat = df['LAT'].values
 stationLon = df['LONG.1'].values
 
-index_SEGB = df.SECTION[df.SECTION=="SOUTHEAST GRAND BANK"].index.tolist()
-index_FC = df.SECTION[df.SECTION=="FLEMISH CAP"].index.tolist()
-index_BB = df.SECTION[df.SECTION=="BONAVISTA"].index.tolist()
-index_WB = df.SECTION[df.SECTION=="WHITE BAY"].index.tolist()
-index_SI = df.SECTION[df.SECTION=="SEAL ISLAND"].index.tolist()
-index_MB = df.SECTION[df.SECTION=="MAKKOVIK BANK"].index.tolist()
-index_BI = df.SECTION[df.SECTION=="BEACH ISLAND"].index.tolist()
-index_FI = df.SECTION[df.SECTION=="FUNK ISLAND"].index.tolist()
-index_S27 = df.SECTION[df.SECTION=="STATION 27"].index.tolist()
-index_SESPB = df.SECTION[df.SECTION=="SOUTHEAST ST PIERRE BANK"].index.tolist()
-index_SWSPB = df.SECTION[df.SECTION=="SOUTHWEST ST PIERRE BANK"].index.tolist()
-index_SS = df.SECTION[df.SECTION=="SMITH SOUND"].index.tolist()
+index_SEGB = catalogue['index'].get('SEGB', [])
+index_FC = catalogue['index'].get('FC', [])
+index_BB = catalogue['index'].get('BB', [])
+index_WB = catalogue['index'].get('WB', [])
+index_SI = catalogue['index'].get('SI', [])
+index_MB = catalogue['index'].get('MB', [])
+index_BI = catalogue['index'].get('BI', [])
+index_FI = catalogue['index'].get('FI', [])
+index_S27 = catalogue['index'].get('S27', [])
+index_SESPB = catalogue['index'].get('SESP', [])
+index_SWSPB = catalogue['index'].get('SWSP', [])
+index_SS = catalogue['index'].get('SS', [])
 
 ## ---- Ephemerides ---- ##
 eph = np.genfromtxt(ephem, dtype=str)
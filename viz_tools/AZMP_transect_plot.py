@@ -102,25 +102,9 @@ Oarray = np.transpose(np.array(O2list))
 PHarray = np.transpose(np.array(PHlist))
 
 # Compute along-transect distance
-from math import radians, cos, sin, asin, sqrt
-from math import radians, cos, sin, asin, sqrt
-def haversine(lon1, lat1, lon2, lat2):
-    """
-    Calculate the great circle distance between two points 
-    on the earth (specified in decimal degrees)
-    """
-    # convert decimal degrees to radians 
-    lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
-    dlon = lon2 - lon1 
-    dlat = lat2 - lat1 
-    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-    c = 2 * asin(sqrt(a)) 
-    km = 6367 * c
-    return km
-
-distance = np.zeros(np.shape(LATarray))
-for i in range(len(LATarray)):
-    distance[i] = haversine(LONarray[0], LATarray[0], LONarray[i], LATarray[i])
+import geodesy_tools as geo
+
+distance = geo.haversine(LONarray[0], LATarray[0], LONarray, LATarray)
 
 # Sort arrays according to distance
 I = np.argsort(distance)
@@ -168,11 +152,11 @@ for i in range(0,len(coords)):
     optim_sum = optim.sum(axis=1)
     min_idx = np.argmin(optim_sum)
     bathy = np.append(bathy, Z[min_idx])
-    distance_bathy = np.append(distance_bathy, haversine(coords[0][1], coords[0][0], coords[i][1], coords[i][0])) 
+    distance_bathy = np.append(distance_bathy, geo.haversine(coords[0][1], coords[0][0], coords[i][1], coords[i][0])) 
 print "done!"
 
 # Check which direction we are going (approaching St.27 or not)
-if haversine(LONarray[0], LATarray[0], St27[1], St27[0]) > haversine(LONarray[-1], LATarray[-1], St27[1], St27[0]):
+if geo.haversine(LONarray[0], LATarray[0], St27[1], St27[0]) > geo.haversine(LONarray[-1], LATarray[-1], St27[1], St27[0]):
     distance = np.abs(distance-distance.max())
     if 'bathy' in locals():
         distance_bathy = np.abs(distance_bathy - distance_bathy.max())
@@ -11,7 +11,7 @@ import datetime
 import matplotlib.pyplot as plt
 from mpl_toolkits.basemap import Basemap
 from scipy.interpolate import griddata # here should remove nans or empty profiles
-import netCDF4
+import bathy_tools as bathy
 #import matplotlib
 #matplotlib.interactive(True)
 
@@ -45,26 +45,13 @@ dataFile = '/home/cyrf0006/Data/GEBCO/GRIDONE_1D.nc'
 decim_scale = 4
 v = np.linspace(0, 4000, 9)
 
-# Load data
-dataset = netCDF4.Dataset(dataFile)
-
-# Extract variables
-x = dataset.variables['x_range']
-y = dataset.variables['y_range']
-spacing = dataset.variables['spacing']
-
-# Compute Lat/Lon
-nx = int((x[-1]-x[0])/spacing[0]) + 1  # num pts in x-dir
-ny = int((y[-1]-y[0])/spacing[1]) + 1  # num pts in y-dir
-
-lonz = np.linspace(x[0],x[-1],nx)
-latz = np.linspace(y[0],y[-1],ny)
+lonLims = [-70, -40]
+latLims = [40, 65]
 
-# Reshape data
-zz = dataset.variables['z']
-Z = zz[:].reshape(ny, nx)
+# Load data (window of the region only)
+lonz, latz, Z = bathy.get_bathymetry(dataFile, lonLims, latLims)
 
-# Reduce data according to Region params
+# Reduce data according to decim scale
 lonz = lonz[::decim_scale]
 latz = latz[::decim_scale]
 Z = Z[::decim_scale, ::decim_scale]
@@ -81,8 +68,6 @@ lon_009 = df_fd009['longitude'].values
 lon_0 = -50
 lat_0 = 50
 
-lonLims = [-70, -40]
-latLims = [40, 65]
 proj = 'merc'
 
 fig = plt.figure()
@@ -92,7 +77,7 @@ m = Basemap(projection='merc',lon_0=lon_0,lat_0=lat_0, llcrnrlon=lonLims[0],llcr
 # Bathymetry
 x,y = m(*np.meshgrid(lonz,latz))
 v = np.linspace(-4000, 0, 9)
-c = m.contourf(x, y, np.flipud(Z), v, cmap=plt.cm.PuBu_r, extend="min");
+c = m.contourf(x, y, Z, v, cmap=plt.cm.PuBu_r, extend="min");
 m.fillcontinents(color='grey');
 
 # Add Colorbar
@@ -2,7 +2,7 @@
    map of the North Atlantic. Originally realized for MOPGA project.
 '''
 
-import netCDF4
+import bathy_tools as bathy
 from mpl_toolkits.basemap import Basemap
 from mpl_toolkits.axes_grid1.inset_locator import zoomed_inset_axes
 from mpl_toolkits.axes_grid1.inset_locator import mark_inset
@@ -25,26 +25,10 @@ fig_name = 'map_NorthAtlantic.png'
 ## ---- Bathymetry ---- ####
 v = np.linspace(-4000, 0, 9)
 
-# Load data
-dataset = netCDF4.Dataset(dataFile)
+# Load data (window of the region only)
+lon, lat, Z = bathy.get_bathymetry(dataFile, lonLims, latLims)
 
-# Extract variables
-x = dataset.variables['x_range']
-y = dataset.variables['y_range']
-spacing = dataset.variables['spacing']
-
-# Compute Lat/Lon
-nx = int((x[-1]-x[0])/spacing[0]) + 1  # num pts in x-dir
-ny = int((y[-1]-y[0])/spacing[1]) + 1  # num pts in y-dir
-
-lon = np.linspace(x[0],x[-1],nx)
-lat = np.linspace(y[0],y[-1],ny)
-
-# Reshape data
-zz = dataset.variables['z']
-Z = zz[:].reshape(ny, nx)
-
-# Reduce data according to Region params
+# Reduce data according to decim scale
 lon = lon[::decim_scale]
 lat = lat[::decim_scale]
 Z = Z[::decim_scale, ::decim_scale]
@@ -54,8 +38,8 @@ fig = plt.figure(1)
 #m = Basemap(projection='ortho',lon_0=lon_0,lat_0=lat_0,resolution=None)
 m = Basemap(projection='merc',lon_0=lon_0,lat_0=lat_0, llcrnrlon=lonLims[0],llcrnrlat=latLims[0],urcrnrlon=lonLims[1],urcrnrlat=latLims[1], resolution='l')
 x,y = m(*np.meshgrid(lon,lat))
-c = m.contourf(x, y, np.flipud(Z), v, cmap=plt.cm.PuBu_r, extend="min");
-#c = m.contourf(x, y, np.flipud(Z), v, cmap=plt.cm.PuRd_r, extend="min");
+c = m.contourf(x, y, Z, v, cmap=plt.cm.PuBu_r, extend="min");
+#c = m.contourf(x, y, Z, v, cmap=plt.cm.PuRd_r, extend="min");
 m.fillcontinents(color='grey');
 m.drawparallels(np.arange(10,70,10), labels=[1,0,0,0], fontsize=12, fontweight='bold');
 m.drawmeridians(np.arange(-80, 5, 10), labels=[0,0,0,1], fontsize=12, fontweight='bold');
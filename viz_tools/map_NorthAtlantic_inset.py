@@ -1,6 +1,6 @@
 
 
-import netCDF4
+import bathy_tools as bathy
 from mpl_toolkits.basemap import Basemap
 from mpl_toolkits.axes_grid1.inset_locator import zoomed_inset_axes
 from mpl_toolkits.axes_grid1.inset_locator import mark_inset
@@ -23,33 +23,19 @@ fig_name = 'map_NorthAtlantic.png'
 ## ---- Bathymetry ---- ####
 v = np.linspace(-6000, 0, 11)
 
-# Load data
-dataset = netCDF4.Dataset(dataFile)
+# Load data (window of the region only)
+lon, lat, Z = bathy.get_bathymetry(dataFile, lonLims, latLims)
 
-# Extract variables
-x = dataset.variables['x_range']
-y = dataset.variables['y_range']
-spacing = dataset.variables['spacing']
-
-# Compute Lat/Lon
-nx = int((x[-1]-x[0])/spacing[0]) + 1  # num pts in x-dir
-ny = int((y[-1]-y[0])/spacing[1]) + 1  # num pts in y-dir
-
-lon = np.linspace(x[0],x[-1],nx)
-lat = np.linspace(y[0],y[-1],ny)
-
-# Reshape data
-zz = dataset.variables['z']
-Z = zz[:].reshape(ny, nx)
-
-# Reduce data according to Region params
+# Reduce data according to decim scale
 lon = lon[::decim_scale]
 lat = lat[::decim_scale]
 Z = Z[::decim_scale, ::decim_scale]
 
 ## ---- Station info ---- ##
 import pandas as pd
-df = pd.read_excel(stationFile)
+import station_tools as stn
+catalogue = stn.station_catalogue(stationFile) # read once, then cached
+df = catalogue['stations']
 #print the column names
 print df.columns
 #get the values for a given column
@@ -58,18 +44,18 @@ stations = df['STATION'].values
 stationLat = df['LAT'].values
 stationLon = df['LONG.1'].values
 
-index_SEGB = df.SECTION[df.SECTION=="SOUTHEAST GRAND BANK"].index.tolist()
-index_FC = df.SECTION[df.SECTION=="FLEMISH CAP"].index.tolist()
-index_BB = df.SECTION[df.SECTION=="BONAVISTA"].index.tolist()
-index_WB = df.SECTION[df.SECTION=="WHITE BAY"].index.tolist()
-index_SI = df.SECTION[df.SECTION=="SEAL ISLAND"].index.tolist()
-index_MB = df.SECTION[df.SECTION=="MAKKOVIK BANK"].index.tolist()
-index_BI = df.SECTION[df.SECTION=="BEACH ISLAND"].index.tolist()
-index_FI = df.SECTION[df.SECTION=="FUNK ISLAND"].index.tolist()
-index_S27 = df.SECTION[df.SECTION=="STATION 27"].index.tolist()
-index_SESPB = df.SECTION[df.SECTION=="SOUTHEAST ST PIERRE BANK"].index.tolist()
-index_SWSPB = df.SECTION[df.SECTION=="SOUTHWEST ST PIERRE BANK"].index.tolist()
-index_SS = df.SECTION[df.SECTION=="SMITH SOUND"].index.tolist()
+index_SEGB = catalogue['index'].get('SEGB', [])
+index_FC = catalogue['index'].get('FC', [])
+index_BB = catalogue['index'].get('BB', [])
+index_WB = catalogue['index'].get('WB', [])
+index_SI = catalogue['index'].get('SI', [])
+index_MB = catalogue['index'].get('MB', [])
+index_BI = catalogue['index'].get('BI', [])
+index_FI = catalogue['index'].get('FI', [])
+index_S27 = catalogue['index'].get('S27', [])
+index_SESPB = catalogue['index'].get('SESP', [])
+index_SWSPB = catalogue['index'].get('SWSP', [])
+index_SS = catalogue['index'].get('SS', [])
 
 
 
@@ -79,7 +65,7 @@ ax = fig.add_subplot(111)
 
 map = Basemap(projection='cyl',lon_0=lon_0,lat_0=lat_0, llcrnrlon=lonLims[0],llcrnrlat=latLims[0],urcrnrlon=lonLims[1],urcrnrlat=latLims[1], resolution='l')
 x,y = map(*np.meshgrid(lon,lat))
-c = map.contourf(x, y, np.flipud(Z), v, cmap=plt.cm.PuBu_r);
+c = map.contourf(x, y, Z, v, cmap=plt.cm.PuBu_r);
 map.fillcontinents(color='grey');
 map.drawparallels(np.arange(10,70,10), labels=[1,0,0,0], fontsize=10, fontweight='normal');
 map.drawmeridians(np.arange(-80, 5, 10), labels=[0,0,0,1], fontsize=10, fontweight='normal');
@@ -148,8 +134,8 @@ plt.yticks(visible=False)
 #map2 = Basemap(projection='cyl', llcrnrlon=-70, llcrnrlat=40, urcrnrlon=-40,urcrnrlat=65, ax=axins)
 map2 = Basemap(llcrnrlon=-63, llcrnrlat=40, urcrnrlon=-40,urcrnrlat=60, ax=axins, resolution='h')
 x,y = map2(*np.meshgrid(lon,lat))
-c = map2.contourf(x, y, np.flipud(Z), v, cmap=plt.cm.PuBu_r, extend="min");
-#c = map.contourf(x, y, np.flipud(Z), v, cmap=plt.cm.PuRd_r, extend="min");
+c = map2.contourf(x, y, Z, v, cmap=plt.cm.PuBu_r, extend="min");
+#c = map.contourf(x, y, Z, v, cmap=plt.cm.PuRd_r, extend="min");
 map2.fillcontinents(color='grey');
 map2.drawparallels(np.arange(10,70,10))
 map2.drawmeridians(np.arange(-80, 5, 10))
@@ -2,7 +2,7 @@
    map of the North Atlantic. Originally realized for MOPGA project.
 '''
 
-import netCDF4
+import bathy_tools as bathy
 from mpl_toolkits.basemap import Basemap
 from mpl_toolkits.axes_grid1.inset_locator import zoomed_inset_axes
 from mpl_toolkits.axes_grid1.inset_locator import mark_inset
@@ -26,35 +26,10 @@ v = np.linspace(0, 5000, 21)
 v1 = np.linspace(0, 4000, 5)
 v2 = np.linspace(0, 500, 21)
 
-# Load data
-dataset = netCDF4.Dataset(dataFile)
-
-# Extract variables
-x = dataset.variables['x_range']
-y = dataset.variables['y_range']
-spacing = dataset.variables['spacing']
-
-# Compute Lat/Lon
-nx = int((x[-1]-x[0])/spacing[0]) + 1  # num pts in x-dir
-ny = int((y[-1]-y[0])/spacing[1]) + 1  # num pts in y-dir
-
-lon = np.linspace(x[0],x[-1],nx)
-lat = np.linspace(y[0],y[-1],ny)
-
-# Reshape data
-zz = dataset.variables['z']
-Z = zz[:].reshape(ny, nx)
-Z = np.flipud(Z) # <------------ important!!!
-
-
-# Reduce data according to Region params and decim scale
-idx_lon = np.where((lon>=lonLims[0]) & (lon<=lonLims[1]))
-idx_lat = np.where((lat>=latLims[0]) & (lat<=latLims[1]))
-
-Z = Z[idx_lat[0][0]:idx_lat[0][-1]+1, idx_lon[0][0]:idx_lon[0][-1]+1]
-lon = lon[idx_lon[0]]
-lat = lat[idx_lat[0]]
+# Load data (window of the region only)
+lon, lat, Z = bathy.get_bathymetry(dataFile, lonLims, latLims)
 
+# Reduce data according to decim scale
 lon = lon[::decim_scale]
 lat = lat[::decim_scale]
 Z = Z[::decim_scale, ::decim_scale]
@@ -8,6 +8,7 @@ import matplotlib.pyplot as plt
 import pandas as pd
 import xarray as xr
 import datetime
+import archive_tools as archive
 
 font = {'family' : 'normal',
         'weight' : 'bold',
@@ -17,20 +18,11 @@ plt.rc('font', **font)
 # This is a dataset
 #ds = xr.open_mfdataset('/home/cyrf0006/AZMP/database/netCDF_first_set/2017.nc')
 #ds = xr.open_mfdataset('/home/cyrf0006/research/AZMP_database/2017_data/2017_viking.nc')
-ds = xr.open_mfdataset('/home/cyrf0006/data/dev_database/*.nc')
+# Selection of a subset region and depth range (only selected casts are read)
+ds = archive.query_archive('/home/cyrf0006/data/dev_database/*.nc', lonLims=[-55, -50], latLims=[45, 50], levelLims=[None, 500], variables=['temperature', 'salinity'])
+#ds = archive.query_archive('/home/cyrf0006/data/dev_database/*.nc', lonLims=[-52, -50], latLims=[48, 50], levelLims=[None, 500], variables=['temperature', 'salinity'])
 
 
-# Select a depth range
-ds = ds.sel(level=ds['level']<500)
-#ds = ds.sel(level=ds['level']>10)
-
-# Selection of a subset region
-ds = ds.where((ds.longitude>-55) & (ds.longitude<-50), drop=True)
-ds = ds.where((ds.latitude>45) & (ds.latitude<50), drop=True)
-
-#ds = ds.where((ds.longitude>-52) & (ds.longitude<-50), drop=True)
-#ds = ds.where((ds.latitude>48) & (ds.latitude<50), drop=True)
-
 
 
 # only 2017
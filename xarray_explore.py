@@ -9,6 +9,7 @@ import pandas as pd
 import xarray as xr
 import datetime
 import water_masses as wm
+import archive_tools as archive
 
 font = {'family' : 'normal',
         'weight' : 'bold',
@@ -16,17 +17,9 @@ font = {'family' : 'normal',
 plt.rc('font', **font)
 
 # This is a dataset
-ds = xr.open_mfdataset('*.nc')
-
-
-# Select a depth range
-ds = ds.sel(level=ds['level']<500)
-ds = ds.sel(level=ds['level']>10)
-
-# Selection of a subset region
-ds = ds.where((ds.longitude>-55) & (ds.longitude<-50), drop=True)
-#ds = ds.where((ds.latitude>50) & (ds.latitude<55), drop=True)
-ds = ds.where((ds.latitude>45) & (ds.latitude<50), drop=True)
+# Selection of a subset region and depth range (only selected casts are read)
+ds = archive.query_archive('*.nc', lonLims=[-55, -50], latLims=[45, 50], levelLims=[10, 500], variables=['temperature', 'salinity'])
+#ds = archive.query_archive('*.nc', lonLims=[-55, -50], latLims=[50, 55], levelLims=[10, 500], variables=['temperature', 'salinity'])
 
 # Sort time dimension (this takes time to display!!)
 ds = ds.isel(time=np.argsort(ds.time))